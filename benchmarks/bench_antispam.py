@@ -0,0 +1,90 @@
+"""Microbenchmark for the anti-spam check in bot.py.
+
+Feeds ``--messages`` ordinary chat messages from ``--authors`` distinct members
+through ``check_spam`` with anti-spam enabled, and reports messages per second
+and the memory held by the per-user trackers. The flood limit is raised so the
+replayed chatter (far faster than real time) never trips it, so no REST calls
+are made; every check still runs. With more authors than ``SPAM_TRACKED_USERS`` the trackers
+stop growing once the LRU is full.
+
+Usage: python benchmarks/bench_antispam.py [--messages 200000] [--authors 100000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_discord import FakeDiscord, user_payload  # noqa: E402
+
+
+def build_messages(args):
+    import discord
+    from bot import bot
+
+    state = bot._connection
+    fake = FakeDiscord()
+    state.user = discord.ClientUser(state=state, data=user_payload(fake.bot_id, "benchbot", True))
+    fake_guild = fake.add_guild(channels=5, roles=5, members=args.authors + 2, bans=0, messages=0)
+    guild = discord.Guild(data=fake_guild.payload(), state=state)
+    state._add_guild(guild)
+    for user_id in fake_guild.member_ids:
+        guild._add_member(discord.Member(data=fake_guild.member_payload(user_id), guild=guild, state=state))
+    channel = guild.get_channel(fake_guild.command_channel)
+
+    members = fake_guild.member_ids[2:]
+    rng = random.Random(0)
+    words = "the quick brown fox jumps over a lazy dog while everyone keeps chatting".split()
+    messages = []
+    for i in range(args.messages):
+        content = " ".join(rng.choices(words, k=rng.randint(3, 15)))
+        payload = fake._message_payload(channel.id, members[i % len(members)], fake_guild, content)
+        messages.append(discord.Message(state=state, channel=channel, data=payload))
+    return guild, messages
+
+
+async def measure(check_spam, messages):
+    start = time.perf_counter()
+    for message in messages:
+        await check_spam(message)
+    return len(messages) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--authors", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["STATE_DB_PATH"] = os.path.join(tmp, "bench_antispam.db")
+        import bot
+
+        guild, messages = build_messages(args)
+        bot.antispam_settings[guild.id] = {**bot.ANTISPAM_DEFAULTS, "enabled": True, "rate": 10**9, "per": 1}
+
+        rate = asyncio.run(measure(bot.check_spam, messages))
+        # Second pass under tracemalloc, which is too slow to time
+        bot.spam_trackers.clear()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        asyncio.run(measure(bot.check_spam, messages))
+        held = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        tracked = len(bot.spam_trackers)
+        bot.state_store.close()
+
+    print(f"messages:        {len(messages):,} from {args.authors:,} authors")
+    print(f"throughput:      {rate:,.0f} msg/s")
+    print(f"tracked users:   {tracked:,} (limit {bot.SPAM_TRACKED_USERS:,})")
+    print(f"tracker memory:  {held / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Runs bot.py's commands end to end against the fake Discord server.
+
+Logs the real bot in to ``fake_discord.FakeDiscord``, lets it chunk a synthetic
+guild, then sends each command as a MESSAGE_CREATE from the guild owner and
+reports, per command, the wall time until the command returned, the REST calls
+it made and how many of them were answered with a 429.
+
+Usage: python benchmarks/bench_commands.py [--channels 500] [--roles 250]
+           [--members 200000] [--bans 50000] [--timeouts 500] [--messages 500]
+           [--time-scale 1.0] [--timeout 120] [--commands lockall,ui] [--routes]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_discord import FakeDiscord  # noqa: E402
+
+COMMANDS = ["lockall", "hideall", "purge_or_clear", "untimeoutall", "unbanall", "ui", "giveaways"]
+
+
+def command_text(name, guild, args):
+    if name == "purge_or_clear":
+        return ",c 100"
+    if name == "ui":
+        return f",ui {random.choice(guild.member_ids[2:] or guild.member_ids)}"
+    if name == "giveaways":
+        return f",gw start {args.giveaway_seconds}s Benchmark prize"
+    return f",{name}"
+
+
+class InvocationTracker:
+    """Wraps ``bot.invoke`` so the runner can wait for, or cancel, the command
+    it just sent. discord.py runs each invocation in its on_message task."""
+
+    def __init__(self, bot):
+        self.done = None
+        self.task = None
+        self.error = None
+        self._invoke = bot.invoke
+        bot.invoke = self._tracked
+        bot.add_listener(self._on_error, "on_command_error")
+
+    def expect(self):
+        self.done = asyncio.get_running_loop().create_future()
+        self.task = self.error = None
+        return self.done
+
+    async def _tracked(self, ctx):
+        done = self.done
+        self.task = asyncio.current_task()
+        try:
+            await self._invoke(ctx)
+        finally:
+            if done is not None and not done.done():
+                done.set_result(self.error)
+
+    async def _on_error(self, ctx, error):
+        self.error = error
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+
+
+async def run_command(fake, bot_module, tracker, guild, name, args):
+    done = tracker.expect()
+    fake.reset_counters()
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        await fake.send_message(guild.command_channel, guild.owner_id, command_text(name, guild, args))
+        error = await asyncio.wait_for(asyncio.shield(done), args.timeout)
+        if error is not None:
+            status = f"error: {error}"
+        elif name == "giveaways":
+            await drive_giveaway(fake, bot_module, guild, args)
+    except asyncio.TimeoutError:
+        tracker.cancel()
+        status = f"timed out after {args.timeout:g}s"
+    wall = time.perf_counter() - start
+    await fake.wait_idle()
+    return wall, sum(fake.calls.values()), sum(fake.rate_limited.values()), status, dict(fake.calls)
+
+
+async def drive_giveaway(fake, bot_module, guild, args):
+    """Enters ``--entrants`` members into the giveaway just started and waits
+    for it to end."""
+    message_id = max(bot_module.active_giveaways, default=None)
+    if message_id is None:
+        return
+    channel = bot_module.active_giveaways[message_id]["channel_id"]
+    for user_id in guild.member_ids[2:2 + args.entrants]:
+        await fake.add_reaction(channel, message_id, user_id, "🎉")
+    deadline = time.monotonic() + args.timeout
+    while message_id in bot_module.active_giveaways:
+        if time.monotonic() > deadline:
+            raise asyncio.TimeoutError
+        await asyncio.sleep(0.05)
+
+
+async def main(args):
+    fake = FakeDiscord(time_scale=args.time_scale)
+    build = time.perf_counter()
+    guild = fake.add_guild(
+        channels=args.channels, roles=args.roles, members=args.members,
+        bans=args.bans, timeouts=args.timeouts, messages=args.messages,
+    )
+    build = time.perf_counter() - build
+    await fake.start()
+    fake.patch_discord()
+
+    import bot as bot_module
+
+    bot_module.state_store.load()
+    ready = time.perf_counter()
+    await bot_module.bot.login("fake-token")
+    runner = asyncio.create_task(bot_module.bot.connect())
+    await bot_module.bot.wait_until_ready()
+    ready = time.perf_counter() - ready
+    await fake.wait_idle()
+
+    tracker = InvocationTracker(bot_module.bot)
+    print(f"guild: {args.channels} channels, {args.roles} roles, {args.members:,} members, "
+          f"{args.bans:,} bans, {args.timeouts} timeouts, {args.messages} messages")
+    print(f"synthetic guild built in {build:.1f}s, bot ready (chunked) in {ready:.1f}s")
+    print(f"{'command':<16}{'wall (s)':>10}{'REST calls':>12}{'429s':>7}  status")
+    try:
+        for name in args.commands:
+            wall, calls, limited, status, routes = await run_command(fake, bot_module, tracker, guild, name, args)
+            print(f"{name:<16}{wall:>10.2f}{calls:>12}{limited:>7}  {status}")
+            if args.routes:
+                for route, count in sorted(routes.items(), key=lambda r: -r[1]):
+                    print(f"    {count:>8}  {route}")
+    finally:
+        await bot_module.bot.close()
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+        bot_module.state_store.close()
+        await fake.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--channels", type=int, default=500)
+    parser.add_argument("--roles", type=int, default=250)
+    parser.add_argument("--members", type=int, default=200_000)
+    parser.add_argument("--bans", type=int, default=50_000)
+    parser.add_argument("--timeouts", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--entrants", type=int, default=5000)
+    parser.add_argument("--giveaway-seconds", type=int, default=10)
+    parser.add_argument("--time-scale", type=float, default=1.0, help="multiplier for rate-limit windows")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-command time limit in seconds")
+    parser.add_argument("--commands", type=lambda s: s.split(","), default=COMMANDS)
+    parser.add_argument("--routes", action="store_true", help="print REST calls per route")
+    args = parser.parse_args()
+    random.seed(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # The bot's state store is opened at import time
+        os.environ["STATE_DB_PATH"] = os.path.join(tmp, "bench_commands.db")
+        asyncio.run(main(args))
@@ -0,0 +1,132 @@
+"""Startup cost of bot.py with and without LOW_MEMORY.
+
+Serves ``--guilds`` synthetic guilds from ``fake_discord.FakeDiscord`` and starts
+the real bot against it in a fresh process per mode, so each measurement starts
+from an empty interpreter. Reports, per mode, the time from login to ready
+(which includes chunking every guild unless LOW_MEMORY is set), the resident
+set size once ready and the number of cached members. In low-memory mode it
+also times ``ensure_chunked`` for one guild, the cost a command like
+``,serverinfo`` pays the first time it needs a guild's full member list.
+discord.py paces member chunk requests to the gateway's send limit (about two
+a second), so with chunking at startup the ready time grows with the guild
+count rather than the member count.
+
+Usage: python benchmarks/bench_low_memory.py [--guilds 1000] [--members 300]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_discord import FakeDiscord  # noqa: E402
+
+
+def rss_mb():
+    """Current resident set size (peak RSS where /proc is not available)."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def child(url):
+    """Runs in the measured process: starts the bot and reports as JSON."""
+    import discord.gateway
+    import discord.http
+    import yarl
+
+    discord.http.Route.BASE = url + "/api/v10"
+    discord.gateway.DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(url.replace("http", "ws", 1) + "/gateway")
+
+    import bot as bot_module
+
+    bot = bot_module.bot
+    bot_module.state_store.load()
+    baseline = rss_mb()
+    start = time.perf_counter()
+    await bot.login("fake-token")
+    runner = asyncio.create_task(bot.connect())
+    await bot.wait_until_ready()
+    ready = time.perf_counter() - start
+    gc.collect()
+    result = {
+        "ready": ready,
+        "rss": rss_mb(),
+        "baseline": baseline,
+        "guilds": len(bot.guilds),
+        "members": sum(len(guild.members) for guild in bot.guilds),
+        "chunk": None,
+    }
+    if bot_module.LOW_MEMORY:
+        guild = max(bot.guilds, key=lambda g: g.member_count or 0)
+        start = time.perf_counter()
+        await bot_module.ensure_chunked(guild)
+        result["chunk"] = time.perf_counter() - start
+    await bot.close()
+    runner.cancel()
+    await asyncio.gather(runner, return_exceptions=True)
+    bot_module.state_store.close()
+    print(json.dumps(result))
+
+
+async def measure(url, low_memory, tmp):
+    env = {
+        **os.environ,
+        "LOW_MEMORY": "1" if low_memory else "",
+        "STATE_DB_PATH": os.path.join(tmp, f"bench_low_memory_{int(low_memory)}.db"),
+        "METRICS_PORT": "0",
+    }
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.abspath(__file__), "--child", url,
+        env=env, stdout=asyncio.subprocess.PIPE,
+    )
+    out, _ = await process.communicate()
+    lines = [line for line in out.decode().splitlines() if line.startswith("{")]
+    if process.returncode or not lines:
+        raise RuntimeError(f"bot process exited with {process.returncode}")
+    return json.loads(lines[-1])
+
+
+async def main(args):
+    fake = FakeDiscord()
+    for _ in range(args.guilds):
+        fake.add_guild(channels=args.channels, roles=args.roles, members=args.members, bans=0, messages=0)
+    await fake.start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            results = {mode: await measure(fake.url, mode == "low memory", tmp) for mode in ("default", "low memory")}
+    finally:
+        await fake.close()
+
+    print(f"{args.guilds:,} guilds x {args.members:,} members ({args.guilds * args.members:,} members)")
+    print(f"{'mode':<12}{'ready (s)':>11}{'RSS (MB)':>10}{'bot RSS (MB)':>14}{'cached members':>16}")
+    for mode, r in results.items():
+        print(f"{mode:<12}{r['ready']:>11.2f}{r['rss']:>10.0f}{r['rss'] - r['baseline']:>14.0f}{r['members']:>16,}")
+    chunk = results["low memory"]["chunk"]
+    if chunk is not None:
+        print(f"on-demand chunk of one {args.members:,}-member guild: {chunk * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        asyncio.run(child(sys.argv[2]))
+        sys.exit()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--guilds", type=int, default=1000)
+    parser.add_argument("--members", type=int, default=300, help="members per guild")
+    parser.add_argument("--channels", type=int, default=10)
+    parser.add_argument("--roles", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,125 @@
+"""Microbenchmark for the on_message handler in bot.py.
+
+Feeds real ``discord.Message`` objects (built from fake_discord payloads) to the
+current handler and to the previous one, which ran ``bot.process_commands``,
+the AFK lookups and a loop over resolved ``message.mentions`` for every
+message. Reports messages per second on one core (one event loop). The mix is
+ordinary chatter: no commands, ``--mention-ratio`` of messages mention a member,
+and nobody mentioned is AFK.
+
+Usage: python benchmarks/bench_on_message.py [--messages 200000]
+           [--mention-ratio 0.1] [--afk-users 0]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_discord import FakeDiscord, user_payload  # noqa: E402
+
+
+async def legacy_on_message(message):
+    """on_message before the fast path (the welcome-back branch, never taken
+    here, is left out)."""
+    from bot import afk_users, bot, global_afk_users
+
+    if message.author.bot:
+        return
+    await bot.process_commands(message)
+    if message.content.startswith(("afk", ",afk", ".afk")):
+        return
+    user_id = message.author.id
+    afk_info = None
+    if user_id in global_afk_users:
+        afk_info = global_afk_users.pop(user_id)
+    elif user_id in afk_users:
+        afk_info = afk_users.pop(user_id)
+    if afk_info:
+        return
+    for mention in message.mentions:
+        mention_id = mention.id
+        if mention_id in global_afk_users:
+            await message.channel.send(f"💤 {mention.display_name} is **Global AFK**")
+        elif mention_id in afk_users:
+            await message.channel.send(f"💤 {mention.display_name} is **Server AFK**")
+
+
+def build_messages(args):
+    import discord
+    from bot import bot
+
+    state = bot._connection
+    fake = FakeDiscord()
+    state.user = discord.ClientUser(state=state, data=user_payload(fake.bot_id, "benchbot", True))
+    fake_guild = fake.add_guild(channels=5, roles=5, members=args.members, bans=0, messages=0)
+    guild = discord.Guild(data=fake_guild.payload(), state=state)
+    state._add_guild(guild)
+    for user_id in fake_guild.member_ids:
+        guild._add_member(discord.Member(data=fake_guild.member_payload(user_id), guild=guild, state=state))
+    channel = guild.get_channel(fake_guild.command_channel)
+
+    members = fake_guild.member_ids[2:]
+    rng = random.Random(0)
+    words = "the quick brown fox jumps over a lazy dog while everyone keeps chatting".split()
+    messages = []
+    for _ in range(args.messages):
+        author = rng.choice(members)
+        content = " ".join(rng.choices(words, k=rng.randint(3, 15)))
+        fields = {}
+        if rng.random() < args.mention_ratio:
+            target = rng.choice(members)
+            content = f"<@{target}> {content}"
+            mentioned = fake_guild.member_payload(target)
+            fields["mentions"] = [dict(mentioned.pop("user"), member=mentioned)]
+        payload = fake._message_payload(channel.id, author, fake_guild, content, **fields)
+        messages.append(discord.Message(state=state, channel=channel, data=payload))
+    return messages, fake.bot_id
+
+
+async def measure(handler, messages):
+    start = time.perf_counter()
+    for message in messages:
+        await handler(message)
+    return len(messages) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--members", type=int, default=5000)
+    parser.add_argument("--mention-ratio", type=float, default=0.1)
+    parser.add_argument("--afk-users", type=int, default=0, help="AFK entries for users who never post or get mentioned")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["STATE_DB_PATH"] = os.path.join(tmp, "bench_on_message.db")
+        import bot
+
+        messages, bot_id = build_messages(args)
+        now = datetime.now(timezone.utc)
+        for i in range(args.afk_users):
+            bot.afk_users[bot_id + 1 + i] = {"reason": "AFK", "timestamp": now, "original_nickname": "afk", "scope": "server"}
+
+        async def run():
+            legacy = await measure(legacy_on_message, messages)
+            current = await measure(bot.on_message, messages)
+            return legacy, current
+
+        legacy, current = asyncio.run(run())
+        bot.state_store.close()
+
+    print(f"messages:        {args.messages:,} ({args.mention_ratio:.0%} with a mention, {args.afk_users} AFK users)")
+    print(f"before:          {legacy:,.0f} msg/s")
+    print(f"after:           {current:,.0f} msg/s")
+    print(f"speedup:         {current / legacy:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Memory per entry of the large state collections in bot.py.
+
+Writes ``--rows`` entries of each collection to a state database, then loads
+it twice, as bot.py used to hold it (plain dicts: ``{user_id: moderator_id}``
+per guild, one ``{"reason": ..., ...}`` dict per AFK user or giveaway) and as
+it does now (SnowflakeMap columns and StateRecord slots). Reports bytes per
+entry (traced Python allocations after the load), load time and lookup time.
+
+Usage: python benchmarks/bench_state_memory.py [--rows 1000000] [--guilds 100]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot import (  # noqa: E402
+    AFKRecord,
+    GiveawayRecord,
+    PersistentDict,
+    PersistentSnowflakeMap,
+    StateStore,
+)
+
+DISCORD_EPOCH_MS = 1420070400000
+LOOKUPS = 200_000
+
+# name -> (depth, compact options)
+COLLECTIONS = {
+    "ban_moderators": (2, {"leaf": PersistentSnowflakeMap}),
+    "afk_users": (1, {"record": AFKRecord}),
+    "active_giveaways": (1, {"record": GiveawayRecord}),
+}
+
+
+def snowflakes(rng, count):
+    """``count`` distinct, realistic snowflakes (2015 to now)."""
+    now = int(time.time() * 1000) - DISCORD_EPOCH_MS
+    ids = set()
+    while len(ids) < count:
+        ids.add((rng.randrange(now) << 22) | rng.getrandbits(22))
+    return list(ids)
+
+
+def populate(path, args):
+    rng = random.Random(0)
+    store = StateStore(path)
+    collections = {name: PersistentDict(store, name, depth) for name, (depth, _) in COLLECTIONS.items()}
+    guilds = snowflakes(rng, args.guilds)
+    moderators = snowflakes(rng, 50)
+    users = snowflakes(rng, args.rows)
+    now = datetime.now(timezone.utc)
+
+    bans = collections["ban_moderators"]
+    for guild_id in guilds:
+        bans[guild_id] = {}
+    for i, user_id in enumerate(users):
+        bans[guilds[i % len(guilds)]][user_id] = rng.choice(moderators)
+    for user_id in users:
+        collections["afk_users"][user_id] = {
+            "reason": rng.choice(["AFK", "lunch", "sleeping", "brb"]),
+            "timestamp": now - timedelta(seconds=rng.randrange(86400)),
+            "original_nickname": f"user{user_id % 100000}",
+            "scope": "server",
+        }
+    for message_id in users:
+        collections["active_giveaways"][message_id] = {
+            "channel_id": rng.choice(guilds),
+            "guild_id": rng.choice(guilds),
+            "prize": "Nitro",
+            "end_time": now + timedelta(seconds=rng.randrange(86400)),
+            "host_id": rng.choice(moderators),
+            "message_id": message_id,
+        }
+    asyncio.run(store.flush())
+    store.close()
+    return guilds, users
+
+
+def load(path, name, compact, traced):
+    """Loads one collection; returns (collection, seconds, traced bytes)."""
+    depth, options = COLLECTIONS[name]
+    store = StateStore(path)
+    collection = PersistentDict(store, name, depth, **(options if compact else {}))
+    gc.collect()
+    if traced:
+        tracemalloc.start()
+    start = time.perf_counter()
+    store.load()
+    seconds = time.perf_counter() - start
+    size = 0
+    if traced:
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    store.close()
+    return collection, seconds, size
+
+
+def lookup_ns(collection, name, guilds, users):
+    sample = random.Random(1).sample(users, min(LOOKUPS, len(users)))
+    start = time.perf_counter()
+    if name == "ban_moderators":
+        for i, user_id in enumerate(sample):
+            collection.get(guilds[i % len(guilds)], {}).get(user_id)
+    else:
+        field = "reason" if name == "afk_users" else "channel_id"
+        for user_id in sample:
+            collection[user_id][field]
+    return (time.perf_counter() - start) / len(sample) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--guilds", type=int, default=100)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench_state_memory.db")
+        guilds, users = populate(path, args)
+        for name in COLLECTIONS:
+            for compact in (False, True):
+                _, _, size = load(path, name, compact, traced=True)
+                collection, seconds, _ = load(path, name, compact, traced=False)
+                ns = lookup_ns(collection, name, guilds, users)
+                results.append((name, "compact" if compact else "dicts", size / args.rows, seconds, ns))
+                del collection
+
+    print(f"entries per collection: {args.rows:,} ({args.guilds} guilds for ban_moderators)")
+    print(f"{'collection':<18}{'layout':<9}{'bytes/entry':>12}{'load (s)':>10}{'lookup (ns)':>13}")
+    for name, layout, per_entry, seconds, ns in results:
+        print(f"{name:<18}{layout:<9}{per_entry:>12.0f}{seconds:>10.2f}{ns:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
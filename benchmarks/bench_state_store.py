@@ -0,0 +1,68 @@
+"""Benchmark for the persistent state store in bot.py.
+
+Measures, for ``--rows`` ban_moderators-style entries:
+  * hot-path writes per second (``d[guild_id][user_id] = moderator_id``, which
+    only queues the change),
+  * write-behind flush throughput to SQLite,
+  * startup warm-load time.
+
+Usage: python benchmarks/bench_state_store.py [--rows 1000000] [--guilds 100]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot import PersistentDict, StateStore  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--guilds", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench_state.db")
+        per_guild = args.rows // args.guilds
+        rows = per_guild * args.guilds
+
+        store = StateStore(path)
+        bans = PersistentDict(store, "ban_moderators", depth=2)
+
+        start = time.perf_counter()
+        for guild_id in range(args.guilds):
+            bans[guild_id] = {}
+            guild_bans = bans[guild_id]
+            for user_id in range(per_guild):
+                guild_bans[user_id] = guild_id
+        queued = time.perf_counter() - start
+
+        start = time.perf_counter()
+        asyncio.run(store.flush())
+        flushed = time.perf_counter() - start
+        store.close()
+
+        store = StateStore(path)
+        bans = PersistentDict(store, "ban_moderators", depth=2)
+        start = time.perf_counter()
+        store.load()
+        loaded = time.perf_counter() - start
+        assert sum(len(g) for g in bans.values()) == rows
+        store.close()
+
+        size = os.path.getsize(path) / 1024 / 1024
+
+    print(f"rows:                 {rows:,}")
+    print(f"hot-path writes/s:    {rows / queued:,.0f}  ({queued:.2f}s)")
+    print(f"flushed rows/s:       {rows / flushed:,.0f}  ({flushed:.2f}s)")
+    print(f"startup load:         {loaded:.2f}s  ({rows / loaded:,.0f} rows/s)")
+    print(f"database size:        {size:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
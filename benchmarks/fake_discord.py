@@ -0,0 +1,972 @@
+"""A local stand-in for the Discord REST API and gateway, for benchmarks.
+
+``FakeDiscord`` hosts synthetic guilds (channels, roles, members, bans, timed
+out members and message history) behind an aiohttp server that speaks enough
+of API v10 and the gateway for discord.py to log in, chunk members and run the
+bot's commands. Every REST call is counted per route, and per-route buckets
+plus the global limit are emulated with the same headers and 429 bodies the
+real API sends, so discord.py's rate limiter behaves as it would live.
+
+Typical use (see bench_commands.py)::
+
+    fake = FakeDiscord()
+    guild = fake.add_guild(channels=500, roles=250, members=200_000, bans=50_000)
+    await fake.start()
+    fake.patch_discord()          # point discord.py at the fake server
+    await bot.start("fake-token")
+    await fake.send_message(guild.command_channel, guild.owner_id, ",lockall")
+
+``time_scale`` shrinks every rate-limit window (0.1 = ten times faster than
+Discord) for quick runs. ``shards`` is the count ``/gateway/bot`` recommends;
+each IDENTIFY only receives the guilds of its shard and is recorded in
+``identifies``.
+"""
+import asyncio
+import bisect
+import itertools
+import json
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from urllib.parse import unquote
+
+from aiohttp import WSMsgType, web
+
+API_PREFIX = "/api/v10"
+DISCORD_EPOCH = 1420070400000
+BULK_DELETE_MAX_AGE = 14 * 24 * 3600
+
+# (requests, window seconds) per bucket; the bucket is keyed on the route and
+# its major parameter (channel_id / guild_id), as on Discord.
+DEFAULT_LIMIT = (5, 5.0)
+ROUTE_LIMITS = {
+    "PUT /channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me": (1, 0.25),
+    "DELETE /channels/{channel_id}/messages/{message_id}": (5, 1.0),
+    "GET /channels/{channel_id}/messages": (5, 5.0),
+    "PATCH /guilds/{guild_id}/members/{user_id}": (10, 10.0),
+    "DELETE /guilds/{guild_id}/bans/{user_id}": (5, 5.0),
+    "PUT /guilds/{guild_id}/bans/{user_id}": (5, 5.0),
+    "GET /guilds/{guild_id}/bans": (10, 10.0),
+    "POST /guilds/{guild_id}/bulk-ban": (1, 10.0),
+    "DELETE /guilds/{guild_id}/members/{user_id}": (5, 5.0),
+}
+GLOBAL_LIMIT = (50, 1.0)
+
+ADMINISTRATOR = 1 << 3
+EVERYONE_PERMISSIONS = 0x6B7DE40
+
+
+def snowflake_at(ms, increment=0):
+    return ((int(ms) - DISCORD_EPOCH) << 22) | (increment & 0x3FFFFF)
+
+
+def snowflake_time(snowflake):
+    return ((snowflake >> 22) + DISCORD_EPOCH) / 1000
+
+
+def iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def user_payload(user_id, name, bot=False):
+    return {
+        "id": str(user_id),
+        "username": name,
+        "discriminator": "0",
+        "global_name": None,
+        "avatar": None,
+        "bot": bot,
+    }
+
+
+def json_response(data, status=200, headers=None):
+    # discord.py only decodes an exact "application/json" content type, so no charset
+    return web.Response(body=json.dumps(data).encode(), status=status, headers=headers, content_type="application/json")
+
+
+class RateLimiter:
+    """Fixed-window buckets, emulating Discord's per-route and global limits."""
+
+    def __init__(self, time_scale=1.0):
+        self.time_scale = time_scale
+        self._buckets = {}  # key -> [count, reset_at]
+
+    def _hit(self, key, limit, window):
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None or bucket[1] <= now:
+            bucket = self._buckets[key] = [0, now + window * self.time_scale]
+        if bucket[0] >= limit:
+            return None, bucket[1] - now
+        bucket[0] += 1
+        return limit - bucket[0], bucket[1] - now
+
+    def check(self, route, major):
+        """Returns ``(headers, None)`` or ``(headers, 429 body)`` if limited."""
+        remaining, reset_after = self._hit("global", *GLOBAL_LIMIT)
+        if remaining is None:
+            body = {"message": "You are being rate limited.", "retry_after": reset_after, "global": True}
+            headers = {"X-RateLimit-Global": "true", "X-RateLimit-Scope": "global", "Retry-After": str(reset_after)}
+            return headers, body
+        limit, window = ROUTE_LIMITS.get(route, DEFAULT_LIMIT)
+        remaining, reset_after = self._hit((route, major), limit, window)
+        headers = {
+            "X-RateLimit-Limit": str(limit),
+            "X-RateLimit-Remaining": str(remaining or 0),
+            "X-RateLimit-Reset": str(time.time() + reset_after),
+            "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+            "X-RateLimit-Bucket": f"{hash(route) & 0xFFFFFFFF:08x}",
+        }
+        if remaining is None:
+            headers["X-RateLimit-Scope"] = "user"
+            headers["Retry-After"] = str(reset_after)
+            body = {"message": "You are being rate limited.", "retry_after": reset_after, "global": False}
+            return headers, body
+        return headers, None
+
+
+class FakeGuild:
+    """Synthetic guild state. Members and bans are stored as ID arrays and only
+    turned into payloads when requested, so 200k members stay cheap."""
+
+    def __init__(self, fake, guild_id, name, owner_id):
+        self.fake = fake
+        self.id = guild_id
+        self.name = name
+        self.owner_id = owner_id
+        self.created = snowflake_time(guild_id)
+        self.roles = {}  # role_id -> payload
+        self.channels = []  # channel_ids in position order
+        self.member_ids = []  # join order
+        self.members = {}  # user_id -> [name, roles, joined_at, timed_out_until, bot]
+        self.ban_ids = []  # sorted
+        self.ban_reasons = {}
+        self.command_channel = None
+
+    # Payloads
+
+    def member_payload(self, user_id):
+        name, roles, joined_at, until, bot = self.members[user_id]
+        return {
+            "user": user_payload(user_id, name, bot),
+            "nick": None,
+            "avatar": None,
+            "roles": [str(r) for r in roles],
+            "joined_at": iso(joined_at),
+            "premium_since": None,
+            "deaf": False,
+            "mute": False,
+            "flags": 0,
+            "pending": False,
+            "communication_disabled_until": iso(until) if until else None,
+        }
+
+    def ban_payload(self, user_id):
+        return {"user": user_payload(user_id, f"banned{user_id % 100000}"), "reason": self.ban_reasons.get(user_id)}
+
+    def payload(self):
+        core = [self.owner_id, self.fake.bot_id]
+        return {
+            "id": str(self.id),
+            "name": self.name,
+            "icon": None,
+            "splash": None,
+            "discovery_splash": None,
+            "banner": None,
+            "description": None,
+            "owner_id": str(self.owner_id),
+            "roles": list(self.roles.values()),
+            "emojis": [],
+            "stickers": [],
+            "features": [],
+            "verification_level": 0,
+            "default_message_notifications": 0,
+            "explicit_content_filter": 0,
+            "mfa_level": 0,
+            "nsfw_level": 0,
+            "premium_tier": 0,
+            "premium_subscription_count": 0,
+            "premium_progress_bar_enabled": False,
+            "preferred_locale": "en-US",
+            "afk_timeout": 300,
+            "system_channel_id": None,
+            "vanity_url_code": None,
+            "max_members": 500000,
+            "joined_at": iso(self.created),
+            "large": len(self.members) > 250,
+            "unavailable": False,
+            "member_count": len(self.members),
+            "members": [self.member_payload(m) for m in core if m in self.members],
+            "channels": [self.fake.channels[c] for c in self.channels],
+            "threads": [],
+            "presences": [],
+            "voice_states": [],
+            "stage_instances": [],
+            "guild_scheduled_events": [],
+        }
+
+
+class FakeDiscord:
+    def __init__(self, time_scale=1.0, shards=1, max_concurrency=1):
+        self.time_scale = time_scale
+        self.limiter = RateLimiter(time_scale)
+        self.shards = shards
+        self.max_concurrency = max_concurrency
+        self.identifies = []  # (monotonic time, shard_id)
+        self.guilds = {}
+        self.channels = {}  # channel_id -> payload
+        self.messages = defaultdict(dict)  # channel_id -> {message_id: payload}
+        self.users = {}  # user_id -> name, for users outside any guild
+        self.calls = Counter()  # "METHOD /route" -> count
+        self.rate_limited = Counter()
+        self.last_request = time.monotonic()
+        self._ids = itertools.count(1)
+        self._sockets = {}  # gateway socket -> (shard_id, shard_count)
+        self._sequence = 0
+        self.bot_id = self.snowflake()
+        self.application_id = self.bot_id
+        self.users[self.bot_id] = "benchbot"
+        self.url = None
+        self._runner = None
+
+    def snowflake(self, ms=None):
+        return snowflake_at(time.time() * 1000 if ms is None else ms, next(self._ids))
+
+    # Synthetic data
+
+    def add_guild(self, *, channels=500, roles=250, members=200_000, bans=50_000,
+                  timeouts=0, messages=500, old_messages=0, name="Benchmark Guild"):
+        """Builds a guild; ``messages`` are seeded in the command channel, the
+        first ``old_messages`` of them older than the 14 day bulk delete cutoff."""
+        now = time.time()
+        created = now - 3 * 365 * 86400
+        owner_id = self.snowflake(created * 1000)
+        guild = FakeGuild(self, self.snowflake(created * 1000), name, owner_id)
+        self.guilds[guild.id] = guild
+
+        everyone = {
+            "id": str(guild.id), "name": "@everyone", "color": 0, "hoist": False,
+            "position": 0, "permissions": str(EVERYONE_PERMISSIONS), "managed": False,
+            "mentionable": False, "flags": 0, "icon": None, "unicode_emoji": None,
+        }
+        guild.roles[guild.id] = everyone
+        role_ids = []
+        for position in range(1, roles + 1):
+            role_id = self.snowflake()
+            guild.roles[role_id] = dict(
+                everyone, id=str(role_id), name=f"role-{position}", position=position, permissions="0"
+            )
+            role_ids.append(role_id)
+        admin_role = self.snowflake()
+        guild.roles[admin_role] = dict(
+            everyone, id=str(admin_role), name="bot", position=roles + 1, permissions=str(ADMINISTRATOR), managed=True
+        )
+
+        per_category = 50
+        category_id = None
+        for position in range(channels):
+            if position % per_category == 0:
+                category_id = self.snowflake()
+                self.channels[category_id] = self._channel_payload(
+                    guild.id, category_id, f"category-{position // per_category}", 4, position // per_category, None
+                )
+                guild.channels.append(category_id)
+            channel_id = self.snowflake()
+            self.channels[channel_id] = self._channel_payload(
+                guild.id, channel_id, f"channel-{position}", 0, position, category_id
+            )
+            guild.channels.append(channel_id)
+        guild.command_channel = next(c for c in guild.channels if self.channels[c]["type"] == 0)
+
+        guild.members[owner_id] = ["owner", [], created, None, False]
+        guild.members[self.bot_id] = ["benchbot", [admin_role], created, None, True]
+        guild.member_ids = [owner_id, self.bot_id]
+        span = (now - created) * 1000
+        for i in range(members - 2):
+            joined = created + (i + 1) * (now - created) / members
+            user_id = snowflake_at(created * 1000 - span + i * span / members, i)
+            assigned = [role_ids[i % len(role_ids)]] if role_ids else []
+            until = now + 86400 if i < timeouts else None
+            guild.members[user_id] = [f"user{i}", assigned, joined, until, False]
+            guild.member_ids.append(user_id)
+
+        guild.ban_ids = sorted(snowflake_at(created * 1000 - span + i * 1000, 0x200000 + i) for i in range(bans))
+
+        channel = guild.command_channel
+        authors = guild.member_ids[2:] or [owner_id]
+        for i in range(messages):
+            if i < old_messages:
+                ms = (now - BULK_DELETE_MAX_AGE - 86400 + i) * 1000
+            else:
+                ms = (now - 3600 + i * 3600 / max(messages, 1)) * 1000
+            message = self._message_payload(channel, authors[i % len(authors)], guild, f"message {i}", ms=ms)
+            self.messages[channel][int(message["id"])] = message
+        return guild
+
+    def _channel_payload(self, guild_id, channel_id, name, type_, position, parent_id):
+        payload = {
+            "id": str(channel_id), "type": type_, "guild_id": str(guild_id), "name": name,
+            "position": position, "permission_overwrites": [], "parent_id": str(parent_id) if parent_id else None,
+            "nsfw": False, "flags": 0,
+        }
+        if type_ == 0:
+            payload.update(topic=None, rate_limit_per_user=0, last_message_id=None)
+        return payload
+
+    def _author(self, guild, user_id):
+        if guild and user_id in guild.members:
+            name, _, _, _, bot = guild.members[user_id]
+            return user_payload(user_id, name, bot)
+        return user_payload(user_id, self.users.get(user_id, f"user{user_id}"), user_id == self.bot_id)
+
+    def _message_payload(self, channel_id, author_id, guild, content, ms=None, **fields):
+        message_id = self.snowflake(ms)
+        payload = {
+            "id": str(message_id),
+            "channel_id": str(channel_id),
+            "author": self._author(guild, author_id),
+            "content": content,
+            "timestamp": iso(snowflake_time(message_id)),
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": [],
+            "components": [],
+            "reactions": [],
+            "pinned": False,
+            "type": 0,
+            "flags": 0,
+        }
+        if guild is not None:
+            payload["guild_id"] = str(guild.id)
+            if author_id in guild.members:
+                member = guild.member_payload(author_id)
+                member.pop("user")
+                payload["member"] = member
+        payload.update(fields)
+        return payload
+
+    def _guild_of(self, channel_id):
+        channel = self.channels.get(channel_id)
+        if channel and "guild_id" in channel:
+            return self.guilds.get(int(channel["guild_id"]))
+        return None
+
+    # Driving the bot
+
+    async def send_message(self, channel_id, author_id, content):
+        """Posts a user message and dispatches MESSAGE_CREATE; returns its ID."""
+        guild = self._guild_of(channel_id)
+        message = self._message_payload(channel_id, author_id, guild, content)
+        self.messages[channel_id][int(message["id"])] = message
+        await self.dispatch("MESSAGE_CREATE", message)
+        return int(message["id"])
+
+    async def join_member(self, guild, name=None):
+        """Adds a new member and dispatches GUILD_MEMBER_ADD; returns its ID."""
+        user_id = self.snowflake()
+        guild.members[user_id] = [name or f"joiner{user_id % 100000}", [], time.time(), None, False]
+        guild.member_ids.append(user_id)
+        await self.dispatch("GUILD_MEMBER_ADD", dict(guild.member_payload(user_id), guild_id=str(guild.id)))
+        return user_id
+
+    async def add_reaction(self, channel_id, message_id, user_id, emoji):
+        guild = self._guild_of(channel_id)
+        message = self.messages[channel_id].get(message_id)
+        if message is not None:
+            self._reactors(message, emoji).add(user_id)
+        payload = {
+            "user_id": str(user_id), "channel_id": str(channel_id), "message_id": str(message_id),
+            "emoji": {"id": None, "name": emoji}, "burst": False, "type": 0,
+        }
+        if guild is not None:
+            payload["guild_id"] = str(guild.id)
+            payload["member"] = guild.member_payload(user_id)
+        await self.dispatch("MESSAGE_REACTION_ADD", payload)
+
+    def _reactors(self, message, emoji):
+        return message.setdefault("_reactors", {}).setdefault(emoji, set())
+
+    def reset_counters(self):
+        self.calls.clear()
+        self.rate_limited.clear()
+
+    async def wait_idle(self, quiet=1.0, timeout=30.0):
+        """Waits until no REST request has arrived for ``quiet`` seconds."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            idle = time.monotonic() - self.last_request
+            if idle >= quiet:
+                return
+            await asyncio.sleep(quiet - idle)
+
+    # Server
+
+    async def start(self, host="127.0.0.1", port=0):
+        app = web.Application(middlewares=[self._middleware], client_max_size=64 * 1024 * 1024)
+        app.router.add_get("/gateway", self._gateway)
+        app.add_routes(self._routes())
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def close(self):
+        for ws in list(self._sockets):
+            await ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def patch_discord(self):
+        """Points discord.py's REST and gateway URLs at this server."""
+        import discord.gateway
+        import discord.http
+        import yarl
+
+        discord.http.Route.BASE = self.url + API_PREFIX
+        discord.gateway.DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(self.url.replace("http", "ws", 1) + "/gateway")
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        if not request.path.startswith(API_PREFIX):
+            return await handler(request)
+        self.last_request = time.monotonic()
+        route = request.match_info.route.resource
+        template = route.canonical[len(API_PREFIX):] if route is not None else request.path
+        key = f"{request.method} {template}"
+        self.calls[key] += 1
+        info = request.match_info
+        major = info.get("channel_id") or info.get("guild_id")
+        headers, limited = self.limiter.check(key, major)
+        # API responses come through Discord's proxy; discord.py treats a 429
+        # without this header as a Cloudflare ban
+        headers["Via"] = "1.1 google"
+        if limited is not None:
+            self.rate_limited[key] += 1
+            return json_response(limited, status=429, headers=headers)
+        response = await handler(request)
+        response.headers.update(headers)
+        return response
+
+    def _routes(self):
+        p = API_PREFIX
+        return [
+            web.get(p + "/gateway", self._get_gateway),
+            web.get(p + "/gateway/bot", self._get_gateway),
+            web.get(p + "/users/@me", self._get_me),
+            web.get(p + "/oauth2/applications/@me", self._get_application),
+            web.put(p + "/applications/{application_id}/commands", self._put_commands),
+            web.get(p + "/users/{user_id}", self._get_user),
+            web.post(p + "/users/@me/channels", self._create_dm),
+            web.get(p + "/channels/{channel_id}", self._get_channel),
+            web.patch(p + "/channels/{channel_id}", self._edit_channel),
+            web.put(p + "/channels/{channel_id}/permissions/{overwrite_id}", self._put_overwrite),
+            web.delete(p + "/channels/{channel_id}/permissions/{overwrite_id}", self._delete_overwrite),
+            web.get(p + "/channels/{channel_id}/messages", self._get_messages),
+            web.post(p + "/channels/{channel_id}/messages", self._create_message),
+            web.post(p + "/channels/{channel_id}/messages/bulk-delete", self._bulk_delete),
+            web.get(p + "/channels/{channel_id}/messages/{message_id}", self._get_message),
+            web.patch(p + "/channels/{channel_id}/messages/{message_id}", self._edit_message),
+            web.delete(p + "/channels/{channel_id}/messages/{message_id}", self._delete_message),
+            web.put(p + "/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me", self._put_reaction),
+            web.delete(p + "/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me", self._delete_own_reaction),
+            web.get(p + "/channels/{channel_id}/messages/{message_id}/reactions/{emoji}", self._get_reactions),
+            web.get(p + "/guilds/{guild_id}", self._get_guild),
+            web.get(p + "/guilds/{guild_id}/members/{user_id}", self._get_member),
+            web.patch(p + "/guilds/{guild_id}/members/{user_id}", self._edit_member),
+            web.delete(p + "/guilds/{guild_id}/members/{user_id}", self._kick),
+            web.get(p + "/guilds/{guild_id}/bans", self._get_bans),
+            web.put(p + "/guilds/{guild_id}/bans/{user_id}", self._ban),
+            web.delete(p + "/guilds/{guild_id}/bans/{user_id}", self._unban),
+            web.post(p + "/guilds/{guild_id}/bulk-ban", self._bulk_ban),
+            web.post(p + "/guilds/{guild_id}/channels", self._create_channel),
+            web.post(p + "/guilds/{guild_id}/roles", self._create_role),
+            web.patch(p + "/guilds/{guild_id}/roles/{role_id}", self._edit_role),
+            web.delete(p + "/guilds/{guild_id}/roles/{role_id}", self._delete_role),
+            web.put(p + "/guilds/{guild_id}/members/{user_id}/roles/{role_id}", self._add_member_role),
+            web.delete(p + "/guilds/{guild_id}/members/{user_id}/roles/{role_id}", self._remove_member_role),
+        ]
+
+    # Gateway
+
+    async def dispatch(self, event, data):
+        self._sequence += 1
+        frame = json.dumps({"op": 0, "t": event, "s": self._sequence, "d": data})
+        guild_id = data.get("guild_id")
+        for ws, (shard_id, shard_count) in list(self._sockets.items()):
+            if guild_id is not None and (int(guild_id) >> 22) % shard_count != shard_id:
+                continue
+            if not ws.closed:
+                await ws.send_str(frame)
+
+    async def _gateway(self, request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        await ws.send_json({"op": 10, "d": {"heartbeat_interval": 41250}})
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                frame = json.loads(msg.data)
+                op, data = frame.get("op"), frame.get("d")
+                if op == 1:
+                    await ws.send_json({"op": 11})
+                elif op == 2:
+                    shard = data.get("shard") or [0, 1]
+                    self._sockets[ws] = tuple(shard)
+                    self.identifies.append((time.monotonic(), shard[0]))
+                    await self._identify(ws, *shard)
+                elif op == 8:
+                    await self._send_member_chunks(ws, data)
+        finally:
+            self._sockets.pop(ws, None)
+        return ws
+
+    async def _send_event(self, ws, event, data):
+        self._sequence += 1
+        await ws.send_str(json.dumps({"op": 0, "t": event, "s": self._sequence, "d": data}))
+
+    async def _identify(self, ws, shard_id, shard_count):
+        guilds = [g for g in self.guilds.values() if (g.id >> 22) % shard_count == shard_id]
+        await self._send_event(ws, "READY", {
+            "v": 10,
+            "user": user_payload(self.bot_id, "benchbot", True),
+            "guilds": [{"id": str(g.id), "unavailable": True} for g in guilds],
+            "session_id": "fake-session",
+            "resume_gateway_url": self.url.replace("http", "ws", 1) + "/gateway",
+            "application": {"id": str(self.application_id), "flags": 0},
+            "private_channels": [],
+            "relationships": [],
+            "shard": [shard_id, shard_count],
+        })
+        for guild in guilds:
+            await self._send_event(ws, "GUILD_CREATE", guild.payload())
+
+    async def _send_member_chunks(self, ws, data):
+        guild = self.guilds.get(int(data["guild_id"]))
+        if guild is None:
+            return
+        if data.get("user_ids"):
+            wanted = [int(u) for u in data["user_ids"]]
+            member_ids = [u for u in wanted if u in guild.members]
+        else:
+            query = (data.get("query") or "").lower()
+            member_ids = guild.member_ids
+            if query:
+                member_ids = [u for u in member_ids if guild.members[u][0].lower().startswith(query)]
+            if data.get("limit"):
+                member_ids = member_ids[: data["limit"]]
+        chunk_count = max(1, -(-len(member_ids) // 1000))
+        for index in range(chunk_count):
+            chunk = member_ids[index * 1000:(index + 1) * 1000]
+            await self._send_event(ws, "GUILD_MEMBERS_CHUNK", {
+                "guild_id": str(guild.id),
+                "members": [guild.member_payload(u) for u in chunk],
+                "chunk_index": index,
+                "chunk_count": chunk_count,
+                "nonce": data.get("nonce"),
+            })
+
+    # REST helpers
+
+    @staticmethod
+    async def _body(request):
+        if not request.can_read_body:
+            return {}
+        if request.content_type.startswith("multipart/"):
+            form = await request.post()
+            return json.loads(form.get("payload_json") or "{}")
+        return await request.json()
+
+    @staticmethod
+    def _error(status, code, message):
+        return json_response({"message": message, "code": code}, status=status)
+
+    def _guild(self, request):
+        return self.guilds.get(int(request.match_info["guild_id"]))
+
+    def _message(self, request):
+        channel_id = int(request.match_info["channel_id"])
+        return channel_id, self.messages[channel_id].get(int(request.match_info["message_id"]))
+
+    # REST: session
+
+    async def _get_gateway(self, request):
+        return json_response({
+            "url": self.url.replace("http", "ws", 1) + "/gateway",
+            "shards": self.shards,
+            "session_start_limit": {
+                "total": 1000, "remaining": 1000, "reset_after": 0, "max_concurrency": self.max_concurrency,
+            },
+        })
+
+    async def _get_me(self, request):
+        return json_response(user_payload(self.bot_id, "benchbot", True))
+
+    async def _get_application(self, request):
+        return json_response({
+            "id": str(self.application_id), "name": "benchbot", "description": "", "icon": None,
+            "bot_public": True, "bot_require_code_grant": False, "verify_key": "0" * 64, "flags": 0,
+            "owner": user_payload(next(iter(self.guilds.values())).owner_id if self.guilds else self.bot_id, "owner"),
+        })
+
+    async def _put_commands(self, request):
+        return json_response([])
+
+    async def _get_user(self, request):
+        user_id = int(request.match_info["user_id"])
+        for guild in self.guilds.values():
+            if user_id in guild.members:
+                return json_response(self._author(guild, user_id))
+        return json_response(self._author(None, user_id))
+
+    async def _create_dm(self, request):
+        recipient = int((await self._body(request))["recipient_id"])
+        channel_id = self.snowflake()
+        self.channels[channel_id] = {
+            "id": str(channel_id), "type": 1, "last_message_id": None,
+            "recipients": [self._author(None, recipient)],
+        }
+        return json_response(self.channels[channel_id])
+
+    # REST: channels
+
+    async def _get_channel(self, request):
+        channel = self.channels.get(int(request.match_info["channel_id"]))
+        if channel is None:
+            return self._error(404, 10003, "Unknown Channel")
+        return json_response(channel)
+
+    async def _edit_channel(self, request):
+        channel = self.channels.get(int(request.match_info["channel_id"]))
+        if channel is None:
+            return self._error(404, 10003, "Unknown Channel")
+        body = await self._body(request)
+        for key, value in body.items():
+            if key == "permission_overwrites":
+                value = [
+                    {"id": str(o["id"]), "type": o["type"], "allow": str(o["allow"]), "deny": str(o["deny"])}
+                    for o in value
+                ]
+            channel[key] = value
+        await self.dispatch("CHANNEL_UPDATE", channel)
+        return json_response(channel)
+
+    async def _put_overwrite(self, request):
+        channel = self.channels.get(int(request.match_info["channel_id"]))
+        if channel is None:
+            return self._error(404, 10003, "Unknown Channel")
+        body = await self._body(request)
+        target = request.match_info["overwrite_id"]
+        overwrites = [o for o in channel["permission_overwrites"] if o["id"] != target]
+        overwrites.append({"id": target, "type": body["type"], "allow": str(body["allow"]), "deny": str(body["deny"])})
+        channel["permission_overwrites"] = overwrites
+        await self.dispatch("CHANNEL_UPDATE", channel)
+        return web.Response(status=204)
+
+    async def _delete_overwrite(self, request):
+        channel = self.channels.get(int(request.match_info["channel_id"]))
+        if channel is None:
+            return self._error(404, 10003, "Unknown Channel")
+        target = request.match_info["overwrite_id"]
+        channel["permission_overwrites"] = [o for o in channel["permission_overwrites"] if o["id"] != target]
+        await self.dispatch("CHANNEL_UPDATE", channel)
+        return web.Response(status=204)
+
+    async def _create_channel(self, request):
+        guild = self._guild(request)
+        body = await self._body(request)
+        channel_id = self.snowflake()
+        parent_id = body.get("parent_id")
+        channel = self._channel_payload(
+            guild.id, channel_id, body["name"], body.get("type", 0), len(guild.channels), parent_id and int(parent_id)
+        )
+        channel["permission_overwrites"] = [
+            {"id": str(o["id"]), "type": o["type"], "allow": str(o["allow"]), "deny": str(o["deny"])}
+            for o in body.get("permission_overwrites", [])
+        ]
+        self.channels[channel_id] = channel
+        guild.channels.append(channel_id)
+        await self.dispatch("CHANNEL_CREATE", channel)
+        return json_response(channel)
+
+    # REST: messages
+
+    async def _get_messages(self, request):
+        channel_id = int(request.match_info["channel_id"])
+        limit = min(int(request.query.get("limit", 50)), 100)
+        ids = sorted(self.messages[channel_id])
+        if "before" in request.query:
+            ids = ids[:bisect.bisect_left(ids, int(request.query["before"]))]
+            page = ids[-limit:]
+        elif "after" in request.query:
+            ids = ids[bisect.bisect_right(ids, int(request.query["after"])):]
+            page = ids[:limit]
+        else:
+            page = ids[-limit:]
+        messages = [self._public(self.messages[channel_id][m]) for m in reversed(page)]
+        return json_response(messages)
+
+    @staticmethod
+    def _public(message):
+        return {k: v for k, v in message.items() if not k.startswith("_")}
+
+    async def _create_message(self, request):
+        channel_id = int(request.match_info["channel_id"])
+        if channel_id not in self.channels:
+            return self._error(404, 10003, "Unknown Channel")
+        body = await self._body(request)
+        guild = self._guild_of(channel_id)
+        message = self._message_payload(
+            channel_id, self.bot_id, guild, body.get("content") or "",
+            embeds=body.get("embeds") or [], components=body.get("components") or [],
+        )
+        self.messages[channel_id][int(message["id"])] = message
+        await self.dispatch("MESSAGE_CREATE", message)
+        return json_response(message)
+
+    async def _get_message(self, request):
+        _, message = self._message(request)
+        if message is None:
+            return self._error(404, 10008, "Unknown Message")
+        return json_response(self._public(message))
+
+    async def _edit_message(self, request):
+        channel_id, message = self._message(request)
+        if message is None:
+            return self._error(404, 10008, "Unknown Message")
+        body = await self._body(request)
+        for key in ("content", "embeds", "components", "flags"):
+            if key in body:
+                message[key] = body[key]
+        message["edited_timestamp"] = iso(time.time())
+        await self.dispatch("MESSAGE_UPDATE", self._public(message))
+        return json_response(self._public(message))
+
+    async def _delete_message(self, request):
+        channel_id, message = self._message(request)
+        if message is None:
+            return self._error(404, 10008, "Unknown Message")
+        del self.messages[channel_id][int(message["id"])]
+        payload = {"id": message["id"], "channel_id": str(channel_id)}
+        if "guild_id" in message:
+            payload["guild_id"] = message["guild_id"]
+        await self.dispatch("MESSAGE_DELETE", payload)
+        return web.Response(status=204)
+
+    async def _bulk_delete(self, request):
+        channel_id = int(request.match_info["channel_id"])
+        ids = [int(m) for m in (await self._body(request)).get("messages", [])]
+        if not 2 <= len(ids) <= 100:
+            return self._error(400, 50016, "You must provide between 2 and 100 messages to delete")
+        cutoff = time.time() - BULK_DELETE_MAX_AGE
+        if any(snowflake_time(m) < cutoff for m in ids):
+            return self._error(400, 50034, "You can only bulk delete messages that are under 14 days old.")
+        for message_id in ids:
+            self.messages[channel_id].pop(message_id, None)
+        payload = {"ids": [str(m) for m in ids], "channel_id": str(channel_id)}
+        guild = self._guild_of(channel_id)
+        if guild is not None:
+            payload["guild_id"] = str(guild.id)
+        await self.dispatch("MESSAGE_DELETE_BULK", payload)
+        return web.Response(status=204)
+
+    async def _put_reaction(self, request):
+        _, message = self._message(request)
+        if message is None:
+            return self._error(404, 10008, "Unknown Message")
+        self._reactors(message, unquote(request.match_info["emoji"])).add(self.bot_id)
+        return web.Response(status=204)
+
+    async def _delete_own_reaction(self, request):
+        _, message = self._message(request)
+        if message is None:
+            return self._error(404, 10008, "Unknown Message")
+        self._reactors(message, unquote(request.match_info["emoji"])).discard(self.bot_id)
+        return web.Response(status=204)
+
+    async def _get_reactions(self, request):
+        channel_id, message = self._message(request)
+        if message is None:
+            return self._error(404, 10008, "Unknown Message")
+        users = sorted(self._reactors(message, unquote(request.match_info["emoji"])))
+        after = int(request.query.get("after", 0))
+        limit = min(int(request.query.get("limit", 25)), 100)
+        page = users[bisect.bisect_right(users, after):][:limit]
+        guild = self._guild_of(channel_id)
+        return json_response([self._author(guild, u) for u in page])
+
+    # REST: guilds
+
+    async def _get_guild(self, request):
+        guild = self._guild(request)
+        if guild is None:
+            return self._error(404, 10004, "Unknown Guild")
+        payload = guild.payload()
+        for key in ("members", "channels", "threads", "presences", "voice_states"):
+            payload.pop(key)
+        payload["approximate_member_count"] = len(guild.members)
+        return json_response(payload)
+
+    async def _get_member(self, request):
+        guild = self._guild(request)
+        user_id = int(request.match_info["user_id"])
+        if guild is None or user_id not in guild.members:
+            return self._error(404, 10007, "Unknown Member")
+        return json_response(guild.member_payload(user_id))
+
+    async def _edit_member(self, request):
+        guild = self._guild(request)
+        user_id = int(request.match_info["user_id"])
+        if guild is None or user_id not in guild.members:
+            return self._error(404, 10007, "Unknown Member")
+        body = await self._body(request)
+        member = guild.members[user_id]
+        if "communication_disabled_until" in body:
+            until = body["communication_disabled_until"]
+            member[3] = datetime.fromisoformat(until).timestamp() if until else None
+        if "roles" in body:
+            member[1] = [int(r) for r in body["roles"]]
+        payload = guild.member_payload(user_id)
+        await self.dispatch("GUILD_MEMBER_UPDATE", dict(payload, guild_id=str(guild.id)))
+        return json_response(payload)
+
+    async def _set_member_role(self, request, add):
+        guild = self._guild(request)
+        user_id = int(request.match_info["user_id"])
+        role_id = int(request.match_info["role_id"])
+        if guild is None or user_id not in guild.members:
+            return self._error(404, 10007, "Unknown Member")
+        if role_id not in guild.roles:
+            return self._error(404, 10011, "Unknown Role")
+        roles = guild.members[user_id][1]
+        if add and role_id not in roles:
+            roles.append(role_id)
+        elif not add and role_id in roles:
+            roles.remove(role_id)
+        payload = guild.member_payload(user_id)
+        await self.dispatch("GUILD_MEMBER_UPDATE", dict(payload, guild_id=str(guild.id)))
+        return web.Response(status=204)
+
+    async def _add_member_role(self, request):
+        return await self._set_member_role(request, True)
+
+    async def _remove_member_role(self, request):
+        return await self._set_member_role(request, False)
+
+    # REST: roles
+
+    async def _create_role(self, request):
+        guild = self._guild(request)
+        body = await self._body(request)
+        role_id = self.snowflake()
+        role = dict(
+            guild.roles[guild.id], id=str(role_id), name=body.get("name", "new role"),
+            permissions=str(body.get("permissions", 0)), color=body.get("color", 0), position=1,
+        )
+        guild.roles[role_id] = role
+        await self.dispatch("GUILD_ROLE_CREATE", {"guild_id": str(guild.id), "role": role})
+        return json_response(role)
+
+    async def _edit_role(self, request):
+        guild = self._guild(request)
+        role = guild.roles.get(int(request.match_info["role_id"])) if guild else None
+        if role is None:
+            return self._error(404, 10011, "Unknown Role")
+        body = await self._body(request)
+        role.update({k: str(v) if k == "permissions" else v for k, v in body.items() if k in role})
+        await self.dispatch("GUILD_ROLE_UPDATE", {"guild_id": str(guild.id), "role": role})
+        return json_response(role)
+
+    async def _delete_role(self, request):
+        guild = self._guild(request)
+        role_id = int(request.match_info["role_id"])
+        if guild is None or role_id not in guild.roles:
+            return self._error(404, 10011, "Unknown Role")
+        del guild.roles[role_id]
+        for member in guild.members.values():
+            if role_id in member[1]:
+                member[1].remove(role_id)
+        await self.dispatch("GUILD_ROLE_DELETE", {"guild_id": str(guild.id), "role_id": str(role_id)})
+        return web.Response(status=204)
+
+    async def _remove_member(self, guild, user_id):
+        guild.members.pop(user_id, None)
+        try:
+            guild.member_ids.remove(user_id)
+        except ValueError:
+            pass
+        await self.dispatch("GUILD_MEMBER_REMOVE", {"guild_id": str(guild.id), "user": self._author(None, user_id)})
+
+    async def _kick(self, request):
+        guild = self._guild(request)
+        user_id = int(request.match_info["user_id"])
+        if guild is None or user_id not in guild.members:
+            return self._error(404, 10007, "Unknown Member")
+        await self._remove_member(guild, user_id)
+        return web.Response(status=204)
+
+    async def _get_bans(self, request):
+        guild = self._guild(request)
+        if guild is None:
+            return self._error(404, 10004, "Unknown Guild")
+        limit = min(int(request.query.get("limit", 1000)), 1000)
+        ids = guild.ban_ids
+        if "before" in request.query:
+            page = ids[:bisect.bisect_left(ids, int(request.query["before"]))][-limit:]
+        else:
+            page = ids[bisect.bisect_right(ids, int(request.query.get("after", 0))):][:limit]
+        return json_response([guild.ban_payload(u) for u in page])
+
+    async def _add_ban(self, guild, user_id, reason):
+        index = bisect.bisect_left(guild.ban_ids, user_id)
+        if index < len(guild.ban_ids) and guild.ban_ids[index] == user_id:
+            return False
+        user = self._author(guild, user_id)
+        guild.ban_ids.insert(index, user_id)
+        guild.ban_reasons[user_id] = reason
+        if user_id in guild.members:
+            await self._remove_member(guild, user_id)
+        await self.dispatch("GUILD_BAN_ADD", {"guild_id": str(guild.id), "user": user})
+        return True
+
+    async def _ban(self, request):
+        guild = self._guild(request)
+        if guild is None:
+            return self._error(404, 10004, "Unknown Guild")
+        reason = unquote(request.headers.get("X-Audit-Log-Reason", "")) or None
+        await self._add_ban(guild, int(request.match_info["user_id"]), reason)
+        return web.Response(status=204)
+
+    async def _bulk_ban(self, request):
+        guild = self._guild(request)
+        if guild is None:
+            return self._error(404, 10004, "Unknown Guild")
+        body = await self._body(request)
+        user_ids = [int(u) for u in body.get("user_ids", [])]
+        if not 1 <= len(user_ids) <= 200:
+            return self._error(400, 50035, "Invalid Form Body")
+        reason = unquote(request.headers.get("X-Audit-Log-Reason", "")) or None
+        banned, failed = [], []
+        for user_id in user_ids:
+            (banned if await self._add_ban(guild, user_id, reason) else failed).append(str(user_id))
+        return json_response({"banned_users": banned, "failed_users": failed})
+
+    async def _unban(self, request):
+        guild = self._guild(request)
+        if guild is None:
+            return self._error(404, 10004, "Unknown Guild")
+        user_id = int(request.match_info["user_id"])
+        index = bisect.bisect_left(guild.ban_ids, user_id)
+        if index == len(guild.ban_ids) or guild.ban_ids[index] != user_id:
+            return self._error(404, 10026, "Unknown Ban")
+        del guild.ban_ids[index]
+        guild.ban_reasons.pop(user_id, None)
+        await self.dispatch("GUILD_BAN_REMOVE", {"guild_id": str(guild.id), "user": guild.ban_payload(user_id)["user"]})
+        return web.Response(status=204)
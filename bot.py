@@ -1,15 +1,33 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord.ext.commands import Bot, Context
+import aiohttp
+import array
 import asyncio
+import bisect
+import contextvars
+import copy
+import difflib
+import heapq
+import io
+import itertools
+import json
+import math
 import os
+import sqlite3
+import sys
+import threading
+import time
 from dotenv import load_dotenv
 from datetime import timedelta
 import re
 from datetime import datetime, timezone
 from typing import Optional
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque
+from collections.abc import MutableMapping
+from dateutil.relativedelta import relativedelta
 from discord import app_commands
+from aiohttp import web
 
 message_deltas = defaultdict(int)  # guild_id -> message count
 member_deltas = defaultdict(int)  # guild_id -> member join count
@@ -22,51 +40,930 @@ intents.message_content = True
 intents.members = True
 intents.guilds = True
 
-async def get_prefix(bot, message):
-    """Get the prefix for the guild, with fallback to default."""
-    if message.guild is None:
-        return ","
-    return custom_prefixes.get(message.guild.id, ",")
+# Low-memory mode
+# LOW_MEMORY=1 skips chunking guilds at startup and only keeps recently active
+# members cached (see trim_member_cache). Commands that need a guild's full
+# member list call ensure_chunked, which chunks that guild on demand.
+LOW_MEMORY = os.getenv("LOW_MEMORY", "").lower() in ("1", "true", "yes")
+
+def get_prefix(bot, message):
+    """The prefix the message starts with, or the guild's main prefix if none."""
+    return match_prefix(message) or guild_prefix(message.guild)
+
+
+# Sharding and clusters
+# SHARD_COUNT (a number, or "auto" for Discord's recommendation) switches to
+# AutoShardedBot. launcher.py runs several such processes ("clusters"), each
+# with its own SHARD_IDS, its own STATE_DB_PATH, so guild state lives with the
+# cluster that receives the guild's events, and a connection to the launcher's
+# IPC hub on CLUSTER_IPC_PORT. The hub paces IDENTIFYs across processes and
+# relays queries and events between clusters.
+SHARD_COUNT = os.getenv("SHARD_COUNT")
+SHARD_IDS = [int(s) for s in os.getenv("SHARD_IDS", "").split(",") if s.strip()] or None
+CLUSTER_ID = int(os.getenv("CLUSTER_ID", "0"))
+CLUSTER_IPC_PORT = int(os.getenv("CLUSTER_IPC_PORT", "0"))
+CLUSTER_QUERY_TIMEOUT = 5.0  # seconds to wait for the other clusters' answers
+
+# Every REST request discord.py makes is traced for the metrics endpoint
+http_trace = aiohttp.TraceConfig()
+
+if SHARD_COUNT:
+    bot = commands.AutoShardedBot(
+        command_prefix=get_prefix,
+        intents=intents,
+        help_command=None,
+        http_trace=http_trace,
+        chunk_guilds_at_startup=not LOW_MEMORY,
+        shard_count=None if SHARD_COUNT == "auto" else int(SHARD_COUNT),
+        shard_ids=SHARD_IDS,
+    )
+else:
+    bot = commands.Bot(
+        command_prefix=get_prefix,
+        intents=intents,
+        help_command=None,
+        http_trace=http_trace,
+        chunk_guilds_at_startup=not LOW_MEMORY,
+    )
+
+cluster_handlers = {}  # query/event name -> function(**args) run for other clusters
+
+
+def cluster_handler(name):
+    """Registers a function other clusters can query (or notify) by ``name``."""
+    def decorator(func):
+        cluster_handlers[name] = func
+        return func
+    return decorator
+
+
+class ClusterIPC:
+    """Client for launcher.py's hub: newline-delimited JSON over local TCP."""
+
+    def __init__(self, port):
+        self.port = port
+        self._writer = None
+        self._replies = {}  # request id -> Future
+        self._next_id = 0
+        self._reader_task = None
+
+    async def connect(self):
+        reader, self._writer = await asyncio.open_connection("127.0.0.1", self.port)
+        self._send({"op": "hello", "cluster_id": CLUSTER_ID})
+        self._reader_task = asyncio.create_task(self._read(reader))
+
+    def _send(self, message):
+        if self._writer is None or self._writer.is_closing():
+            raise ConnectionError("Not connected to the cluster hub")
+        self._writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+
+    async def _read(self, reader):
+        try:
+            async for line in reader:
+                message = json.loads(line)
+                op = message["op"]
+                if op == "reply":
+                    future = self._replies.pop(message["id"], None)
+                    if future is not None and not future.done():
+                        future.set_result(message["result"])
+                elif op in ("query", "event"):
+                    handler = cluster_handlers.get(message["name"])
+                    result = None
+                    try:
+                        if handler is not None:
+                            result = handler(**message["args"])
+                    except Exception as e:
+                        print(f"Error in cluster handler {message['name']}: {e}")
+                    if op == "query":
+                        self._send({"op": "reply", "id": message["id"], "result": result})
+        finally:
+            for future in self._replies.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Lost the cluster hub"))
+            self._replies.clear()
+
+    async def request(self, op, **fields):
+        self._next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self._replies[self._next_id] = future
+        try:
+            self._send({"op": op, "id": self._next_id, **fields})
+        except ConnectionError:
+            del self._replies[self._next_id]
+            raise
+        return await future
+
+    async def query(self, name, **args):
+        """Runs handler ``name`` on every other cluster and returns their results."""
+        try:
+            return await asyncio.wait_for(self.request("query", name=name, args=args), CLUSTER_QUERY_TIMEOUT)
+        except (asyncio.TimeoutError, ConnectionError):
+            return []
+
+    def broadcast(self, name, **args):
+        """Runs handler ``name`` on every other cluster without waiting."""
+        try:
+            self._send({"op": "event", "name": name, "args": args})
+        except ConnectionError:
+            pass
 
-bot = commands.Bot(command_prefix=get_prefix, intents=intents, help_command=None)
 
+cluster = ClusterIPC(CLUSTER_IPC_PORT) if CLUSTER_IPC_PORT else None
 
-# Helper: parse user from mention or ID
-def get_user_from_arg(guild, arg):
-    if arg.startswith("<@") and arg.endswith(">"):
-        user_id = int(arg.replace("<@!", "").replace("<@", "").replace(">", ""))
-        return guild.get_member(user_id)
+
+async def cluster_before_identify(shard_id, *, initial=False):
+    # The hub hands out IDENTIFY slots per max_concurrency bucket for all clusters
     try:
-        user_id = int(arg)
-        return guild.get_member(user_id)
-    except ValueError:
+        await cluster.request("identify", shard_id=shard_id)
+    except ConnectionError:
+        await asyncio.sleep(5.0)
+
+
+if cluster is not None:
+    bot.before_identify_hook = cluster_before_identify
+
+
+# Member resolver
+# Moderation commands take a member as a mention, an ID or a name. Names go
+# through a per-guild index of case-folded usernames, global names and
+# nicknames, kept sorted so a prefix lookup is a bisect; member events keep it
+# current. A name must match one member exactly, or be the prefix of only one
+# member's names; anything else is refused with the candidates listed, since
+# most callers ban, kick or mute. IDs that are not in the member cache are
+# fetched over REST, and fetched members are kept in a small LRU so repeated
+# commands on the same user do not fetch again.
+MEMBER_CACHE_SIZE = 1000
+MEMBER_PREFIX_SCAN = 50  # prefix matches looked at per lookup
+MEMBER_QUERY_LIMIT = 25
+MEMBER_CANDIDATES_SHOWN = 5
+MENTION_RE = re.compile(r"<@!?(\d{15,20})>$")
+
+
+def member_names(member):
+    """The case-folded names a member can be looked up by."""
+    names = {member.name.casefold()}
+    for name in (member.global_name, member.nick):
+        if name:
+            names.add(name.casefold())
+    return names
+
+
+class MemberNameIndex:
+    def __init__(self, members):
+        self._names = {}  # member_id -> set of indexed names
+        keys = []
+        for member in members:
+            names = self._names[member.id] = member_names(member)
+            keys.extend((name, member.id) for name in names)
+        keys.sort()
+        self._keys = keys  # sorted [(name, member_id)]
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, member):
+        """Indexes ``member`` under its current names (re-indexes a rename)."""
+        names = member_names(member)
+        old = self._names.get(member.id, set())
+        for name in old - names:
+            self._discard((name, member.id))
+        for name in names - old:
+            bisect.insort(self._keys, (name, member.id))
+        self._names[member.id] = names
+
+    def remove(self, member_id):
+        for name in self._names.pop(member_id, ()):
+            self._discard((name, member_id))
+
+    def _discard(self, key):
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+
+    def search(self, query):
+        """IDs of the members with a name starting with ``query`` (ignoring
+        case), exact names first, at most MEMBER_PREFIX_SCAN names."""
+        query = query.casefold()
+        start = bisect.bisect_left(self._keys, (query,))
+        ids = {}
+        for name, member_id in self._keys[start:start + MEMBER_PREFIX_SCAN]:
+            if not name.startswith(query):
+                break
+            ids.setdefault(member_id, None)
+        return list(ids)
+
+
+class AmbiguousMember(commands.CommandError):
+    """A name matched several members; on_command_error lists them."""
+
+    def __init__(self, query, candidates):
+        super().__init__(f"'{query}' matches several members")
+        self.query = query
+        self.candidates = candidates
+
+
+def pick_member(query, members):
+    """The member ``query`` names among ``members`` (prefix matches): the only
+    one with that exact name, else the only one. None if there is no match;
+    AmbiguousMember if several fit."""
+    folded = query.casefold()
+    exact = [member for member in members if folded in member_names(member)]
+    candidates = exact or members
+    if len(candidates) > 1:
+        raise AmbiguousMember(query, candidates)
+    return candidates[0] if candidates else None
+
+
+member_name_indexes = {}  # {guild_id: MemberNameIndex}
+fetched_members = OrderedDict()  # {(guild_id, user_id): Member}, least recently used first
+
+
+def get_member_index(guild):
+    """Returns the guild's member name index, building it on first use."""
+    index = member_name_indexes.get(guild.id)
+    if index is None:
+        index = MemberNameIndex(guild.members)
+        # Members chunked in later would never be added
+        if guild.chunked:
+            member_name_indexes[guild.id] = index
+    return index
+
+
+def remember_member(member):
+    key = (member.guild.id, member.id)
+    fetched_members[key] = member
+    fetched_members.move_to_end(key)
+    if len(fetched_members) > MEMBER_CACHE_SIZE:
+        fetched_members.popitem(last=False)
+
+
+def forget_fetched_members(guild_id):
+    for key in [k for k in fetched_members if k[0] == guild_id]:
+        del fetched_members[key]
+
+
+async def fetch_member_cached(guild, user_id):
+    """The member with ``user_id`` from the cache, the LRU or the API, or None
+    if they are not in the guild."""
+    member = guild.get_member(user_id)
+    if member is not None:
+        return member
+    member = fetched_members.get((guild.id, user_id))
+    if member is not None:
+        fetched_members.move_to_end((guild.id, user_id))
+        return member
+    try:
+        member = await guild.fetch_member(user_id)
+    except (discord.NotFound, discord.HTTPException):
         return None
+    remember_member(member)
+    return member
+
+
+async def resolve_member(guild, arg):
+    """Resolves a mention, an ID or a username, global name or nickname (or
+    an unambiguous prefix of one) to a member of ``guild``, or None. Raises
+    AmbiguousMember when a name fits several members."""
+    match = MENTION_RE.match(arg)
+    if match or arg.isdigit():
+        return await fetch_member_cached(guild, int(match.group(1) if match else arg))
+    query = arg.removeprefix("@")
+    if not query:
+        return None
+    members = {}
+    for member_id in get_member_index(guild).search(query):
+        member = guild.get_member(member_id)
+        if member is not None:
+            members[member.id] = member
+    if not guild.chunked:
+        # The cache only holds some members; ask the gateway about the rest.
+        # If that fails the name cannot be checked for ambiguity, so give up.
+        try:
+            queried = await guild.query_members(query, limit=MEMBER_QUERY_LIMIT)
+        except (asyncio.TimeoutError, discord.ClientException):
+            return None
+        for member in queried:
+            members.setdefault(member.id, member)
+    member = pick_member(query, list(members.values()))
+    if member is not None and guild.get_member(member.id) is None:
+        remember_member(member)
+    return member
+
+
+# Persistent state store
+# All bot state lives in memory as before, but the dicts and sets below are
+# backed by a SQLite (WAL) database. Mutations only queue a row change; a
+# background task flushes the queue in batches from a worker thread, so command
+# handlers never wait on disk. Everything is loaded back into memory at startup.
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "bot_state.db")
+STATE_FLUSH_INTERVAL = 1.0  # seconds between write-behind flushes
+STATE_FLUSH_BATCH = 10000  # flush early once this many changes are queued
+
+
+def _state_default(obj):
+    if isinstance(obj, datetime):
+        return {"__datetime__": obj.isoformat()}
+    if isinstance(obj, discord.PermissionOverwrite):
+        allow, deny = obj.pair()
+        return {"__overwrite__": [allow.value, deny.value]}
+    if isinstance(obj, StateRecord):
+        return obj.to_dict()
+    raise TypeError(f"Cannot persist {obj.__class__.__name__}")
+
+
+def _state_object_hook(obj):
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    if "__overwrite__" in obj:
+        allow, deny = obj["__overwrite__"]
+        return discord.PermissionOverwrite.from_pair(
+            discord.Permissions(allow), discord.Permissions(deny)
+        )
+    return obj
+
+
+_state_decoder = json.JSONDecoder(object_hook=_state_object_hook)
+
+
+def _encode_state_key(path):
+    return "[" + ",".join(str(k) if type(k) is int else json.dumps(k) for k in path) + "]"
+
+
+def _encode_state_value(value):
+    if type(value) is int:
+        return str(value)
+    return json.dumps(value, default=_state_default, separators=(",", ":"))
+
+
+class StateStore:
+    """Write-behind SQLite store for PersistentDict/PersistentSet collections.
+
+    Rows are ``(namespace, key, value)`` where ``key`` is the JSON-encoded path
+    of a leaf inside its collection, e.g. ``[guild_id,user_id]``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.collections = {}
+        # (namespace, key) -> queued operation. Re-writing a key moves it to the
+        # end so the flush always replays changes in their final order.
+        self._pending = {}
+        self._prefix_ops = 0
+        self._conn = None
+        self._write_lock = threading.Lock()
+        self._wakeup = None
+        self._flush_task = None
+
+    def register(self, namespace, collection):
+        self.collections[namespace] = collection
+
+    def _queue(self, key, op):
+        self._pending.pop(key, None)
+        self._pending[key] = op
+        if self._wakeup is not None and len(self._pending) >= STATE_FLUSH_BATCH:
+            self._wakeup.set()
+
+    def put(self, namespace, path, value):
+        self._queue((namespace, _encode_state_key(path)), ("put", _encode_state_value(value)))
+
+    def delete(self, namespace, path):
+        self._queue((namespace, _encode_state_key(path)), ("delete",))
+
+    def delete_children(self, namespace, path):
+        """Queues removal of every row below ``path`` (or the whole namespace)."""
+        self._prefix_ops += 1
+        if not path:
+            self._queue((namespace, None, self._prefix_ops), ("clear",))
+            return
+        # "[1,2]" -> children all start with "[1,2," and sort before "[1,2-"
+        prefix = _encode_state_key(path)[:-1] + ","
+        self._queue((namespace, None, self._prefix_ops), ("prefix", prefix, prefix[:-1] + "-"))
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS state ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def load(self):
+        """Warm-loads every registered collection from disk (no writes are queued)."""
+        conn = self._connect()
+        decode_key = json.loads
+        decode_value = _state_decoder.decode
+        for namespace, key, value in conn.execute("SELECT namespace, key, value FROM state"):
+            collection = self.collections.get(namespace)
+            if collection is None:
+                continue
+            value = int(value) if value.isdigit() else decode_value(value)
+            collection._load(decode_key(key), value)
+
+    def _write(self, batch):
+        with self._write_lock:
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        conn = self._connect()
+        puts, deletes = [], []
+
+        def drain():
+            if puts:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO state (namespace, key, value) VALUES (?, ?, ?)", puts
+                )
+                puts.clear()
+            if deletes:
+                conn.executemany("DELETE FROM state WHERE namespace = ? AND key = ?", deletes)
+                deletes.clear()
+
+        with conn:
+            for key, op in batch.items():
+                kind = op[0]
+                if kind == "put":
+                    if deletes:
+                        drain()
+                    puts.append((key[0], key[1], op[1]))
+                elif kind == "delete":
+                    if puts:
+                        drain()
+                    deletes.append(key)
+                else:
+                    drain()
+                    if kind == "clear":
+                        conn.execute("DELETE FROM state WHERE namespace = ?", (key[0],))
+                    else:
+                        conn.execute(
+                            "DELETE FROM state WHERE namespace = ? AND key >= ? AND key < ?",
+                            (key[0], op[1], op[2]),
+                        )
+            drain()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        try:
+            await asyncio.to_thread(self._write, batch)
+        except sqlite3.Error as e:
+            print(f"Error flushing state: {e}")
+            # Put the batch back in front of anything queued meanwhile. A key
+            # re-written since then takes its newer op at its newer position,
+            # as _queue would have done, so ops still replay in their order.
+            requeued = {key: op for key, op in batch.items() if key not in self._pending}
+            requeued.update(self._pending)
+            self._pending = requeued
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), STATE_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self._flush_task is None:
+            self._wakeup = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._run())
+
+    def close(self):
+        """Synchronously writes anything still queued and closes the database."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._pending:
+            batch, self._pending = self._pending, {}
+            self._write(batch)
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class PersistentDict(dict):
+    """A dict whose changes are mirrored into a StateStore.
+
+    ``depth`` is the number of key levels, e.g. 2 for
+    ``{guild_id: {user_id: moderator_id}}``. Inner levels are PersistentDicts
+    themselves, so ``d[guild_id][user_id] = x`` is persisted as a single row.
+
+    ``record`` (a StateRecord class) stores values as records instead of dicts;
+    dicts assigned or loaded are converted. ``leaf`` replaces the innermost
+    level with another persistent mapping class, e.g. PersistentSnowflakeMap.
+    """
+
+    def __init__(self, store, namespace, depth=1, path=(), *, record=None, leaf=None):
+        super().__init__()
+        self._store = store
+        self._namespace = namespace
+        self._depth = depth
+        self._path = path
+        self._record = record
+        self._leaf = leaf
+        if not path:
+            store.register(namespace, self)
+
+    def _child(self, key):
+        path = self._path + (key,)
+        if self._depth == 2 and self._leaf is not None:
+            return self._leaf(self._store, self._namespace, path)
+        return PersistentDict(
+            self._store, self._namespace, self._depth - 1, path, record=self._record, leaf=self._leaf
+        )
+
+    def __setitem__(self, key, value):
+        if self._depth > 1:
+            if key in self:
+                self._store.delete_children(self._namespace, self._path + (key,))
+            child = self._child(key)
+            dict.__setitem__(self, key, child)
+            child.update(value)
+        else:
+            if self._record is not None and not isinstance(value, self._record):
+                value = self._record.from_dict(value)
+            dict.__setitem__(self, key, value)
+            self._store.put(self._namespace, self._path + (key,), value)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        if self._depth > 1:
+            self._store.delete_children(self._namespace, self._path + (key,))
+        else:
+            self._store.delete(self._namespace, self._path + (key,))
+
+    _missing = object()
+
+    def pop(self, key, default=_missing):
+        if key in self:
+            value = dict.__getitem__(self, key)
+            del self[key]
+            return value
+        if default is PersistentDict._missing:
+            raise KeyError(key)
+        return default
+
+    def popitem(self):
+        key = next(reversed(self))
+        return key, self.pop(key)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        dict.clear(self)
+        self._store.delete_children(self._namespace, self._path)
+
+    def _load(self, path, value):
+        key = path[0]
+        if len(path) > 1:
+            child = dict.get(self, key)
+            if child is None:
+                child = self._child(key)
+                dict.__setitem__(self, key, child)
+            child._load(path[1:], value)
+            return
+        if self._record is not None:
+            value = self._record.from_dict(value)
+        dict.__setitem__(self, key, value)
+
+
+class PersistentSet(set):
+    """A set whose members are mirrored into a StateStore."""
+
+    def __init__(self, store, namespace):
+        super().__init__()
+        self._store = store
+        self._namespace = namespace
+        store.register(namespace, self)
+
+    def add(self, item):
+        if item not in self:
+            set.add(self, item)
+            self._store.put(self._namespace, (item,), 1)
+
+    def discard(self, item):
+        if item in self:
+            set.discard(self, item)
+            self._store.delete(self._namespace, (item,))
+
+    def remove(self, item):
+        set.remove(self, item)
+        self._store.delete(self._namespace, (item,))
+
+    def pop(self):
+        item = set.pop(self)
+        self._store.delete(self._namespace, (item,))
+        return item
+
+    def update(self, *iterables):
+        for iterable in iterables:
+            for item in iterable:
+                self.add(item)
+
+    def clear(self):
+        set.clear(self)
+        self._store.delete_children(self._namespace, ())
+
+    def _load(self, path, value):
+        set.add(self, path[0])
+
+
+# Compact state
+# Collections with millions of entries pay more for Python object overhead than
+# for their data. A dict entry mapping one snowflake to another costs ~100
+# bytes (the entry plus two int objects); SnowflakeMap keeps both in arrays. A
+# dict with string keys costs ~200 bytes before its values; StateRecord
+# subclasses keep the fields in __slots__ and still answer record["field"].
+class SnowflakeMap(MutableMapping):
+    """An int -> int mapping for snowflake keys, stored as two array("Q")
+    columns (open addressing, linear probing) at 16 bytes per slot."""
+
+    __slots__ = ("_keys", "_values", "_shift", "_len", "_used")
+    _EMPTY, _DELETED = 0, 1  # snowflakes are never 0 or 1
+    _MULTIPLIER = 0x9E3779B97F4A7C15  # Fibonacci hashing spreads sequential IDs
+    _MASK = (1 << 64) - 1
+
+    def __init__(self, items=()):
+        self._allocate(8)
+        self.update(items)
+
+    def _allocate(self, capacity):
+        self._keys = array.array("Q", bytes(8 * capacity))
+        self._values = array.array("Q", bytes(8 * capacity))
+        self._shift = 64 - capacity.bit_length() + 1
+        self._len = 0  # live entries
+        self._used = 0  # live and deleted slots
+
+    def _find(self, key):
+        """Slot holding ``key``, or -1."""
+        if type(key) is not int or not 1 < key <= self._MASK:
+            return -1
+        keys = self._keys
+        mask = len(keys) - 1
+        slot = ((key * self._MULTIPLIER) & self._MASK) >> self._shift
+        while True:
+            found = keys[slot]
+            if found == key:
+                return slot
+            if found == self._EMPTY:
+                return -1
+            slot = (slot + 1) & mask
+
+    def __getitem__(self, key):
+        slot = self._find(key)
+        if slot < 0:
+            raise KeyError(key)
+        return self._values[slot]
+
+    def get(self, key, default=None):
+        slot = self._find(key)
+        return default if slot < 0 else self._values[slot]
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+    def __setitem__(self, key, value):
+        if type(key) is not int or not 1 < key <= self._MASK:
+            raise KeyError(f"{key!r} is not a snowflake")
+        self._insert(key, value)
+
+    def _insert(self, key, value):
+        if (self._used + 1) * 3 > len(self._keys) * 2:
+            self._resize()
+        keys = self._keys
+        mask = len(keys) - 1
+        slot = ((key * self._MULTIPLIER) & self._MASK) >> self._shift
+        free = -1
+        while True:
+            found = keys[slot]
+            if found == key:
+                self._values[slot] = value
+                return
+            if found == self._EMPTY:
+                break
+            if found == self._DELETED and free < 0:
+                free = slot
+            slot = (slot + 1) & mask
+        if free < 0:
+            free = slot
+            self._used += 1
+        self._values[free] = value
+        keys[free] = key
+        self._len += 1
+
+    def __delitem__(self, key):
+        slot = self._find(key)
+        if slot < 0:
+            raise KeyError(key)
+        self._keys[slot] = self._DELETED
+        self._values[slot] = 0
+        self._len -= 1
+
+    def _resize(self):
+        keys, values = self._keys, self._values
+        capacity = 8
+        while (self._len + 1) * 3 > capacity:  # at most a third full afterwards
+            capacity *= 2
+        self._allocate(capacity)
+        for key, value in zip(keys, values):
+            if key > self._DELETED:
+                self._insert(key, value)
+
+    def __iter__(self):
+        return (key for key in self._keys if key > self._DELETED)
+
+    def __len__(self):
+        return self._len
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+
+class PersistentSnowflakeMap(SnowflakeMap):
+    """A SnowflakeMap whose changes are mirrored into a StateStore, for use as
+    the ``leaf`` of a PersistentDict."""
+
+    __slots__ = ("_store", "_namespace", "_path")
+
+    def __init__(self, store, namespace, path):
+        self._store = store
+        self._namespace = namespace
+        self._path = path
+        super().__init__()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._store.put(self._namespace, self._path + (key,), value)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._store.delete(self._namespace, self._path + (key,))
+
+    def clear(self):
+        self._allocate(8)
+        self._store.delete_children(self._namespace, self._path)
+
+    def _load(self, path, value):
+        self._insert(path[0], value)
+
+
+class StateRecord:
+    """Base for slotted records that read like the dicts they replace.
+
+    Subclasses list their fields in ``_fields`` (all in ``__slots__``, or as
+    properties over slots). ``record["field"]`` and ``record.get("field")``
+    work as on a dict; unset optional fields are None and are left out of
+    ``to_dict``, so persisted rows keep the dict format.
+    """
 
+    __slots__ = ()
+    _fields = ()
 
-# In-memory set to track locked channels for this session
-locked_channels = set()
+    @classmethod
+    def from_dict(cls, data):
+        record = cls.__new__(cls)
+        for field in cls._fields:
+            setattr(record, field, data.get(field))
+        return record
 
-# In-memory set to track hidden channels for this session
-hidden_channels = set()
+    def to_dict(self):
+        values = ((field, getattr(self, field)) for field in self._fields)
+        return {field: value for field, value in values if value is not None}
 
-# In-memory dict to track hardlock overwrites
-hardlock_overwrites = {}
+    def __getitem__(self, field):
+        if field not in self._fields:
+            raise KeyError(field)
+        return getattr(self, field)
 
-# In-memory dict to track which moderator timed out each user
+    def get(self, field, default=None):
+        value = getattr(self, field, None) if field in self._fields else None
+        return default if value is None else value
+
+    def __contains__(self, field):
+        return field in self._fields and getattr(self, field) is not None
+
+    def __eq__(self, other):
+        if isinstance(other, StateRecord):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+def _timestamp_field(name):
+    """A property storing a datetime as a float POSIX timestamp in ``name``
+    (24 bytes instead of 48); reads return an aware UTC datetime."""
+
+    def get(self):
+        value = getattr(self, name)
+        return None if value is None else datetime.fromtimestamp(value, timezone.utc)
+
+    def set(self, value):
+        setattr(self, name, None if value is None else value.timestamp())
+
+    return property(get, set)
+
+
+state_store = StateStore(STATE_DB_PATH)
+
+# Channels locked by lockall
+locked_channels = PersistentSet(state_store, "locked_channels")
+
+# Channels hidden by hideall
+hidden_channels = PersistentSet(state_store, "hidden_channels")
+
+# Original overwrites saved by hardlock
+# Structure: {channel_id: {"role_<id>"/"member_<id>": PermissionOverwrite}}
+hardlock_overwrites = PersistentDict(state_store, "hardlock_overwrites", depth=2)
+
+# Tracks which moderator timed out each user
 # Structure: {guild_id: {member_id: moderator_id}}
-timeout_moderators = {}
+timeout_moderators = PersistentDict(state_store, "timeout_moderators", depth=2, leaf=PersistentSnowflakeMap)
 
-# In-memory dict to track which moderator banned each user
+# Tracks which moderator banned each user
 # Structure: {guild_id: {user_id: moderator_id}}
-ban_moderators = {}
+ban_moderators = PersistentDict(state_store, "ban_moderators", depth=2, leaf=PersistentSnowflakeMap)
+
+# Custom prefixes per guild
+# Structure: {guild_id: {"prefixes": [str], "mention": bool, "ignore_case": bool}}
+# (a plain string, as stored by older versions, is a single prefix)
+custom_prefixes = PersistentDict(state_store, "custom_prefixes")
+
+# Each guild's prefixes (and the bot mention, if enabled) are compiled into one
+# regex, cached until the prefix command changes the configuration.
+DEFAULT_PREFIX = ","
+PREFIX_LIMIT = 10
+prefix_matchers = {}  # {guild_id: re.Pattern}
+
+
+def prefix_config(guild_id):
+    config = custom_prefixes.get(guild_id, DEFAULT_PREFIX)
+    if isinstance(config, str):
+        return {"prefixes": [config], "mention": False, "ignore_case": False}
+    return config
+
+
+def compile_prefixes(config):
+    # Longest first, so ",," wins over ","; word prefixes ("nova") need a space
+    alternatives = [
+        re.escape(p) + (r"\s+" if p[-1].isalnum() else "")
+        for p in sorted(config["prefixes"], key=len, reverse=True)
+    ]
+    if config["mention"] and bot.user:
+        alternatives.insert(0, rf"<@!?{bot.user.id}>\s*")
+    if not alternatives:
+        return re.compile(r"(?!)")
+    return re.compile("|".join(alternatives), re.IGNORECASE if config["ignore_case"] else 0)
 
-# In-memory dict to track custom prefixes per guild
-# Structure: {guild_id: prefix}
-custom_prefixes = {}
 
-# In-memory dict to track sticky reaction roles
+def prefix_matcher(guild):
+    guild_id = guild.id if guild else None
+    matcher = prefix_matchers.get(guild_id)
+    if matcher is None:
+        matcher = prefix_matchers[guild_id] = compile_prefixes(prefix_config(guild_id))
+    return matcher
+
+
+def match_prefix(message):
+    """The prefix ``message`` starts with, as typed, or None."""
+    match = prefix_matcher(message.guild).match(message.content)
+    return match.group() if match else None
+
+
+def guild_prefix(guild):
+    """The guild's main prefix, for display and usage hints."""
+    config = prefix_config(guild.id if guild else None)
+    if config["prefixes"]:
+        return config["prefixes"][0]
+    return f"<@{bot.user.id}> "
+
+
+def set_prefix_config(guild_id, config):
+    custom_prefixes[guild_id] = config
+    prefix_matchers.pop(guild_id, None)
+
+# Sticky reaction roles
 # Structure: {guild_id: {message_id: {reaction: role_id}}}
-sticky_reaction_roles = {}
+sticky_reaction_roles = PersistentDict(state_store, "sticky_reaction_roles", depth=3)
 
 
 # Helper: parse duration string (e.g., 30s, 5m, 2h, 1d)
@@ -173,7 +1070,106 @@ async def send_mod_dm(
     return False
 
 
-# ,purge / ,c / ,clear [amount] or [@user/userID] [amount]
+# ,purge / ,c / ,clear [amount] [filters...]
+# Filters combine (all must match; several users match any of them):
+#   @user / userID, bots, humans, links, attachments, embeds,
+#   contains:<text>, regex:<pattern>, before:<messageID>, after:<messageID>
+# History is scanned newest first and the scan stops as soon as `amount`
+# matches are found. Matches are bulk deleted 100 at a time; messages older
+# than 14 days cannot be bulk deleted and are removed one by one.
+PURGE_DEFAULT = 50
+PURGE_MAX = 2000
+PURGE_SCAN_LIMIT = 10000  # messages looked at before giving up on more matches
+BULK_DELETE_CHUNK = 100
+BULK_DELETE_MAX_AGE = timedelta(days=14)
+LINK_PATTERN = re.compile(r"https?://\S+|discord(?:\.gg|\.com/invite)/\S+", re.IGNORECASE)
+
+
+def parse_purge_args(args):
+    """Returns ``(amount, checks, user_ids, bounds)`` or raises ValueError with a message."""
+    amount = PURGE_DEFAULT
+    checks = []
+    user_ids = set()
+    bounds = {}
+    for arg in args:
+        lowered = arg.lower()
+        key, _, value = arg.partition(":")
+        key = key.lower()
+        user_match = USER_ID_PATTERN.fullmatch(arg)
+        if user_match:
+            user_ids.add(int(user_match.group(1) or user_match.group(2)))
+        elif arg.isdigit():
+            amount = int(arg)
+            if amount <= 0:
+                raise ValueError("Amount must be greater than 0.")
+            if amount > PURGE_MAX:
+                raise ValueError(f"Amount cannot exceed {PURGE_MAX} messages.")
+        elif lowered in ("bots", "bot"):
+            checks.append(lambda m: m.author.bot)
+        elif lowered in ("humans", "human"):
+            checks.append(lambda m: not m.author.bot)
+        elif lowered in ("links", "link"):
+            checks.append(lambda m: LINK_PATTERN.search(m.content) is not None)
+        elif lowered in ("attachments", "attachment", "files", "images"):
+            checks.append(lambda m: bool(m.attachments))
+        elif lowered in ("embeds", "embed"):
+            checks.append(lambda m: bool(m.embeds))
+        elif key == "contains" and value:
+            needle = value.lower()
+            checks.append(lambda m, needle=needle: needle in m.content.lower())
+        elif key == "regex" and value:
+            try:
+                pattern = re.compile(value)
+            except re.error as e:
+                raise ValueError(f"Invalid regex: {e}")
+            checks.append(lambda m, pattern=pattern: pattern.search(m.content) is not None)
+        elif key in ("before", "after") and value.isdigit():
+            bounds[key] = discord.Object(id=int(value))
+        else:
+            raise ValueError(f"Unknown filter `{arg}`.")
+    if user_ids:
+        checks.append(lambda m: m.author.id in user_ids)
+    return amount, checks, user_ids, bounds
+
+
+async def purge_messages(channel, amount, checks, *, before=None, after=None):
+    """Deletes up to ``amount`` messages matching every check; returns the count."""
+    cutoff = discord.utils.utcnow() - BULK_DELETE_MAX_AGE + timedelta(minutes=1)
+    recent = []
+    old = []
+    deleted = 0
+
+    async def flush_recent():
+        nonlocal deleted
+        if recent:
+            await channel.delete_messages(recent)
+            deleted += len(recent)
+            recent.clear()
+
+    # Newest first even with ``after``, so the newest ``amount`` messages
+    # after the anchor go rather than the ones right after it
+    async for message in channel.history(limit=PURGE_SCAN_LIMIT, before=before, after=after, oldest_first=False):
+        if not all(check(message) for check in checks):
+            continue
+        if message.created_at > cutoff:
+            recent.append(message)
+            if len(recent) == BULK_DELETE_CHUNK:
+                await flush_recent()
+        else:
+            old.append(message)
+        if deleted + len(recent) + len(old) >= amount:
+            break
+    await flush_recent()
+
+    for message in old:
+        try:
+            await message.delete()
+            deleted += 1
+        except discord.NotFound:
+            pass
+    return deleted
+
+
 @bot.command(aliases=["c", "clear", "purge"])
 @commands.has_permissions(manage_messages=True)
 async def purge_or_clear(ctx: Context, *args):
@@ -182,103 +1178,34 @@ async def purge_or_clear(ctx: Context, *args):
         await ctx.message.delete(delay=0.5)
     except:
         pass  # Ignore if we can't delete the command message
-    member = None
-    amount = 50
-    
-    # Parse arguments
-    if not args:
-        # Default behavior: delete 50 messages
-        deleted = await ctx.channel.purge(limit=amount+1)
-        embed = discord.Embed(
-            description=f"✅ {ctx.author.mention}: Deleted {len(deleted)-1} messages.",
-            color=0x4C4C54,
-        )
-        success_message = await ctx.send(embed=embed, delete_after=3)
-        await success_message.add_reaction("🗑️")
-        return
-    
-    # Check if first arg is a user mention
-    if args[0].startswith("<@"):
-        member = get_user_from_arg(ctx.guild, args[0])
-        if not member:
-            embed = discord.Embed(
-                description=f"⚠️ {ctx.author.mention}: Could not find the specified user.",
-                color=0x4C4C54,
-            )
-            await ctx.send(embed=embed)
-            return
-        # Check if there's a second argument for amount
-        if len(args) > 1 and args[1].isdigit():
-            amount = int(args[1])
-            if amount <= 0:
-                embed = discord.Embed(
-                    description=f"⚠️ {ctx.author.mention}: Amount must be greater than 0.",
-                    color=0x4C4C54,
-                )
-                await ctx.send(embed=embed)
-                return
-            if amount > 100:
-                embed = discord.Embed(
-                    description=f"⚠️ {ctx.author.mention}: Amount cannot exceed 100 messages.",
-                    color=0x4C4C54,
-                )
-                await ctx.send(embed=embed)
-                return
-    # Check if first arg is a number (amount)
-    elif args[0].isdigit():
-        amount = int(args[0])
-        if amount <= 0:
-            embed = discord.Embed(
-                description=f"⚠️ {ctx.author.mention}: Amount must be greater than 0.",
-                color=0x4C4C54,
-            )
-            await ctx.send(embed=embed)
-            return
-        if amount > 100:
-            embed = discord.Embed(
-                description=f"⚠️ {ctx.author.mention}: Amount cannot exceed 100 messages.",
-                color=0x4C4C54,
-            )
-            await ctx.send(embed=embed)
-            return
-        # Check if there's a second argument for user
-        if len(args) > 1:
-            if args[1].startswith("<@"):
-                member = get_user_from_arg(ctx.guild, args[1])
-                if not member:
-                    embed = discord.Embed(
-                        description=f"⚠️ {ctx.author.mention}: Could not find the specified user.",
-                        color=0x4C4C54,
-                    )
-                    await ctx.send(embed=embed)
-                    return
-    else:
+
+    try:
+        amount, checks, user_ids, bounds = parse_purge_args(args)
+    except ValueError as e:
         embed = discord.Embed(
-            description=f"⚠️ {ctx.author.mention}: Invalid arguments. Usage: `,c [amount]` or `,c [@user] [amount]`",
+            description=f"⚠️ {ctx.author.mention}: {e} Usage: `,c [amount] [@user...] [bots] [links] [attachments] [embeds] [contains:text] [regex:pattern] [before:id] [after:id]`",
             color=0x4C4C54,
         )
         await ctx.send(embed=embed)
         return
-    
+
     # Perform deletion
     try:
-        if member:
-            def is_user(m):
-                return m.author == member
-
-            deleted = await ctx.channel.purge(limit=1000, check=is_user)
-            deleted = deleted[:amount]
-            embed = discord.Embed(
-                description=f"✅ {ctx.author.mention}: Deleted {len(deleted)} messages from {member.display_name}.",
-                color=0x4C4C54,
-            )
-        else:
-            deleted = await ctx.channel.purge(limit=amount+1)
-            embed = discord.Embed(
-                description=f"✅ {ctx.author.mention}: Deleted {len(deleted)-1} messages.",
-                color=0x4C4C54,
-            )
-        
+        deleted = await purge_messages(
+            ctx.channel,
+            amount,
+            checks,
+            before=bounds.get("before", ctx.message),
+            after=bounds.get("after"),
+        )
+        source = ""
+        if len(user_ids) == 1:
+            member = ctx.guild.get_member(next(iter(user_ids)))
+            source = f" from {member.display_name}" if member else ""
+        embed = discord.Embed(
+            description=f"✅ {ctx.author.mention}: Deleted {deleted} messages{source}.",
+            color=0x4C4C54,
+        )
         success_message = await ctx.send(embed=embed, delete_after=3)
         await success_message.add_reaction("🗑️")
     except discord.Forbidden:
@@ -328,7 +1255,7 @@ async def nuke(ctx: Context):
 @bot.command(aliases=["b"])
 @commands.has_permissions(ban_members=True)
 async def ban(ctx: Context, user: str, *, reason: str = None):
-    member = get_user_from_arg(ctx.guild, user)
+    member = await resolve_member(ctx.guild, user)
     if not member:
         embed = discord.Embed(
             description=f"⚠️ {ctx.author.mention}: Could not find the specified user.",
@@ -376,7 +1303,7 @@ async def ban(ctx: Context, user: str, *, reason: str = None):
 @commands.has_permissions(kick_members=True)
 async def kick(ctx: Context, user: str, *, reason: str = None):
     """Kicks a member from the server."""
-    member = get_user_from_arg(ctx.guild, user)
+    member = await resolve_member(ctx.guild, user)
     if not member:
         await ctx.message.add_reaction("❌")
         return
@@ -397,6 +1324,194 @@ async def kick(ctx: Context, user: str, *, reason: str = None):
         await ctx.message.add_reaction("❌")
 
 
+# ,massban / ,masskick <IDs or mentions...> [--delete <duration>] [reason]
+# IDs can also come from attached text files, so raid lists can be pasted as is.
+BULK_BAN_CHUNK = 200  # Discord's bulk ban limit per request
+MASS_KICK_CONCURRENCY = 5
+MASS_ACTION_LIMIT = 10000
+MASS_ATTACHMENT_MAX_BYTES = 1024 * 1024
+MASS_MEMBER_QUERY = 100  # user IDs per gateway member query
+MASS_DELETE_MAX = 7 * 86400  # Discord deletes at most a week of messages
+USER_ID_PATTERN = re.compile(r"<@!?(\d{15,20})>|\b(\d{15,20})\b")
+
+
+async def parse_mass_targets(ctx, args):
+    """Returns ``(user_ids, delete_seconds, reason)`` from the arguments and
+    attachments. ``delete_seconds`` is None if the --delete value is invalid."""
+    user_ids = {}
+    reason_words = []
+    delete_seconds = 0
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg in ("--delete", "-d"):
+            delete_seconds = parse_duration(args.pop(0)) if args else None
+            if delete_seconds is not None and not 0 <= delete_seconds <= MASS_DELETE_MAX:
+                delete_seconds = None
+            continue
+        ids = [int(a or b) for a, b in USER_ID_PATTERN.findall(arg)]
+        if ids:
+            user_ids.update(dict.fromkeys(ids))
+        else:
+            reason_words.append(arg)
+    for attachment in ctx.message.attachments:
+        if attachment.size > MASS_ATTACHMENT_MAX_BYTES:
+            continue
+        text = (await attachment.read()).decode("utf-8", errors="ignore")
+        user_ids.update(dict.fromkeys(int(a or b) for a, b in USER_ID_PATTERN.findall(text)))
+    return list(user_ids), delete_seconds, " ".join(reason_words) or None
+
+
+async def fetch_mass_targets(guild, user_ids):
+    """``{user_id: Member}`` for the targets who are in the guild, asking the
+    gateway about those missing from the member cache. Targets whose
+    membership could not be checked map to None."""
+    members = {}
+    missing = []
+    for user_id in user_ids:
+        member = guild.get_member(user_id)
+        if member is not None:
+            members[user_id] = member
+        else:
+            missing.append(user_id)
+    # With the full member list cached, anyone missing is not in the guild
+    if guild.chunked:
+        return members
+    for i in range(0, len(missing), MASS_MEMBER_QUERY):
+        batch = missing[i:i + MASS_MEMBER_QUERY]
+        try:
+            found = await guild.query_members(user_ids=batch, limit=len(batch), cache=False)
+        except (asyncio.TimeoutError, discord.ClientException):
+            members.update(dict.fromkeys(batch))
+            continue
+        members.update((member.id, member) for member in found)
+    return members
+
+
+def mass_action_skip_reason(ctx, user_id, members):
+    """Why ``user_id`` must not be mass banned/kicked by the invoker, or None.
+    ``members`` comes from fetch_mass_targets."""
+    if user_id in (ctx.author.id, ctx.bot.user.id):
+        return "yourself or the bot"
+    if user_id == ctx.guild.owner_id:
+        return "server owner"
+    if user_id in members and members[user_id] is None:
+        return "could not check their roles"
+    member = members.get(user_id)
+    if member and ctx.author.id != ctx.guild.owner_id and member.top_role >= ctx.author.top_role:
+        return "role is not below yours"
+    if member and member.top_role >= ctx.guild.me.top_role:
+        return "role is not below mine"
+    return None
+
+
+def mass_action_summary(ctx, action, done, failed):
+    """One embed for the whole run; ``failed`` is ``[(user_id, reason)]``."""
+    lines = [f"{ctx.author.mention}: {action} **{done}** user{'s' if done != 1 else ''}."]
+    if failed:
+        lines.append(f"\n**Failed ({len(failed)}):**")
+        lines.extend(f"`{user_id}` - {reason}" for user_id, reason in failed[:20])
+        if len(failed) > 20:
+            lines.append(f"...and {len(failed) - 20} more")
+    return discord.Embed(description="\n".join(lines), color=0x4C4C54)
+
+
+async def mass_targets_or_warn(ctx, args, usage):
+    user_ids, delete_seconds, reason = await parse_mass_targets(ctx, args)
+    problem = None
+    if not user_ids:
+        problem = f"Usage: `{usage}` (IDs or mentions, or attach a text file)"
+    elif len(user_ids) > MASS_ACTION_LIMIT:
+        problem = f"At most {MASS_ACTION_LIMIT} users per command."
+    elif delete_seconds is None:
+        problem = "`--delete` takes a duration of up to 7d, e.g. `1d` or `12h`."
+    if problem:
+        embed = discord.Embed(description=f"⚠️ {ctx.author.mention}: {problem}", color=0x4C4C54)
+        await ctx.send(embed=embed)
+        return None
+    return user_ids, delete_seconds, reason
+
+
+@bot.command(aliases=["mb"])
+@commands.has_permissions(ban_members=True)
+async def massban(ctx: Context, *args):
+    """Bans many users at once through Discord's bulk ban endpoint."""
+    parsed = await mass_targets_or_warn(ctx, args, ",massban <IDs...> [--delete 1d] [reason]")
+    if parsed is None:
+        return
+    user_ids, delete_seconds, reason = parsed
+    await ctx.message.add_reaction("👍")
+
+    members = await fetch_mass_targets(ctx.guild, user_ids)
+    failed = []
+    targets = []
+    for user_id in user_ids:
+        skip = mass_action_skip_reason(ctx, user_id, members)
+        if skip:
+            failed.append((user_id, skip))
+        else:
+            targets.append(user_id)
+
+    audit_reason = f"Massban by {ctx.author}" + (f": {reason}" if reason else "")
+    banned = []
+    for i in range(0, len(targets), BULK_BAN_CHUNK):
+        chunk = [discord.Object(id=user_id) for user_id in targets[i:i + BULK_BAN_CHUNK]]
+        try:
+            result = await ctx.guild.bulk_ban(
+                chunk, reason=audit_reason, delete_message_seconds=delete_seconds
+            )
+        except discord.HTTPException as e:
+            failed.extend((user.id, e.text or "ban failed") for user in chunk)
+            continue
+        banned.extend(user.id for user in result.banned)
+        failed.extend((user.id, "already banned or unknown user") for user in result.failed)
+
+    # Track the moderator
+    if banned:
+        guild_id = ctx.guild.id
+        if guild_id not in ban_moderators:
+            ban_moderators[guild_id] = {}
+        guild_bans = ban_moderators[guild_id]
+        for user_id in banned:
+            guild_bans[user_id] = ctx.author.id
+
+    await ctx.send(embed=mass_action_summary(ctx, "Banned", len(banned), failed))
+    await ctx.message.add_reaction("🔨")
+
+
+@bot.command(aliases=["mk"])
+@commands.has_permissions(kick_members=True)
+async def masskick(ctx: Context, *args):
+    """Kicks many members at once."""
+    parsed = await mass_targets_or_warn(ctx, args, ",masskick <IDs...> [reason]")
+    if parsed is None:
+        return
+    user_ids, _, reason = parsed
+    await ctx.message.add_reaction("👍")
+
+    audit_reason = f"Masskick by {ctx.author}" + (f": {reason}" if reason else "")
+    semaphore = asyncio.Semaphore(MASS_KICK_CONCURRENCY)
+    members = await fetch_mass_targets(ctx.guild, user_ids)
+    failed = []
+
+    async def kick_one(user_id):
+        skip = mass_action_skip_reason(ctx, user_id, members)
+        if skip:
+            failed.append((user_id, skip))
+            return False
+        async with semaphore:
+            try:
+                await ctx.guild.kick(discord.Object(id=user_id), reason=audit_reason)
+            except discord.HTTPException as e:
+                failed.append((user_id, e.text or "kick failed"))
+                return False
+        return True
+
+    results = await asyncio.gather(*(kick_one(user_id) for user_id in user_ids))
+    await ctx.send(embed=mass_action_summary(ctx, "Kicked", sum(results), failed))
+    await ctx.message.add_reaction("🦶")
+
+
 # ,timeout or ,to @user [duration] [reason] or userID [duration] [reason]
 def parse_duration(duration):
     units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
@@ -428,6 +1543,30 @@ def format_duration(seconds: int) -> str:
     return " ".join(parts)
 
 
+async def apply_timeout(member, seconds, *, moderator, reason=None):
+    """Times ``member`` out, records the moderator and DMs the member.
+
+    Shared by the timeout command and automatic moderation. Returns the
+    formatted duration; raises discord.HTTPException if the timeout fails.
+    """
+    until = discord.utils.utcnow() + timedelta(seconds=seconds)
+    await member.timeout(until, reason=reason)
+    record_timeout(member.guild, member.id, until)
+    guild_id = member.guild.id
+    if guild_id not in timeout_moderators:
+        timeout_moderators[guild_id] = {}
+    timeout_moderators[guild_id][member.id] = moderator.id
+    formatted_duration = format_duration(seconds)
+    await send_mod_dm(
+        member,
+        moderator=moderator,
+        action_type="timed_out",
+        reason=reason,
+        duration=formatted_duration,
+    )
+    return formatted_duration
+
+
 @bot.command(aliases=["to", "t"])
 @commands.has_permissions(moderate_members=True)
 async def timeout(ctx: Context, user: str, duration: str = None, *, reason: str = None):
@@ -440,7 +1579,7 @@ async def timeout(ctx: Context, user: str, duration: str = None, *, reason: str
         await ctx.send(embed=embed)
         return
     """Mutes the provided member using Discord's timeout feature."""
-    member = get_user_from_arg(ctx.guild, user)
+    member = await resolve_member(ctx.guild, user)
     if not member:
         embed = discord.Embed(
             description=f"⚠️ {ctx.author.mention}: Could not find the specified user.",
@@ -466,21 +1605,7 @@ async def timeout(ctx: Context, user: str, duration: str = None, *, reason: str
         await ctx.send(embed=embed)
         return
     try:
-        await member.timeout(
-            discord.utils.utcnow() + timedelta(seconds=seconds), reason=reason
-        )
-        guild_id = ctx.guild.id
-        if guild_id not in timeout_moderators:
-            timeout_moderators[guild_id] = {}
-        timeout_moderators[guild_id][member.id] = ctx.author.id
-        formatted_duration = format_duration(seconds)
-        await send_mod_dm(
-            member,
-            moderator=ctx.author,
-            action_type="timed_out",
-            reason=reason,
-            duration=formatted_duration,
-        )
+        formatted_duration = await apply_timeout(member, seconds, moderator=ctx.author, reason=reason)
         embed = discord.Embed(
             description=f"{ctx.author.mention}: {member.display_name} is now timed out for **{formatted_duration}**",
             color=0x4C4C54,
@@ -501,6 +1626,337 @@ async def timeout(ctx: Context, user: str, duration: str = None, *, reason: str
         await ctx.send(embed=embed)
 
 
+# Bulk permission engine
+# Used by lockall/unlockall/hideall/unhideall. Instead of one set_permissions
+# call per (channel, role) pair, the full overwrite map of each channel is
+# computed up front and written with a single channel.edit(overwrites=...).
+# Every channel is its own PATCH /channels/{channel_id} rate-limit bucket, which
+# discord.py already tracks (including 429 retries); the semaphore only bounds
+# how many of those buckets we hit at once so we stay under the global limit.
+BULK_EDIT_CONCURRENCY = 8
+BULK_PROGRESS_INTERVAL = 2.0  # seconds between progress message edits
+
+
+def deny_permission(perm):
+    """Overwrite transform that explicitly denies ``perm``."""
+    def transform(overwrite):
+        if getattr(overwrite, perm) is not False:
+            setattr(overwrite, perm, False)
+            return True
+        return False
+    return transform
+
+
+def clear_denied_permission(perm):
+    """Overwrite transform that resets an explicit deny of ``perm`` to neutral."""
+    def transform(overwrite):
+        if getattr(overwrite, perm) is False:
+            setattr(overwrite, perm, None)
+            return True
+        return False
+    return transform
+
+
+def deny_permissions(perms):
+    """Overwrite transform that explicitly denies every permission in ``perms``."""
+    transforms = [deny_permission(perm) for perm in perms]
+
+    def transform(overwrite):
+        changed = False
+        for deny in transforms:
+            changed = deny(overwrite) or changed
+        return changed
+    return transform
+
+
+def plan_channel_overwrites(channel, roles, transform):
+    """Returns the channel's complete overwrite map with ``transform`` applied to
+    every role in ``roles``, or None if the channel would not change."""
+    overwrites = channel.overwrites
+    changed = False
+    for role in roles:
+        overwrite = overwrites.get(role) or discord.PermissionOverwrite()
+        if not transform(overwrite):
+            continue
+        changed = True
+        if overwrite.is_empty():
+            overwrites.pop(role, None)
+        else:
+            overwrites[role] = overwrite
+    return overwrites if changed else None
+
+
+def bulk_progress_embed(label, done, total, failed=0):
+    description = f"{label}: **{done}/{total}** channels"
+    if failed:
+        description += f" ({failed} failed)"
+    return discord.Embed(description=description, color=0x4C4C54)
+
+
+async def bulk_edit_overwrites(guild, channels, transform, *, label, reason=None, progress_channel=None, roles=None):
+    """Applies ``transform`` to every role overwrite of ``channels`` (or only to
+    the overwrites of ``roles``).
+
+    No-op channels are skipped, the rest get one edit each with bounded
+    concurrency. If ``progress_channel`` is given, a live progress message is
+    posted there. Returns the list of channels that could not be edited.
+    """
+    if roles is None:
+        roles = guild.roles  # includes @everyone
+    plans = []
+    for channel in channels:
+        overwrites = plan_channel_overwrites(channel, roles, transform)
+        if overwrites is not None:
+            plans.append((channel, overwrites))
+    if not plans:
+        return []
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(BULK_EDIT_CONCURRENCY)
+    total = len(plans)
+    done = 0
+    failed = []
+    progress = None
+    last_update = loop.time()
+    if progress_channel is not None:
+        try:
+            progress = await progress_channel.send(embed=bulk_progress_embed(label, 0, total))
+        except discord.HTTPException:
+            progress = None
+
+    async def apply(channel, overwrites):
+        nonlocal done, last_update
+        async with semaphore:
+            try:
+                await channel.edit(overwrites=overwrites, reason=reason)
+            except discord.HTTPException:
+                failed.append(channel)
+        done += 1
+        if progress and loop.time() - last_update >= BULK_PROGRESS_INTERVAL:
+            last_update = loop.time()
+            try:
+                await progress.edit(embed=bulk_progress_embed(label, done, total, len(failed)))
+            except discord.HTTPException:
+                pass
+
+    await asyncio.gather(*(apply(channel, overwrites) for channel, overwrites in plans))
+
+    if progress:
+        try:
+            await progress.edit(
+                embed=bulk_progress_embed(label, done, total, len(failed)),
+                delete_after=None if failed else 5,
+            )
+        except discord.HTTPException:
+            pass
+    return failed
+
+
+# Timer scheduler
+# A single task drives every timed action (auto-unlock, auto-unhide, giveaway
+# endings) instead of one sleeping task per action. Pending jobs sit in a
+# min-heap keyed by due time and are persisted in scheduled_jobs, so they
+# survive restarts; anything that came due while the bot was down fires as
+# soon as it is ready again.
+# Structure: {job_id: {"kind": str, "guild_id": int, "due": float, "data": dict}}
+scheduled_jobs = PersistentDict(state_store, "scheduled_jobs")
+JOB_RETRY_SECONDS = 60  # delay before retrying a job whose guild is unavailable
+
+# kind -> async handler(guild, data)
+job_handlers = {}
+
+JOB_LABELS = {
+    "unlock": "Auto-unlock",
+    "unhide": "Auto-unhide",
+    "unlock_all": "Auto-unlock all",
+    "unhide_all": "Auto-unhide all",
+    "end_giveaway": "Giveaway end",
+}
+
+
+def job_handler(kind):
+    """Registers the coroutine that runs jobs of the given kind."""
+    def decorator(func):
+        job_handlers[kind] = func
+        return func
+    return decorator
+
+
+class TimerScheduler:
+    """Min-heap scheduler: O(log n) schedule, O(1) cancel (lazy heap deletion)."""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self._heap = []  # (due, job_id); entries for cancelled jobs are skipped
+        self._next_id = 1
+        self._wakeup = None
+        self._task = None
+        self.running = set()  # job IDs whose handler is in progress
+
+    def load(self):
+        """Builds the heap from the persisted jobs at startup."""
+        self._rebuild_heap()
+        self._next_id = max(self.jobs, default=0) + 1
+
+    def _rebuild_heap(self):
+        # Running jobs are already off the heap and must not fire again
+        self._heap = [(job["due"], job_id) for job_id, job in self.jobs.items() if job_id not in self.running]
+        heapq.heapify(self._heap)
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def schedule(self, kind, guild_id, delay, **data):
+        """Schedules a job ``delay`` seconds from now and returns its ID."""
+        job_id = self._next_id
+        self._next_id += 1
+        due = time.time() + delay
+        self.jobs[job_id] = {"kind": kind, "guild_id": guild_id, "due": due, "data": data}
+        heapq.heappush(self._heap, (due, job_id))
+        if self._wakeup is not None and self._heap[0][1] == job_id:
+            self._wakeup.set()
+        return job_id
+
+    def cancel(self, job_id):
+        if self.jobs.pop(job_id, None) is None:
+            return False
+        # Drop dead heap entries once they outnumber the live ones
+        if len(self._heap) > 2 * len(self.jobs) + 64:
+            self._rebuild_heap()
+        return True
+
+    def pending(self, guild_id):
+        """Returns ``[(job_id, job)]`` for a guild, soonest first."""
+        jobs = [(job_id, job) for job_id, job in self.jobs.items() if job["guild_id"] == guild_id]
+        return sorted(jobs, key=lambda item: item[1]["due"])
+
+    async def _run(self):
+        await bot.wait_until_ready()
+        while True:
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                due, job_id = heapq.heappop(self._heap)
+                job = self.jobs.get(job_id)
+                if job is None or job["due"] != due or job_id in self.running:
+                    continue
+                # The job stays persisted until it has run, so a restart in
+                # between runs it again rather than losing it
+                self.running.add(job_id)
+                asyncio.create_task(self._fire(job_id, job))
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _fire(self, job_id, job):
+        handler = job_handlers.get(job["kind"])
+        guild = bot.get_guild(job["guild_id"])
+        if guild is not None and guild.unavailable:
+            # Discord outage: run it once the guild is back. Only a guild the
+            # bot has left (no longer cached at all) drops its jobs.
+            self.running.discard(job_id)
+            if self.jobs.get(job_id) is job:
+                due = time.time() + JOB_RETRY_SECONDS
+                self.jobs[job_id] = dict(job, due=due)
+                heapq.heappush(self._heap, (due, job_id))
+                self._wakeup.set()
+            return
+        try:
+            if handler is not None and guild is not None:
+                await handler(guild, job["data"])
+        except Exception as e:
+            print(f"Error running scheduled job {job_id} ({job['kind']}): {e}")
+        finally:
+            self.running.discard(job_id)
+            if self.jobs.get(job_id) is job:
+                del self.jobs[job_id]
+
+
+timer_scheduler = TimerScheduler(scheduled_jobs)
+
+
+async def add_job_reaction(guild, data, emoji):
+    """Reacts to the command message that scheduled a job, if it still exists."""
+    channel = guild.get_channel(data.get("channel_id"))
+    if channel is None or "message_id" not in data:
+        return
+    try:
+        await channel.get_partial_message(data["message_id"]).add_reaction(emoji)
+    except discord.HTTPException:
+        pass
+
+
+@bot.command(aliases=["jobs", "scheduled"])
+@commands.has_permissions(manage_channels=True)
+async def timers(ctx: Context, subcommand: str = None, *, args: str = None):
+    """Lists or cancels pending timed actions in this server."""
+    if subcommand is None or subcommand.lower() == "list":
+        jobs = timer_scheduler.pending(ctx.guild.id)
+        if not jobs:
+            embed = discord.Embed(
+                description=f"ℹ️ {ctx.author.mention}: No timed actions are pending.",
+                color=0x4C4C54,
+            )
+            await ctx.send(embed=embed)
+            return
+
+        def fmt(i, item):
+            job_id, job = item
+            data = job["data"]
+            target = f" in <#{data['channel_id']}>" if "channel_id" in data else ""
+            return f"`#{job_id}` {JOB_LABELS.get(job['kind'], job['kind'])}{target} <t:{int(job['due'])}:R>"
+
+        view = PaginatedEmbedView(ctx, jobs, "Pending Timers", "", entry_formatter=fmt)
+        await ctx.send(embed=view.make_embed(), view=view)
+
+    elif subcommand.lower() == "cancel":
+        try:
+            job_id = int((args or "").strip().lstrip("#"))
+        except ValueError:
+            embed = discord.Embed(
+                description=f"⚠️ {ctx.author.mention}: Usage: `,timers cancel <id>`",
+                color=0x4C4C54,
+            )
+            await ctx.send(embed=embed)
+            return
+        job = timer_scheduler.jobs.get(job_id)
+        if job is None or job["guild_id"] != ctx.guild.id:
+            embed = discord.Embed(
+                description=f"⚠️ {ctx.author.mention}: No pending timer with ID `#{job_id}`.",
+                color=0x4C4C54,
+            )
+            await ctx.send(embed=embed)
+            return
+        if job_id in timer_scheduler.running:
+            embed = discord.Embed(
+                description=f"⚠️ {ctx.author.mention}: Timer `#{job_id}` is already running.",
+                color=0x4C4C54,
+            )
+            await ctx.send(embed=embed)
+            return
+        timer_scheduler.cancel(job_id)
+        if job["kind"] == "end_giveaway":
+            # A giveaway without its end timer would stay open forever
+            forget_giveaway(job["data"]["message_id"])
+            active_giveaways.pop(job["data"]["message_id"], None)
+        embed = discord.Embed(
+            description=f"✅ {ctx.author.mention}: Cancelled {JOB_LABELS.get(job['kind'], job['kind']).lower()} `#{job_id}`.",
+            color=0x4C4C54,
+        )
+        await ctx.send(embed=embed)
+
+    else:
+        embed = discord.Embed(
+            description=f"⚠️ {ctx.author.mention}: Unknown subcommand. Use 'list' or 'cancel'.",
+            color=0x4C4C54,
+        )
+        await ctx.send(embed=embed)
+
+
 # ,lock
 @bot.command(aliases=["l"])
 @commands.has_permissions(manage_channels=True)
@@ -513,21 +1969,21 @@ async def lock(ctx: Context, *args):
     await ctx.channel.set_permissions(ctx.guild.default_role, overwrite=overwrite)
     await ctx.message.add_reaction("🔒")
     if duration:
+        timer_scheduler.schedule(
+            "unlock", ctx.guild.id, duration,
+            channel_id=ctx.channel.id, message_id=ctx.message.id,
+        )
 
-        async def auto_unlock():
-            await asyncio.sleep(duration)
-            overwrite = ctx.channel.overwrites_for(ctx.guild.default_role)
-            overwrite.send_messages = True
-            await ctx.channel.set_permissions(
-                ctx.guild.default_role, overwrite=overwrite
-            )
-            try:
-                
-                await ctx.message.add_reaction("🔓")
-            except:
-                pass
 
-        asyncio.create_task(auto_unlock())
+@job_handler("unlock")
+async def auto_unlock(guild, data):
+    channel = guild.get_channel(data["channel_id"])
+    if channel is None:
+        return
+    overwrite = channel.overwrites_for(guild.default_role)
+    overwrite.send_messages = True
+    await channel.set_permissions(guild.default_role, overwrite=overwrite)
+    await add_job_reaction(guild, data, "🔓")
 
 
 # ,ul / ,unlock
@@ -550,33 +2006,13 @@ async def hide(ctx: Context, *args):
     if args and args[0].lower() == "all":
         if len(args) > 1 and parse_time_arg(args[1]):
             duration = parse_time_arg(args[1])
-        for channel in ctx.guild.text_channels:
-            for role in [ctx.guild.default_role] + list(ctx.guild.roles):
-                overwrite = channel.overwrites_for(role)
-                if overwrite.view_channel is not False:
-                    overwrite.view_channel = False
-                    await channel.set_permissions(role, overwrite=overwrite)
-            hidden_channels.add(channel.id)
-        await ctx.message.add_reaction("🙈")
-        
-        if duration:
-
-            async def auto_unhide_all():
-                await asyncio.sleep(duration)
-                for channel in ctx.guild.text_channels:
-                    for role in [ctx.guild.default_role] + list(ctx.guild.roles):
-                        overwrite = channel.overwrites_for(role)
-                        if overwrite.view_channel is False:
-                            overwrite.view_channel = None
-                            await channel.set_permissions(role, overwrite=overwrite)
-                    hidden_channels.discard(channel.id)
-                try:
-                    
-                    await ctx.message.add_reaction("🙉")
-                except:
-                    pass
+        await hide_all_channels(ctx)
 
-            asyncio.create_task(auto_unhide_all())
+        if duration:
+            timer_scheduler.schedule(
+                "unhide_all", ctx.guild.id, duration,
+                channel_id=ctx.channel.id, message_id=ctx.message.id,
+            )
         return
     # Timed hide for single channel
     if args and parse_time_arg(args[0]):
@@ -587,21 +2023,36 @@ async def hide(ctx: Context, *args):
     await ctx.message.add_reaction("🙈")
     
     if duration:
+        timer_scheduler.schedule(
+            "unhide", ctx.guild.id, duration,
+            channel_id=ctx.channel.id, message_id=ctx.message.id,
+        )
 
-        async def auto_unhide():
-            await asyncio.sleep(duration)
-            overwrite = ctx.channel.overwrites_for(ctx.guild.default_role)
-            overwrite.view_channel = True
-            await ctx.channel.set_permissions(
-                ctx.guild.default_role, overwrite=overwrite
-            )
-            try:
-                
-                await ctx.message.add_reaction("🙉")
-            except:
-                pass
 
-        asyncio.create_task(auto_unhide())
+@job_handler("unhide")
+async def auto_unhide(guild, data):
+    channel = guild.get_channel(data["channel_id"])
+    if channel is None:
+        return
+    overwrite = channel.overwrites_for(guild.default_role)
+    overwrite.view_channel = True
+    await channel.set_permissions(guild.default_role, overwrite=overwrite)
+    await add_job_reaction(guild, data, "🙉")
+
+
+@job_handler("unhide_all")
+async def auto_unhide_all(guild, data):
+    channels = guild.text_channels
+    failed = await bulk_edit_overwrites(
+        guild,
+        channels,
+        clear_denied_permission("view_channel"),
+        label="🙉 Unhiding",
+    )
+    for channel in channels:
+        if channel not in failed:
+            hidden_channels.discard(channel.id)
+    await add_job_reaction(guild, data, "🙉")
 
 
 # ,unhide / ,uh (with 'all' support)
@@ -609,16 +2060,20 @@ async def hide(ctx: Context, *args):
 @commands.has_permissions(manage_channels=True)
 async def unhide(ctx: Context, *args):
     if args and args[0].lower() == "all":
-        # Unhide all channels logic
-        for channel in ctx.guild.text_channels:
-            for role in [ctx.guild.default_role] + list(ctx.guild.roles):
-                overwrite = channel.overwrites_for(role)
-                if overwrite.view_channel is False:
-                    overwrite.view_channel = None
-                    await channel.set_permissions(role, overwrite=overwrite)
-            hidden_channels.discard(channel.id)
+        # Unhide all channels logic
+        channels = ctx.guild.text_channels
+        failed = await bulk_edit_overwrites(
+            ctx.guild,
+            channels,
+            clear_denied_permission("view_channel"),
+            label="🙉 Unhiding",
+            progress_channel=ctx.channel,
+        )
+        for channel in channels:
+            if channel not in failed:
+                hidden_channels.discard(channel.id)
         await ctx.message.add_reaction("🙉")
-        
+
         return
     # Single channel unhide
     overwrite = ctx.channel.overwrites_for(ctx.guild.default_role)
@@ -634,48 +2089,53 @@ async def lockall(ctx: Context, *args):
     duration = None
     if args and parse_time_arg(args[-1]):
         duration = parse_time_arg(args[-1])
-    for channel in ctx.guild.text_channels:
-        for role in [ctx.guild.default_role] + list(ctx.guild.roles):
-            overwrite = channel.overwrites_for(role)
-            if overwrite.send_messages is not False:
-                overwrite.send_messages = False
-                await channel.set_permissions(role, overwrite=overwrite)
-        locked_channels.add(channel.id)
+    channels = ctx.guild.text_channels
+    failed = await bulk_edit_overwrites(
+        ctx.guild,
+        channels,
+        deny_permission("send_messages"),
+        label="🔒 Locking",
+        reason=f"Lockall by {ctx.author}",
+        progress_channel=ctx.channel,
+    )
+    for channel in channels:
+        if channel not in failed:
+            locked_channels.add(channel.id)
     await ctx.message.add_reaction("🔒")
-    
+
     if duration:
+        timer_scheduler.schedule(
+            "unlock_all", ctx.guild.id, duration,
+            channel_id=ctx.channel.id, message_id=ctx.message.id,
+        )
+
+
+@job_handler("unlock_all")
+async def auto_unlock_all(guild, data):
+    await unlock_locked_channels(guild)
+    await add_job_reaction(guild, data, "🔓")
 
-        async def auto_unlock_all():
-            await asyncio.sleep(duration)
-            for channel in ctx.guild.text_channels:
-                if channel.id in locked_channels:
-                    for role in [ctx.guild.default_role] + list(ctx.guild.roles):
-                        overwrite = channel.overwrites_for(role)
-                        if overwrite.send_messages is False:
-                            overwrite.send_messages = None
-                            await channel.set_permissions(role, overwrite=overwrite)
-                    locked_channels.remove(channel.id)
-            try:
-                
-                await ctx.message.add_reaction("🔓")
-            except:
-                pass
 
-        asyncio.create_task(auto_unlock_all())
+async def unlock_locked_channels(guild, progress_channel=None):
+    """Lifts the send_messages deny from every channel locked by lockall."""
+    channels = [c for c in guild.text_channels if c.id in locked_channels]
+    failed = await bulk_edit_overwrites(
+        guild,
+        channels,
+        clear_denied_permission("send_messages"),
+        label="🔓 Unlocking",
+        progress_channel=progress_channel,
+    )
+    for channel in channels:
+        if channel not in failed:
+            locked_channels.discard(channel.id)
 
 
 # ,unlock all / ,ul all
 @bot.command(aliases=["ulall", "ul_all", "unlock_all", "ula", "ua"])
 @commands.has_permissions(manage_channels=True)
 async def unlockall(ctx: Context):
-    for channel in ctx.guild.text_channels:
-        if channel.id in locked_channels:
-            for role in [ctx.guild.default_role] + list(ctx.guild.roles):
-                overwrite = channel.overwrites_for(role)
-                if overwrite.send_messages is False:
-                    overwrite.send_messages = None
-                    await channel.set_permissions(role, overwrite=overwrite)
-            locked_channels.remove(channel.id)
+    await unlock_locked_channels(ctx.guild, progress_channel=ctx.channel)
     await ctx.message.add_reaction("🔓")
 
 
@@ -736,13 +2196,23 @@ async def unlockall_category(ctx: Context, category_id: str):
 @bot.command(aliases=["hall", "h_all"])
 @commands.has_permissions(manage_channels=True)
 async def hideall(ctx: Context):
-    for channel in ctx.guild.text_channels:
-        for role in [ctx.guild.default_role] + list(ctx.guild.roles):
-            overwrite = channel.overwrites_for(role)
-            if overwrite.view_channel is not False:
-                overwrite.view_channel = False
-                await channel.set_permissions(role, overwrite=overwrite)
-        hidden_channels.add(channel.id)
+    await hide_all_channels(ctx)
+
+
+async def hide_all_channels(ctx: Context):
+    """Denies view_channel for every role on every text channel (hideall / hide all)."""
+    channels = ctx.guild.text_channels
+    failed = await bulk_edit_overwrites(
+        ctx.guild,
+        channels,
+        deny_permission("view_channel"),
+        label="🙈 Hiding",
+        reason=f"Hideall by {ctx.author}",
+        progress_channel=ctx.channel,
+    )
+    for channel in channels:
+        if channel not in failed:
+            hidden_channels.add(channel.id)
     await ctx.message.add_reaction("🙈")
 
 
@@ -750,14 +2220,17 @@ async def hideall(ctx: Context):
 @bot.command(aliases=["uhall", "uh_all", "unhide_all", "reveal"])
 @commands.has_permissions(manage_channels=True)
 async def unhideall(ctx: Context):
-    for channel in ctx.guild.text_channels:
-        if channel.id in hidden_channels:
-            for role in [ctx.guild.default_role] + list(ctx.guild.roles):
-                overwrite = channel.overwrites_for(role)
-                if overwrite.view_channel is False:
-                    overwrite.view_channel = None
-                    await channel.set_permissions(role, overwrite=overwrite)
-            hidden_channels.remove(channel.id)
+    channels = [c for c in ctx.guild.text_channels if c.id in hidden_channels]
+    failed = await bulk_edit_overwrites(
+        ctx.guild,
+        channels,
+        clear_denied_permission("view_channel"),
+        label="🙉 Unhiding",
+        progress_channel=ctx.channel,
+    )
+    for channel in channels:
+        if channel not in failed:
+            hidden_channels.discard(channel.id)
     await ctx.message.add_reaction("🙉")
 
 
@@ -827,7 +2300,7 @@ async def unhardlock(ctx: Context):
 
         elif key.startswith("member_"):
             member_id = int(key.split("_")[1])
-            member = ctx.guild.get_member(member_id)
+            member = await fetch_member_cached(ctx.guild, member_id)
             if member:
                 await channel.set_permissions(member, overwrite=old_overwrite)
                 restored_count += 1
@@ -838,10 +2311,106 @@ async def unhardlock(ctx: Context):
     await ctx.message.add_reaction("🔓")
 
 
+# Timeout index
+# Active timeouts per guild, so timeout_list, untimeoutall and TimeoutListView
+# work in the number of timed out members rather than the guild size. Kept
+# current from on_member_update and the timeout commands; expired entries are
+# evicted lazily from a min-heap of expiry times.
+class TimeoutIndex:
+    def __init__(self, members=()):
+        self._until = {}  # member_id -> timed_out_until
+        self._heap = []  # (timed_out_until, member_id), may hold stale entries
+        now = discord.utils.utcnow()
+        for member in members:
+            if member.timed_out_until and member.timed_out_until > now:
+                self._until[member.id] = member.timed_out_until
+        self._heap = [(until, member_id) for member_id, until in self._until.items()]
+        heapq.heapify(self._heap)
+
+    def set(self, member_id, until):
+        if until is None or until <= discord.utils.utcnow():
+            self._until.pop(member_id, None)
+            return
+        self._until[member_id] = until
+        heapq.heappush(self._heap, (until, member_id))
+        if len(self._heap) > 2 * len(self._until) + 64:
+            self._heap = [(u, m) for m, u in self._until.items()]
+            heapq.heapify(self._heap)
+
+    def discard(self, member_id):
+        self._until.pop(member_id, None)
+
+    def _evict(self):
+        now = discord.utils.utcnow()
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            until, member_id = heapq.heappop(heap)
+            if self._until.get(member_id) == until:
+                del self._until[member_id]
+
+    def active(self):
+        """Returns ``[(timed_out_until, member_id)]`` sorted by expiry."""
+        self._evict()
+        return sorted((until, member_id) for member_id, until in self._until.items())
+
+    def __len__(self):
+        self._evict()
+        return len(self._until)
+
+
+timeout_indexes = {}  # {guild_id: TimeoutIndex}
+
+
+def get_timeout_index(guild):
+    """Returns the guild's timeout index, building it from the member cache on first use."""
+    index = timeout_indexes.get(guild.id)
+    if index is None:
+        index = TimeoutIndex(guild.members)
+        if guild.chunked:
+            timeout_indexes[guild.id] = index
+    return index
+
+
+def resolve_timed_out_members(guild, entries):
+    """Cached members for ``[(timed_out_until, member_id)]`` index entries."""
+    members = (guild.get_member(member_id) for _, member_id in entries)
+    return [member for member in members if member]
+
+
+def record_timeout(guild, member_id, until):
+    """Updates the timeout index after the bot (un)timed out a member."""
+    index = timeout_indexes.get(guild.id)
+    if index is not None:
+        index.set(member_id, until)
+
+
+@bot.event
+async def on_member_update(before, after):
+    if before.timed_out_until != after.timed_out_until:
+        record_timeout(after.guild, after.id, after.timed_out_until)
+    if before.nick != after.nick:
+        index = member_name_indexes.get(after.guild.id)
+        if index is not None:
+            index.add(after)
+    fetched_members.pop((after.guild.id, after.id), None)
+
+
+@bot.event
+async def on_user_update(before, after):
+    if before.name == after.name and before.global_name == after.global_name:
+        return
+    for guild in after.mutual_guilds:
+        index = member_name_indexes.get(guild.id)
+        member = guild.get_member(after.id)
+        if index is not None and member is not None:
+            index.add(member)
+
+
 class TimeoutListView(discord.ui.View):
     def __init__(self, ctx, timed_out_members, timeout_moderators, per_page=3):
         super().__init__(timeout=180)
         self.ctx = ctx
+        # [(timed_out_until, member_id)] sorted by expiry
         self.timed_out_members = timed_out_members
         self.timeout_moderators = timeout_moderators
         self.per_page = per_page
@@ -857,12 +2426,12 @@ class TimeoutListView(discord.ui.View):
         end = start + self.per_page
         members_on_page = self.timed_out_members[start:end]
 
-        for i, member in enumerate(members_on_page, start + 1):
+        for i, (until, member_id) in enumerate(members_on_page, start + 1):
             guild_id = self.ctx.guild.id
-            mod_id = self.timeout_moderators.get(guild_id, {}).get(member.id)
+            mod_id = self.timeout_moderators.get(guild_id, {}).get(member_id)
             if mod_id:  # Only add Untimeout button if not manual
                 row = (i - 1 - start) // 5
-                self.add_item(self.UntimeoutButton(member, i, row))
+                self.add_item(self.UntimeoutButton(member_id, i, row))
 
         nav_row = math.ceil(len(members_on_page) / 5)
         if self.max_page > 0:
@@ -874,15 +2443,7 @@ class TimeoutListView(discord.ui.View):
             self.add_item(self.UntimeoutAllButton(self, row=nav_row))
 
     async def refresh_and_respond(self, interaction: discord.Interaction):
-        timed_out_members = []
-        now = datetime.now(timezone.utc)
-        for member in self.ctx.guild.members:
-            if member.timed_out_until and member.timed_out_until > now:
-                timed_out_members.append(member)
-
-        self.timed_out_members = sorted(
-            timed_out_members, key=lambda m: m.timed_out_until
-        )
+        self.timed_out_members = get_timeout_index(self.ctx.guild).active()
 
         self.max_page = math.ceil(len(self.timed_out_members) / self.per_page) - 1
         if self.page > self.max_page:
@@ -907,8 +2468,8 @@ class TimeoutListView(discord.ui.View):
         end = start + self.per_page
         members = self.timed_out_members[start:end]
         lines = []
-        for i, member in enumerate(members, start + 1):
-            remaining = member.timed_out_until - now
+        for i, (until, member_id) in enumerate(members, start + 1):
+            remaining = until - now
             minutes = int(remaining.total_seconds() // 60)
             seconds = int(remaining.total_seconds() % 60)
             time_str = (
@@ -918,11 +2479,11 @@ class TimeoutListView(discord.ui.View):
             )
 
             guild_id = self.ctx.guild.id
-            mod_id = self.timeout_moderators.get(guild_id, {}).get(member.id)
+            mod_id = self.timeout_moderators.get(guild_id, {}).get(member_id)
             mod_str = f"by <@{mod_id}>" if mod_id else "manually"
 
             lines.append(
-                f"`{i}.` {member.mention} expires in **{time_str}** (timed out {mod_str})"
+                f"`{i}.` <@{member_id}> expires in **{time_str}** (timed out {mod_str})"
             )
 
         embed = discord.Embed(
@@ -936,14 +2497,14 @@ class TimeoutListView(discord.ui.View):
         return embed
 
     class UntimeoutButton(discord.ui.Button):
-        def __init__(self, member, list_number, row):
+        def __init__(self, member_id, list_number, row):
             super().__init__(
                 style=discord.ButtonStyle.secondary,
                 label=f"Untimeout {list_number}",
-                custom_id=f"untimeout_{member.id}",
+                custom_id=f"untimeout_{member_id}",
                 row=row,
             )
-            self.member_id = member.id
+            self.member_id = member_id
 
         async def callback(self, interaction: discord.Interaction):
             view = self.view
@@ -953,7 +2514,7 @@ class TimeoutListView(discord.ui.View):
                 )
                 return
 
-            member = view.ctx.guild.get_member(self.member_id)
+            member = await fetch_member_cached(view.ctx.guild, self.member_id)
             if not member:
                 await interaction.response.send_message(
                     "User not found.", ephemeral=True
@@ -965,6 +2526,7 @@ class TimeoutListView(discord.ui.View):
                 await member.timeout(
                     None, reason=f"Untimed out by {interaction.user.name}"
                 )
+                record_timeout(view.ctx.guild, member.id, None)
                 await send_mod_dm(
                     member,
                     moderator=interaction.user,
@@ -1005,9 +2567,10 @@ class TimeoutListView(discord.ui.View):
 
             errors = []
             success_count = 0
+            members = resolve_timed_out_members(view.ctx.guild, view.timed_out_members)
 
             tasks = []
-            for member in view.timed_out_members:
+            for member in members:
                 tasks.append(
                     member.timeout(
                         None,
@@ -1016,7 +2579,7 @@ class TimeoutListView(discord.ui.View):
                 )
 
             dm_tasks = []
-            for member in view.timed_out_members:
+            for member in members:
                 dm_tasks.append(
                     send_mod_dm(
                         member,
@@ -1032,9 +2595,10 @@ class TimeoutListView(discord.ui.View):
             for i, result in enumerate(results):
                 if isinstance(result, Exception):
                     errors.append(
-                        f"Failed to untimeout {view.timed_out_members[i].mention}: {result}"
+                        f"Failed to untimeout {members[i].mention}: {result}"
                     )
                 else:
+                    record_timeout(view.ctx.guild, members[i].id, None)
                     success_count += 1
 
             if errors:
@@ -1076,6 +2640,105 @@ class TimeoutListView(discord.ui.View):
                 )
 
 
+# Ban cache
+# Bans per guild, fetched lazily a page at a time (the bans endpoint paginates
+# in ascending user ID order) and kept in sync from on_member_ban and
+# on_member_unban, so ban_list and its buttons never re-download the list.
+BAN_PAGE_SIZE = 1000
+
+
+class BanCache:
+    def __init__(self, guild):
+        self.guild = guild
+        self._ids = []  # sorted user IDs
+        self._entries = {}  # user_id -> discord.BanEntry
+        self._cursor = 0  # highest user ID fetched so far
+        self.complete = False
+        self._lock = asyncio.Lock()
+
+    async def ensure(self, count):
+        """Fetches pages until ``count`` bans are cached or the list is exhausted."""
+        async with self._lock:
+            while not self.complete and len(self._ids) < count:
+                fetched = 0
+                async for entry in self.guild.bans(
+                    limit=BAN_PAGE_SIZE, after=discord.Object(id=self._cursor)
+                ):
+                    fetched += 1
+                    self._cursor = max(self._cursor, entry.user.id)
+                    self._insert(entry)
+                if fetched < BAN_PAGE_SIZE:
+                    self.complete = True
+
+    async def ensure_all(self):
+        await self.ensure(math.inf)
+
+    def _insert(self, entry):
+        user_id = entry.user.id
+        if user_id not in self._entries:
+            bisect.insort(self._ids, user_id)
+        self._entries[user_id] = entry
+
+    def add(self, entry):
+        # Bans past the cursor are picked up when their page is fetched
+        if self.complete or entry.user.id <= self._cursor:
+            self._insert(entry)
+
+    def refresh(self, entry):
+        """Replaces a cached ban with ``entry``, e.g. to fill in its reason."""
+        if entry.user.id in self._entries:
+            self._entries[entry.user.id] = entry
+
+    def remove(self, user_id):
+        if self._entries.pop(user_id, None) is not None:
+            del self._ids[bisect.bisect_left(self._ids, user_id)]
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, user_id):
+        return user_id in self._entries
+
+    def __iter__(self):
+        return (self._entries[user_id] for user_id in list(self._ids))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._entries[user_id] for user_id in self._ids[index]]
+        return self._entries[self._ids[index]]
+
+
+ban_caches = {}  # {guild_id: BanCache}
+
+
+def get_ban_cache(guild):
+    cache = ban_caches.get(guild.id)
+    if cache is None:
+        cache = ban_caches[guild.id] = BanCache(guild)
+    return cache
+
+
+@bot.event
+async def on_member_ban(guild, user):
+    cache = ban_caches.get(guild.id)
+    if cache is None:
+        return
+    cache.add(discord.BanEntry(reason=None, user=user))
+    # The gateway event carries no reason; fetch the ban for it
+    if user.id in cache:
+        try:
+            cache.refresh(await guild.fetch_ban(user))
+        except discord.HTTPException:
+            pass
+
+
+@bot.event
+async def on_member_unban(guild, user):
+    cache = ban_caches.get(guild.id)
+    if cache is not None:
+        cache.remove(user.id)
+
+
 class BanListView(discord.ui.View):
     def __init__(self, ctx, banned_users, ban_moderators, per_page=3):
         super().__init__(timeout=180)
@@ -1084,10 +2747,21 @@ class BanListView(discord.ui.View):
         self.ban_moderators = ban_moderators
         self.per_page = per_page
         self.page = 0
-        self.max_page = math.ceil(len(banned_users) / per_page) - 1
+        self.max_page = self._max_page()
         self.message: Optional[discord.Message] = None
         self.update_view()
 
+    def _max_page(self):
+        pages = math.ceil(len(self.banned_users) / self.per_page)
+        if not self.banned_users.complete:
+            pages += 1  # more bans past the fetched ones
+        return max(pages - 1, 0)
+
+    async def load_page(self, page):
+        """Fetches enough bans to show ``page`` and tell whether another follows."""
+        await self.banned_users.ensure((page + 1) * self.per_page + 1)
+        self.max_page = self._max_page()
+
     def update_view(self):
         self.clear_items()
 
@@ -1112,18 +2786,14 @@ class BanListView(discord.ui.View):
             self.add_item(self.UnbanAllButton(self, row=nav_row))
 
     async def refresh_and_respond(self, interaction: discord.Interaction):
-        banned_users = []
         try:
-            async for ban_entry in self.ctx.guild.bans():
-                banned_users.append(ban_entry)
+            await self.load_page(self.page)
         except discord.Forbidden:
-            await interaction.response.send_message("❌ I don't have permission to view bans!", ephemeral=True)
+            await interaction.followup.send("❌ I don't have permission to view bans!", ephemeral=True)
             return
 
-        self.banned_users = banned_users
-        self.max_page = math.ceil(len(self.banned_users) / self.per_page) - 1
         if self.page > self.max_page:
-            self.page = self.max_page if self.max_page >= 0 else 0
+            self.page = self.max_page
 
         if not self.banned_users:
             embed = discord.Embed(
@@ -1160,8 +2830,10 @@ class BanListView(discord.ui.View):
             description="\n".join(lines),
             color=0xFF0000,
         )
+        count = len(self.banned_users)
+        more = "" if self.banned_users.complete else "+"
         embed.set_footer(
-            text=f"Page {self.page+1}/{self.max_page+1} ({len(self.banned_users)} entr{'y' if len(self.banned_users)==1 else 'ies'})"
+            text=f"Page {self.page+1}/{self.max_page+1}{more} ({count}{more} entr{'y' if count==1 and not more else 'ies'})"
         )
         return embed
 
@@ -1186,6 +2858,7 @@ class BanListView(discord.ui.View):
             user = discord.Object(self.user_id)
             try:
                 await interaction.guild.unban(user, reason=f"Unbanned by {interaction.user.name}")
+                view.banned_users.remove(self.user_id)
                 await interaction.response.send_message(
                     f"Unbanned user with ID {self.user_id}.", ephemeral=True
                 )
@@ -1221,8 +2894,15 @@ class BanListView(discord.ui.View):
             errors = []
             success_count = 0
 
+            try:
+                await view.banned_users.ensure_all()
+            except discord.Forbidden:
+                await interaction.followup.send("❌ I don't have permission to view bans!", ephemeral=True)
+                return
+            ban_entries = list(view.banned_users)
+
             tasks = []
-            for ban_entry in view.banned_users:
+            for ban_entry in ban_entries:
                 tasks.append(
                     interaction.guild.unban(
                         ban_entry.user,
@@ -1232,12 +2912,13 @@ class BanListView(discord.ui.View):
 
             results = await asyncio.gather(*tasks, return_exceptions=True)
 
-            for i, result in enumerate(results):
+            for ban_entry, result in zip(ban_entries, results):
                 if isinstance(result, Exception):
                     errors.append(
-                        f"Failed to unban {view.banned_users[i].user.mention}: {result}"
+                        f"Failed to unban {ban_entry.user.mention}: {result}"
                     )
                 else:
+                    view.banned_users.remove(ban_entry.user.id)
                     success_count += 1
 
             if errors:
@@ -1260,9 +2941,16 @@ class BanListView(discord.ui.View):
 
         async def callback(self, interaction):
             if self.view.page < self.view.max_page:
-                self.view.page += 1
+                # Fetching the next page of bans can outlast the interaction deadline
+                await interaction.response.defer()
+                try:
+                    await self.view.load_page(self.view.page + 1)
+                except discord.Forbidden:
+                    await interaction.followup.send("❌ I don't have permission to view bans!", ephemeral=True)
+                    return
+                self.view.page = min(self.view.page + 1, self.view.max_page)
                 self.view.update_view()
-                await interaction.response.edit_message(
+                await interaction.edit_original_response(
                     embed=self.view.make_embed(), view=self.view
                 )
 
@@ -1282,11 +2970,8 @@ class BanListView(discord.ui.View):
 @bot.command(aliases=["to list", "timeouts", "timeouts list", "tl", "timeoutlist"])
 @commands.has_permissions(moderate_members=True)
 async def timeout_list(ctx: Context):
-    timed_out_members = []
-    now = datetime.now(timezone.utc)
-    for member in ctx.guild.members:
-        if member.timed_out_until and member.timed_out_until > now:
-            timed_out_members.append(member)
+    await ensure_chunked(ctx.guild)
+    timed_out_members = get_timeout_index(ctx.guild).active()
     if not timed_out_members:
         embed = discord.Embed(
             description=f"🔎 {ctx.author.mention}: **No members are currently timed out!**",
@@ -1373,6 +3058,7 @@ async def inrole(ctx: Context, *, role: discord.Role = None):
     if not role:
         await ctx.send("Please specify a role.")
         return
+    await ensure_chunked(ctx.guild)
     members = [m for m in role.members]
 
     def fmt(i, m):
@@ -1402,6 +3088,672 @@ async def av(ctx: Context, member: discord.Member = None):
     await ctx.message.add_reaction("👤")
 
 
+# Join order index
+# Members of a guild sorted by (joined_at, id) with a Fenwick tree of which
+# slots are still in the guild. Someone joining always has the latest join time,
+# so joins are appends and leaves just clear their slot: join position and
+# "who is member #N" are both O(log n) instead of sorting the member list.
+class JoinOrderIndex:
+    def __init__(self, members):
+        now = discord.utils.utcnow()
+        keys = sorted(((m.joined_at or now).timestamp(), m.id) for m in members)
+        self._build(keys)
+
+    def _build(self, keys):
+        self._keys = keys  # slot - 1 -> (joined_at, member_id), None once the member left
+        self._slots = {key[1]: slot for slot, key in enumerate(keys, 1)}
+        size = len(keys)
+        tree = [0] + [1] * size
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _prefix(self, slot):
+        total = 0
+        tree = self._tree
+        while slot > 0:
+            total += tree[slot]
+            slot -= slot & -slot
+        return total
+
+    def add(self, member):
+        if member.id in self._slots:
+            self.remove(member.id)
+        key = ((member.joined_at or discord.utils.utcnow()).timestamp(), member.id)
+        last = next((k for k in reversed(self._keys) if k is not None), None)
+        if last is not None and key < last:
+            # Out-of-order join (e.g. a late event); rebuild in sorted order
+            self._build(sorted([k for k in self._keys if k is not None] + [key]))
+            return
+        self._keys.append(key)
+        slot = len(self._keys)
+        # Fenwick node `slot` covers (slot - lowbit, slot]
+        self._tree.append(1 + self._prefix(slot - 1) - self._prefix(slot - (slot & -slot)))
+        self._slots[member.id] = slot
+
+    def remove(self, member_id):
+        slot = self._slots.pop(member_id, None)
+        if slot is None:
+            return
+        self._keys[slot - 1] = None
+        tree = self._tree
+        while slot < len(tree):
+            tree[slot] -= 1
+            slot += slot & -slot
+        # Compact once most slots are dead
+        if len(self._keys) > 2 * len(self._slots) + 64:
+            self._build([k for k in self._keys if k is not None])
+
+    def position(self, member_id):
+        """1-based join position of a member, or None if not indexed."""
+        slot = self._slots.get(member_id)
+        return self._prefix(slot) if slot is not None else None
+
+    def member_at(self, position):
+        """ID of the member at 1-based join position ``position``, or None."""
+        if position < 1 or position > len(self._slots):
+            return None
+        tree = self._tree
+        slot = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            nxt = slot + step
+            if nxt < len(tree) and tree[nxt] < position:
+                slot = nxt
+                position -= tree[nxt]
+            step >>= 1
+        return self._keys[slot][1]
+
+
+join_indexes = {}  # {guild_id: JoinOrderIndex}
+
+
+def get_join_index(guild):
+    """Returns the guild's join order index, building it on first use."""
+    index = join_indexes.get(guild.id)
+    if index is None:
+        index = JoinOrderIndex(guild.members)
+        # A partially cached member list would give wrong positions forever
+        if guild.chunked:
+            join_indexes[guild.id] = index
+    return index
+
+
+# Guild composition counters
+# Member, channel, role and emoji counts for serverinfo/mc, kept current from
+# gateway events so neither command has to scan the member cache. A periodic
+# pass recounts everything in case an event was missed.
+# Structure: {guild_id: {"humans", "bots", "text", "voice", "category", "roles", "emojis": int}}
+guild_counters = {}
+COUNTER_RECONCILE_MINUTES = 30
+
+
+def count_guild(guild):
+    """Counts everything from the cache (O(members + channels))."""
+    counters = {"humans": 0, "bots": 0, "text": 0, "voice": 0, "category": 0}
+    for member in guild.members:
+        counters["bots" if member.bot else "humans"] += 1
+    for channel in guild.channels:
+        key = channel_counter_key(channel)
+        if key:
+            counters[key] += 1
+    counters["roles"] = len(guild.roles)
+    counters["emojis"] = len(guild.emojis)
+    return counters
+
+
+def channel_counter_key(channel):
+    if isinstance(channel, discord.TextChannel):
+        return "text"
+    if isinstance(channel, discord.VoiceChannel):
+        return "voice"
+    if isinstance(channel, discord.CategoryChannel):
+        return "category"
+    return None
+
+
+def get_guild_counters(guild):
+    counters = guild_counters.get(guild.id)
+    if counters is None:
+        counters = count_guild(guild)
+        # Member counts from a partial cache would stay wrong
+        if guild.chunked:
+            guild_counters[guild.id] = counters
+    return counters
+
+
+def bump_guild_counter(guild, key, delta):
+    counters = guild_counters.get(guild.id)
+    if counters is not None and key:
+        counters[key] += delta
+
+
+@tasks.loop(minutes=COUNTER_RECONCILE_MINUTES)
+async def reconcile_guild_counters():
+    for guild_id in list(guild_counters):
+        guild = bot.get_guild(guild_id)
+        if guild is None:
+            guild_counters.pop(guild_id, None)
+            continue
+        if guild.chunked:
+            guild_counters[guild_id] = count_guild(guild)
+        await asyncio.sleep(0)  # let other events run between guilds
+
+
+@reconcile_guild_counters.before_loop
+async def before_reconcile_guild_counters():
+    await bot.wait_until_ready()
+
+
+# Member cache in low-memory mode
+# Members who post are added to the cache as they are seen; every
+# MEMBER_TRIM_MINUTES, members who have not posted for ACTIVE_MEMBER_SECONDS
+# (and are not in voice) are dropped again. A guild chunked by ensure_chunked is
+# left whole for CHUNK_KEEP_SECONDS after the last command that needed it.
+# Trimming a guild drops the indexes built from its full member list; they are
+# rebuilt after the next chunk.
+ACTIVE_MEMBER_SECONDS = 30 * 60
+CHUNK_KEEP_SECONDS = 15 * 60
+MEMBER_TRIM_MINUTES = 5
+member_activity = defaultdict(dict)  # {guild_id: {member_id: monotonic time last seen}}
+chunk_pins = {}  # {guild_id: monotonic time the full member list was last needed}
+
+
+async def ensure_chunked(guild):
+    """Makes sure the guild's full member list is cached, chunking it if needed."""
+    if LOW_MEMORY:
+        chunk_pins[guild.id] = time.monotonic()
+    if not guild.chunked:
+        # discord.py shares one request between concurrent callers
+        await guild.chunk()
+
+
+def note_active_member(member):
+    """Records a member as active and caches them if they were not cached."""
+    guild = member.guild
+    member_activity[guild.id][member.id] = time.monotonic()
+    if guild.get_member(member.id) is None:
+        guild._add_member(member)
+
+
+def drop_member_indexes(guild_id):
+    """Forgets everything derived from the guild's full member list."""
+    join_indexes.pop(guild_id, None)
+    timeout_indexes.pop(guild_id, None)
+    member_name_indexes.pop(guild_id, None)
+    guild_counters.pop(guild_id, None)
+
+
+def trim_guild_members(guild, now):
+    """Drops cached members who are not active or in voice. Returns how many."""
+    activity = member_activity.get(guild.id, {})
+    for member_id, seen in list(activity.items()):
+        if now - seen > ACTIVE_MEMBER_SECONDS:
+            del activity[member_id]
+    if not activity:
+        member_activity.pop(guild.id, None)
+    keep = {bot.user.id, guild.owner_id, *activity, *guild._voice_states}
+    stale = [member for member in guild.members if member.id not in keep]
+    for member in stale:
+        guild._remove_member(member)
+        # Uncached members get no update events, so an older fetched copy
+        # must not outlive the cached one
+        fetched_members.pop((guild.id, member.id), None)
+    if stale:
+        drop_member_indexes(guild.id)
+    return len(stale)
+
+
+@tasks.loop(minutes=MEMBER_TRIM_MINUTES)
+async def trim_member_cache():
+    now = time.monotonic()
+    for guild in list(bot.guilds):
+        pinned = chunk_pins.get(guild.id)
+        if pinned is not None:
+            if now - pinned < CHUNK_KEEP_SECONDS:
+                continue
+            del chunk_pins[guild.id]
+        trim_guild_members(guild, now)
+        await asyncio.sleep(0)  # let other events run between guilds
+
+
+@trim_member_cache.before_loop
+async def before_trim_member_cache():
+    await bot.wait_until_ready()
+
+
+# Anti-raid
+# Joins are recorded per guild in a ring buffer of the last `joins` join times,
+# so each join is O(1): the slot about to be overwritten holds the oldest of
+# those joins, and if it is less than `seconds` old the threshold is crossed.
+# The response is either a lockdown through the lockall engine or a quarantine
+# (timeout) of the joiners. Staff are alerted, and the response is lifted once
+# no burst has been seen for `calm` seconds.
+ANTIRAID_DEFAULTS = {
+    "enabled": False,
+    "joins": 10,
+    "seconds": 10,
+    "action": "lockdown",  # or "quarantine"
+    "alert_channel_id": None,
+    "calm": 300,
+}
+QUARANTINE_DURATION = timedelta(hours=6)  # upper bound, lifted with the raid
+antiraid_settings = PersistentDict(state_store, "antiraid_settings")  # {guild_id: {setting: value}}
+active_raids = PersistentDict(state_store, "active_raids")  # {guild_id: {"action": str, "started": datetime, "channel_ids": [int], "member_ids": [int]}}
+join_monitors = {}  # {guild_id: JoinRateMonitor}
+raid_last_burst = {}  # {guild_id: time.monotonic() of the last over-threshold join}
+raid_lift_tasks = {}  # {guild_id: asyncio.Task}
+raid_locks = defaultdict(asyncio.Lock)  # {guild_id: lock held while a lockdown is applied or lifted}
+RAID_GUILD_RETRY_SECONDS = 60
+
+
+class JoinRateMonitor:
+    def __init__(self, joins, seconds):
+        self.seconds = seconds
+        self._times = [float("-inf")] * joins
+        self._members = [None] * joins
+        self._next = 0
+
+    def record(self, now, member_id):
+        """Records a join; True if the last ``joins`` joins all fell within ``seconds``."""
+        oldest = self._times[self._next]
+        self._times[self._next] = now
+        self._members[self._next] = member_id
+        self._next = (self._next + 1) % len(self._times)
+        return now - oldest <= self.seconds
+
+    def recent_members(self, now):
+        return [
+            member_id
+            for joined, member_id in zip(self._times, self._members)
+            if member_id is not None and now - joined <= self.seconds
+        ]
+
+
+def antiraid_config(guild_id):
+    return {**ANTIRAID_DEFAULTS, **antiraid_settings.get(guild_id, {})}
+
+
+async def check_join_rate(member):
+    guild = member.guild
+    config = antiraid_config(guild.id)
+    if not config["enabled"]:
+        return
+    monitor = join_monitors.get(guild.id)
+    if monitor is None:
+        monitor = join_monitors[guild.id] = JoinRateMonitor(config["joins"], config["seconds"])
+    now = time.monotonic()
+    burst = monitor.record(now, member.id)
+    if guild.id not in active_raids:
+        if burst:
+            await start_raid_response(guild, config, monitor.recent_members(now))
+        return
+    if burst:
+        raid_last_burst[guild.id] = now
+    if active_raids[guild.id]["action"] == "quarantine":
+        await quarantine_members(guild, [member.id])
+
+
+async def start_raid_response(guild, config, member_ids):
+    raid_last_burst[guild.id] = time.monotonic()
+    active_raids[guild.id] = {
+        "action": config["action"],
+        "started": datetime.now(timezone.utc),
+        "channel_ids": [],
+        "member_ids": [],
+    }
+    watch_raid(guild.id)
+    if config["action"] == "lockdown":
+        async with raid_locks[guild.id]:
+            # Leave channels that were already locked to their own unlock
+            channels = [c for c in guild.text_channels if c.id not in locked_channels]
+            # Record the channels before editing them, so a restart part way
+            # through still unlocks them
+            for channel in channels:
+                locked_channels.add(channel.id)
+            if guild.id in active_raids:
+                active_raids[guild.id] = dict(active_raids[guild.id], channel_ids=[c.id for c in channels])
+            failed = await bulk_edit_overwrites(
+                guild,
+                channels,
+                deny_permission("send_messages"),
+                label="🚨 Raid lockdown",
+                reason="Anti-raid: join rate exceeded",
+            )
+            for channel in failed:
+                locked_channels.discard(channel.id)
+            locked = [c.id for c in channels if c not in failed]
+            if guild.id in active_raids:
+                active_raids[guild.id] = dict(active_raids[guild.id], channel_ids=locked)
+        response = f"Locked **{len(locked)}** channels."
+    else:
+        quarantined = await quarantine_members(guild, member_ids)
+        response = f"Timed out **{quarantined}** recent joiners; new joiners are timed out until it ends."
+    await send_raid_alert(
+        guild,
+        "🚨 Raid detected",
+        f"**{config['joins']}** members joined within **{config['seconds']}s**. {response}\n"
+        f"Lifted automatically after {format_duration(config['calm'])} without a burst, or with `,antiraid lift`.",
+    )
+
+
+async def quarantine_members(guild, member_ids):
+    """Times out ``member_ids`` for the raid; returns how many were timed out."""
+    until = discord.utils.utcnow() + QUARANTINE_DURATION
+
+    async def quarantine(member_id):
+        member = await fetch_member_cached(guild, member_id)
+        if member is None or member.top_role >= guild.me.top_role:
+            return None
+        try:
+            await member.timeout(until, reason="Anti-raid quarantine")
+        except discord.HTTPException:
+            return None
+        record_timeout(guild, member_id, until)
+        return member_id
+
+    results = await asyncio.gather(*(quarantine(member_id) for member_id in member_ids))
+    quarantined = [member_id for member_id in results if member_id]
+    raid = active_raids.get(guild.id)
+    if raid is not None and quarantined:
+        active_raids[guild.id] = dict(raid, member_ids=raid["member_ids"] + quarantined)
+    return len(quarantined)
+
+
+def watch_raid(guild_id):
+    if guild_id in raid_lift_tasks:
+        return
+    task = asyncio.create_task(lift_raid_when_calm(guild_id))
+    raid_lift_tasks[guild_id] = task
+    task.add_done_callback(lambda _: raid_lift_tasks.pop(guild_id, None))
+
+
+async def lift_raid_when_calm(guild_id):
+    while guild_id in active_raids:
+        calm = antiraid_config(guild_id)["calm"]
+        remaining = raid_last_burst.get(guild_id, 0) + calm - time.monotonic()
+        if remaining <= 0:
+            guild = bot.get_guild(guild_id)
+            if guild is not None and not guild.unavailable:
+                await lift_raid(guild, "Join rate is back to normal.")
+                return
+            # The guild is unavailable (outage or reconnect); try again later
+            remaining = RAID_GUILD_RETRY_SECONDS
+        await asyncio.sleep(remaining)
+
+
+async def lift_raid(guild, note):
+    # Waits for a lockdown that is still being applied, so every channel it
+    # locked is unlocked
+    async with raid_locks[guild.id]:
+        raid = active_raids.pop(guild.id, None)
+        raid_last_burst.pop(guild.id, None)
+        if raid is None:
+            return
+        if raid["action"] == "lockdown":
+            channels = [c for c in map(guild.get_channel, raid["channel_ids"]) if c]
+            failed = await bulk_edit_overwrites(
+                guild,
+                channels,
+                clear_denied_permission("send_messages"),
+                label="🔓 Lifting raid lockdown",
+                reason="Anti-raid: lockdown lifted",
+            )
+            for channel in channels:
+                if channel not in failed:
+                    locked_channels.discard(channel.id)
+            response = f"Unlocked **{len(channels) - len(failed)}** channels."
+        else:
+            members = await asyncio.gather(*(fetch_member_cached(guild, member_id) for member_id in raid["member_ids"]))
+            members = [m for m in members if m]
+            results = await asyncio.gather(
+                *(m.timeout(None, reason="Anti-raid quarantine lifted") for m in members),
+                return_exceptions=True,
+            )
+            for member, result in zip(members, results):
+                if not isinstance(result, Exception):
+                    record_timeout(guild, member.id, None)
+            response = f"Removed the timeout from **{sum(not isinstance(r, Exception) for r in results)}** members."
+        await send_raid_alert(guild, "✅ Raid response lifted", f"{note} {response}")
+
+
+async def send_raid_alert(guild, title, description):
+    channel_id = antiraid_config(guild.id)["alert_channel_id"]
+    channel = guild.get_channel(channel_id) if channel_id else guild.public_updates_channel or guild.system_channel
+    if channel is None:
+        return
+    embed = discord.Embed(title=title, description=description, color=0x4C4C54, timestamp=datetime.now(timezone.utc))
+    try:
+        await channel.send(embed=embed)
+    except discord.HTTPException:
+        pass
+
+
+def resume_raid_watchers():
+    """Restarts the calm-down timers of raids that were active before a restart."""
+    for guild_id in list(active_raids):
+        raid_last_burst.setdefault(guild_id, time.monotonic())
+        watch_raid(guild_id)
+
+
+@bot.command(aliases=["raid"])
+@commands.has_permissions(manage_guild=True)
+async def antiraid(ctx: Context, subcommand: str = None, *args):
+    """Configures join-rate raid detection.
+
+    ,antiraid                            show settings and status
+    ,antiraid on/off
+    ,antiraid threshold <joins> <secs>   e.g. 10 joins in 10 seconds
+    ,antiraid action lockdown/quarantine
+    ,antiraid alerts <#channel>/off      defaults to the updates/system channel
+    ,antiraid calm <duration>            quiet time before lifting, e.g. 5m
+    ,antiraid lift                       end the current raid response now
+    """
+    config = antiraid_config(ctx.guild.id)
+
+    async def warn(text):
+        embed = discord.Embed(description=f"⚠️ {ctx.author.mention}: {text}", color=0x4C4C54)
+        await ctx.send(embed=embed)
+
+    if subcommand is None:
+        alerts = f"<#{config['alert_channel_id']}>" if config["alert_channel_id"] else "updates/system channel"
+        raid = active_raids.get(ctx.guild.id)
+        status = f"🚨 **Raid {raid['action']} active** since <t:{int(raid['started'].timestamp())}:R>" if raid else "No raid in progress"
+        embed = discord.Embed(
+            title="Anti-raid",
+            description=(
+                f"**Enabled:** {'yes' if config['enabled'] else 'no'}\n"
+                f"**Threshold:** {config['joins']} joins in {config['seconds']}s\n"
+                f"**Action:** {config['action']}\n"
+                f"**Alerts:** {alerts}\n"
+                f"**Lift after:** {format_duration(config['calm'])} without a burst\n\n"
+                f"{status}"
+            ),
+            color=0x4C4C54,
+        )
+        await ctx.send(embed=embed)
+        return
+
+    action = subcommand.lower()
+    changes = {}
+    if action in ("on", "off"):
+        changes["enabled"] = action == "on"
+    elif action == "threshold":
+        if len(args) != 2 or not all(a.isdigit() for a in args) or int(args[0]) < 2 or int(args[1]) < 1:
+            await warn("Usage: `,antiraid threshold <joins (2+)> <seconds>`")
+            return
+        changes["joins"], changes["seconds"] = int(args[0]), int(args[1])
+    elif action == "action":
+        if not args or args[0].lower() not in ("lockdown", "quarantine"):
+            await warn("Usage: `,antiraid action lockdown/quarantine`")
+            return
+        changes["action"] = args[0].lower()
+    elif action == "alerts":
+        if args and args[0].lower() == "off":
+            changes["alert_channel_id"] = None
+        elif ctx.message.channel_mentions:
+            changes["alert_channel_id"] = ctx.message.channel_mentions[0].id
+        else:
+            await warn("Usage: `,antiraid alerts <#channel>/off`")
+            return
+    elif action == "calm":
+        seconds = parse_time_arg(args[0]) if args else None
+        if not seconds:
+            await warn("Usage: `,antiraid calm <duration>` (e.g. `5m`)")
+            return
+        changes["calm"] = seconds
+    elif action == "lift":
+        if ctx.guild.id not in active_raids:
+            await warn("No raid response is active.")
+            return
+        await lift_raid(ctx.guild, f"Lifted by {ctx.author.mention}.")
+        await ctx.message.add_reaction("🔓")
+        return
+    else:
+        await warn("Unknown subcommand. Use on, off, threshold, action, alerts, calm or lift.")
+        return
+
+    antiraid_settings[ctx.guild.id] = {**antiraid_settings.get(ctx.guild.id, {}), **changes}
+    join_monitors.pop(ctx.guild.id, None)
+    await ctx.message.add_reaction("✅")
+
+
+@bot.event
+async def on_member_join(member):
+    if LOW_MEMORY:
+        note_active_member(member)
+    index = join_indexes.get(member.guild.id)
+    if index is not None:
+        index.add(member)
+    index = member_name_indexes.get(member.guild.id)
+    if index is not None:
+        index.add(member)
+    bump_guild_counter(member.guild, "bots" if member.bot else "humans", 1)
+    member_deltas[member.guild.id] += 1
+    await check_join_rate(member)
+
+
+@bot.event
+async def on_member_remove(member):
+    index = join_indexes.get(member.guild.id)
+    if index is not None:
+        index.remove(member.id)
+    index = member_name_indexes.get(member.guild.id)
+    if index is not None:
+        index.remove(member.id)
+    fetched_members.pop((member.guild.id, member.id), None)
+    bump_guild_counter(member.guild, "bots" if member.bot else "humans", -1)
+    record_timeout(member.guild, member.id, None)
+
+
+@bot.event
+async def on_guild_join(guild):
+    if guild.chunked:
+        guild_counters[guild.id] = count_guild(guild)
+
+
+@bot.event
+async def on_guild_remove(guild):
+    join_indexes.pop(guild.id, None)
+    guild_counters.pop(guild.id, None)
+    timeout_indexes.pop(guild.id, None)
+    ban_caches.pop(guild.id, None)
+    join_monitors.pop(guild.id, None)
+    role_name_indexes.pop(guild.id, None)
+    member_name_indexes.pop(guild.id, None)
+    member_activity.pop(guild.id, None)
+    chunk_pins.pop(guild.id, None)
+    forget_fetched_members(guild.id)
+    active_raids.pop(guild.id, None)
+
+
+@bot.event
+async def on_guild_available(guild):
+    # Roles and members that changed while the guild was unavailable arrive
+    # in GUILD_CREATE without role or member events, so everything derived
+    # from them is rebuilt or fetched again on use
+    role_name_indexes.pop(guild.id, None)
+    drop_member_indexes(guild.id)
+    forget_fetched_members(guild.id)
+    # At startup on_ready adopts them once for every guild
+    if bot.is_ready():
+        adopt_private_rooms()
+
+
+@bot.event
+async def on_guild_channel_create(channel):
+    bump_guild_counter(channel.guild, channel_counter_key(channel), 1)
+    await apply_mute_overwrites(channel)
+
+
+@bot.event
+async def on_guild_role_create(role):
+    bump_guild_counter(role.guild, "roles", 1)
+    index = role_name_indexes.get(role.guild.id)
+    if index is not None:
+        index.add(role)
+
+
+@bot.event
+async def on_guild_role_update(before, after):
+    index = role_name_indexes.get(after.guild.id)
+    if index is not None and before.name != after.name:
+        index.add(after)
+
+
+@bot.event
+async def on_guild_role_delete(role):
+    bump_guild_counter(role.guild, "roles", -1)
+    index = role_name_indexes.get(role.guild.id)
+    if index is not None:
+        index.remove(role.id)
+
+
+@bot.event
+async def on_guild_emojis_update(guild, before, after):
+    counters = guild_counters.get(guild.id)
+    if counters is not None:
+        counters["emojis"] = len(after)
+
+
+@bot.command(aliases=["joinposition", "joined"])
+async def joinpos(ctx: Context, position: int):
+    """Shows who is member #N by join order."""
+    await ensure_chunked(ctx.guild)
+    member_id = get_join_index(ctx.guild).member_at(position)
+    member = ctx.guild.get_member(member_id) if member_id else None
+    if not member:
+        embed = discord.Embed(
+            description=f"⚠️ {ctx.author.mention}: There is no member #{position}.",
+            color=0x4C4C54,
+        )
+        await ctx.send(embed=embed)
+        return
+    joined = f"<t:{int(member.joined_at.timestamp())}:F>" if member.joined_at else "an unknown date"
+    embed = discord.Embed(
+        description=f"**{member.display_name}** ({member.mention}) is member **#{position}**, joined {joined}.",
+        color=0x4C4C54,
+    )
+    await ctx.send(embed=embed)
+
+
+async def cluster_query(name, **args):
+    """Results of ``name`` from every other cluster ([] when not clustered)."""
+    if cluster is None:
+        return []
+    return await cluster.query(name, **args)
+
+
+@cluster_handler("mutual_guilds")
+def count_mutual_guilds(user_id):
+    return sum(1 for g in bot.guilds if g.get_member(user_id))
+
+
 @bot.command(aliases=["userinfo", "whois", "info"])
 async def ui(ctx: Context, member: discord.Member = None):
     """Shows user info in a styled embed."""
@@ -1412,10 +3764,10 @@ async def ui(ctx: Context, member: discord.Member = None):
     roles = [r for r in member.roles if r != ctx.guild.default_role]
     roles_str = ", ".join(r.mention for r in roles) if roles else "None"
     # Join position
-    members_sorted = sorted(ctx.guild.members, key=lambda m: m.joined_at or now)
-    join_pos = members_sorted.index(member) + 1 if member in members_sorted else "?"
-    # Mutual servers
-    mutuals = sum(1 for g in ctx.bot.guilds if g.get_member(member.id))
+    join_pos = (get_join_index(ctx.guild).position(member.id) if ctx.guild.chunked else None) or "?"
+    # Mutual servers, across every cluster
+    mutuals = count_mutual_guilds(member.id)
+    mutuals += sum(filter(None, await cluster_query("mutual_guilds", user_id=member.id)))
     embed = discord.Embed(
         description=f"**{member.display_name}** ({member.id})",
         color=0x4C4C54,
@@ -1459,18 +3811,20 @@ async def serverinfo(ctx: Context):
     created_fmt = g.created_at.strftime("%B %d, %Y")
     created_delta = (now - g.created_at).days
     owner = g.owner.mention if g.owner else "Unknown"
+    await ensure_chunked(g)
+    counters = get_guild_counters(g)
     # Members
     total = g.member_count
-    humans = len([m for m in g.members if not m.bot])
+    humans = counters["humans"]
     bots = total - humans
     # Channels
-    text_ch = len([c for c in g.text_channels])
-    voice_ch = len([c for c in g.voice_channels])
-    cat_ch = len([c for c in g.categories])
+    text_ch = counters["text"]
+    voice_ch = counters["voice"]
+    cat_ch = counters["category"]
     # Roles
-    roles = len(g.roles)
+    roles = counters["roles"]
     # Emojis
-    emojis = len(g.emojis)
+    emojis = counters["emojis"]
     # Boosts
     boosts = g.premium_subscription_count or 0
     boost_level = g.premium_tier
@@ -1536,8 +3890,9 @@ async def serverinfo(ctx: Context):
 async def mc(ctx: Context):
     """Shows server statistics in a styled embed."""
     g = ctx.guild
+    await ensure_chunked(g)
     total = g.member_count
-    humans = len([m for m in g.members if not m.bot])
+    humans = get_guild_counters(g)["humans"]
     bots = total - humans
     msg_delta = message_deltas[g.id]
     mem_delta = member_deltas[g.id]
@@ -1556,7 +3911,7 @@ async def mc(ctx: Context):
 @commands.has_permissions(moderate_members=True)
 async def untimeout(ctx: Context, user: str):
     """Removes timeout from a user."""
-    member = get_user_from_arg(ctx.guild, user)
+    member = await resolve_member(ctx.guild, user)
     if not member:
         embed = discord.Embed(
             description=f"⚠️ {ctx.author.mention}: Could not find the specified user.",
@@ -1573,6 +3928,7 @@ async def untimeout(ctx: Context, user: str):
         return
     try:
         await member.timeout(None, reason=f"Untimed out by {ctx.author.display_name}")
+        record_timeout(ctx.guild, member.id, None)
         # Send DM to user
         await send_mod_dm(
             member,
@@ -1603,8 +3959,8 @@ async def untimeout(ctx: Context, user: str):
 @commands.has_permissions(moderate_members=True)
 async def untimeoutall(ctx: Context):
     """Removes timeout from all currently timed out users in the server."""
-    now = datetime.now(timezone.utc)
-    timed_out_members = [m for m in ctx.guild.members if m.timed_out_until and m.timed_out_until > now]
+    await ensure_chunked(ctx.guild)
+    timed_out_members = resolve_timed_out_members(ctx.guild, get_timeout_index(ctx.guild).active())
     if not timed_out_members:
         embed = discord.Embed(
             description=f"🔎 {ctx.author.mention}: **No members are currently timed out!**",
@@ -1632,6 +3988,7 @@ async def untimeoutall(ctx: Context):
         if isinstance(result, Exception):
             errors.append(f"Failed to untimeout {timed_out_members[i].mention}: {result}")
         else:
+            record_timeout(ctx.guild, timed_out_members[i].id, None)
             success_count += 1
     if errors:
         embed = discord.Embed(
@@ -1662,7 +4019,7 @@ async def drag(ctx: Context, user: str):
         return
 
     # Get the target user
-    target_user = get_user_from_arg(ctx.guild, user)
+    target_user = await resolve_member(ctx.guild, user)
     if not target_user:
         embed = discord.Embed(
             description=f"⚠️ {ctx.author.mention}: User not found. Please provide a valid user mention or ID.",
@@ -1718,7 +4075,7 @@ async def drag_private(ctx: Context, *users: str):
     # Get all target users (automatically include the command user)
     target_users = []
     for user_arg in users:
-        target_user = get_user_from_arg(ctx.guild, user_arg)
+        target_user = await resolve_member(ctx.guild, user_arg)
         if target_user and target_user != ctx.author:  # Don't add the command user twice
             target_users.append(target_user)
 
@@ -1744,6 +4101,9 @@ async def drag_private(ctx: Context, *users: str):
             position=position,
             reason=f"Private room created by {ctx.author}"
         )
+        # Register the room right away so it is deleted once everyone leaves,
+        # even if a move or the reply below fails
+        private_rooms.add(private_channel.id)
 
         # Move all users to the private channel (including the command user)
         moved_users = []
@@ -1755,6 +4115,8 @@ async def drag_private(ctx: Context, *users: str):
                     moved_users.append(user.mention)
                 except:
                     continue
+        if not moved_users:
+            queue_private_room_cleanup(private_channel)
 
         embed = discord.Embed(
             description=f"🎣 {ctx.author.mention}: Created private room and moved {', '.join(moved_users)} to it.",
@@ -1763,9 +4125,6 @@ async def drag_private(ctx: Context, *users: str):
         await ctx.send(embed=embed)
         await ctx.message.add_reaction("🎣")
 
-        # Start monitoring the channel for when everyone leaves
-        bot.loop.create_task(monitor_private_channel(private_channel))
-
     except discord.Forbidden:
         embed = discord.Embed(
             description=f"⚠️ {ctx.author.mention}: I don't have permission to create channels or move users.",
@@ -1780,22 +4139,67 @@ async def drag_private(ctx: Context, *users: str):
         await ctx.send(embed=embed)
 
 
-async def monitor_private_channel(channel):
-    """Monitor a private channel and delete it when everyone leaves."""
-    while True:
-        await asyncio.sleep(5)  # Check every 5 seconds
-        
-        # Check if channel still exists
-        try:
-            if not channel.members:  # If no one is in the channel
-                await channel.delete(reason="Private room auto-deleted - everyone left")
-                break
-        except discord.NotFound:
-            # Channel was already deleted
-            break
-        except Exception:
-            # Any other error, stop monitoring
-            break
+# Private rooms created by dragprivate, deleted when the last member leaves.
+# Driven by on_voice_state_update; set PRIVATE_ROOM_GRACE to wait that many
+# seconds before deleting so a quick reconnect keeps the room.
+PRIVATE_ROOM_GRACE = float(os.getenv("PRIVATE_ROOM_GRACE", "0"))
+private_rooms = PersistentSet(state_store, "private_rooms")  # {channel_id}
+private_room_cleanups = {}  # {channel_id: asyncio.Task}
+
+
+def queue_private_room_cleanup(channel):
+    if channel.id not in private_room_cleanups:
+        private_room_cleanups[channel.id] = asyncio.create_task(delete_private_room(channel))
+
+
+async def delete_private_room(channel):
+    """Delete an empty private room (after the grace period, if any)."""
+    try:
+        if PRIVATE_ROOM_GRACE > 0:
+            await asyncio.sleep(PRIVATE_ROOM_GRACE)
+        if channel.members:
+            return
+        await channel.delete(reason="Private room auto-deleted - everyone left")
+        private_rooms.discard(channel.id)
+    except discord.NotFound:
+        # Channel was already deleted
+        private_rooms.discard(channel.id)
+    except discord.HTTPException:
+        pass
+    finally:
+        if private_room_cleanups.get(channel.id) is asyncio.current_task():
+            del private_room_cleanups[channel.id]
+
+
+def adopt_private_rooms():
+    """Picks up rooms created before a restart, deleting any that emptied meanwhile."""
+    # An unavailable guild has no channels cached, so a room that is not found
+    # may still exist; it is adopted again once its guild is available
+    outage = any(guild.unavailable for guild in bot.guilds)
+    for channel_id in list(private_rooms):
+        channel = bot.get_channel(channel_id)
+        if channel is None:
+            if not outage:
+                private_rooms.discard(channel_id)
+        elif not channel.members:
+            queue_private_room_cleanup(channel)
+
+
+@bot.event
+async def on_voice_state_update(member, before, after):
+    if before.channel == after.channel:
+        return
+    # Someone (re)joined a room that was about to be deleted
+    if after.channel is not None and after.channel.id in private_room_cleanups:
+        private_room_cleanups.pop(after.channel.id).cancel()
+    if before.channel is not None and before.channel.id in private_rooms and not before.channel.members:
+        queue_private_room_cleanup(before.channel)
+
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    private_rooms.discard(channel.id)
+    bump_guild_counter(channel.guild, channel_counter_key(channel), -1)
 
 
 # ,vc reject <user> / ,vcreject <user>
@@ -1824,7 +4228,7 @@ async def vc_reject(ctx: Context, user: str):
         await ctx.send(embed=embed)
         return
     
-    member = get_user_from_arg(ctx.guild, user)
+    member = await resolve_member(ctx.guild, user)
     if not member:
         embed = discord.Embed(
             description=f"⚠️ {ctx.author.mention}: Could not find the specified user.",
@@ -1898,7 +4302,7 @@ async def vc_permit(ctx: Context, user: str):
         await ctx.send(embed=embed)
         return
     
-    member = get_user_from_arg(ctx.guild, user)
+    member = await resolve_member(ctx.guild, user)
     if not member:
         embed = discord.Embed(
             description=f"⚠️ {ctx.author.mention}: Could not find the specified user.",
@@ -1978,6 +4382,96 @@ async def vc_group(ctx: Context, subcommand: str, *, user: str = None):
         await ctx.send(embed=embed)
 
 
+# Role name index
+# Case-folded role name -> role IDs per guild, kept current from role events, so
+# finding a role by name is a dict lookup instead of a scan of guild.roles.
+# When nothing matches, suggest_roles ranks the closest names.
+ROLE_SUGGESTIONS = 3
+ROLE_SUGGESTION_CUTOFF = 0.6
+
+
+class RoleNameIndex:
+    def __init__(self, roles):
+        self._ids = {}  # case-folded name -> [role_id]
+        self._names = {}  # role_id -> case-folded name
+        for role in sorted(roles):
+            self.add(role)
+
+    def add(self, role):
+        """Indexes ``role`` under its current name (re-indexes a renamed role)."""
+        self.remove(role.id)
+        key = role.name.casefold()
+        self._ids.setdefault(key, []).append(role.id)
+        self._names[role.id] = key
+
+    def remove(self, role_id):
+        key = self._names.pop(role_id, None)
+        if key is None:
+            return
+        ids = self._ids[key]
+        ids.remove(role_id)
+        if not ids:
+            del self._ids[key]
+
+    def get(self, name):
+        """IDs of the roles called ``name``, ignoring case."""
+        return self._ids.get(name.casefold(), [])
+
+    def suggest(self, name, limit=ROLE_SUGGESTIONS):
+        """Indexed names closest to ``name``: names containing it first, then by
+        similarity."""
+        query = name.casefold()
+        containing = sorted((key for key in self._ids if query in key), key=lambda key: (len(key), key))
+        close = difflib.get_close_matches(query, self._ids, n=limit, cutoff=ROLE_SUGGESTION_CUTOFF)
+        return list(dict.fromkeys(containing + close))[:limit]
+
+
+role_name_indexes = {}  # {guild_id: RoleNameIndex}
+
+
+def get_role_index(guild):
+    """Returns the guild's role name index, building it on first use."""
+    index = role_name_indexes.get(guild.id)
+    if index is None:
+        index = role_name_indexes[guild.id] = RoleNameIndex(guild.roles)
+    return index
+
+
+def find_role(guild, name, *, exact=False):
+    """The role called ``name`` (ignoring case unless ``exact``), or None.
+
+    A role whose name matches exactly wins over one that only differs in case.
+    """
+    roles = [guild.get_role(role_id) for role_id in get_role_index(guild).get(name)]
+    roles = [role for role in roles if role is not None]
+    for role in roles:
+        if role.name == name:
+            return role
+    return None if exact or not roles else roles[0]
+
+
+def suggest_roles(guild, name):
+    """Names of the roles closest to ``name``, for "did you mean" hints."""
+    index = get_role_index(guild)
+    names = []
+    for key in index.suggest(name):
+        # Every spelling of the name, e.g. both "Mod" and "MOD"
+        for role_id in index.get(key):
+            role = guild.get_role(role_id)
+            if role is not None and role.name not in names:
+                names.append(role.name)
+    return names
+
+
+def role_not_found(author, name, guild):
+    """Error embed for an unknown role name, with suggestions if there are any."""
+    description = f"⚠️ {author.mention}: Role '{name}' not found."
+    suggestions = suggest_roles(guild, name)
+    if suggestions:
+        description += " Did you mean " + ", ".join(f"`{s}`" for s in suggestions) + "?"
+    return discord.Embed(description=description, color=0x4C4C54)
+
+
 @bot.command(aliases=["r"])
 @commands.has_permissions(manage_roles=True)
 async def role(ctx: Context, subcommand: str, *, args: str = None):
@@ -2020,13 +4514,11 @@ async def role(ctx: Context, subcommand: str, *, args: str = None):
             await ctx.send(embed=embed)
             return
         
-        role = discord.utils.get(ctx.guild.roles, name=args)
+        # Deleting is not undoable, so the name must match exactly; a name
+        # that only differs in case is offered as a suggestion instead
+        role = find_role(ctx.guild, args, exact=True)
         if not role:
-            embed = discord.Embed(
-                description=f"⚠️ {ctx.author.mention}: Role '{args}' not found.",
-                color=0x4C4C54,
-            )
-            await ctx.send(embed=embed)
+            await ctx.send(embed=role_not_found(ctx.author, args, ctx.guild))
             return
         
         try:
@@ -2064,7 +4556,8 @@ async def role(ctx: Context, subcommand: str, *, args: str = None):
     
 
 # Store original overwrites for hardhide/unhardhide
-hardhide_overwrites = {}
+# Structure: {channel_id: {"role_<id>"/"member_<id>": PermissionOverwrite}}
+hardhide_overwrites = PersistentDict(state_store, "hardhide_overwrites", depth=2)
 # ,hardhide / ,hh
 @bot.command(aliases=["hh"])
 @commands.has_permissions(manage_channels=True)
@@ -2196,19 +4689,30 @@ async def unbanall(ctx: Context):
 
 
 @bot.command()
-async def prefix(ctx: Context, new_prefix: str = None):
-    """Shows or changes the bot's prefix for this server."""
-    current_prefix = custom_prefixes.get(ctx.guild.id, ",")
-    
-    if new_prefix is None:
-        # Show current prefix (like bleed bot)
-        embed = discord.Embed(
-            description=f"{ctx.author.mention}: Server Prefix: `{current_prefix}`",
-            color=0x4C4C54,
-        )
+async def prefix(ctx: Context, subcommand: str = None, *, value: str = None):
+    """Shows or changes the bot's prefixes for this server.
+
+    ,prefix                      show the configuration
+    ,prefix <prefix>             replace all prefixes (also ,prefix set <prefix>)
+    ,prefix add/remove <prefix>  add or remove one prefix
+    ,prefix mention on/off       also respond to @bot
+    ,prefix case on/off          match prefixes case-insensitively
+    ,prefix reset                back to the default
+    """
+    config = prefix_config(ctx.guild.id)
+
+    if subcommand is None:
+        # Show current prefixes (like bleed bot)
+        prefixes = ", ".join(f"`{p}`" for p in config["prefixes"]) or "None"
+        lines = [f"{ctx.author.mention}: Server Prefix{'es' if len(config['prefixes']) != 1 else ''}: {prefixes}"]
+        if config["mention"]:
+            lines.append(f"Mention: {bot.user.mention}")
+        if config["ignore_case"]:
+            lines.append("Case-insensitive")
+        embed = discord.Embed(description="\n".join(lines), color=0x4C4C54)
         await ctx.send(embed=embed)
         return
-    
+
     # Change prefix (requires admin permission)
     if not ctx.author.guild_permissions.administrator:
         embed = discord.Embed(
@@ -2217,58 +4721,175 @@ async def prefix(ctx: Context, new_prefix: str = None):
         )
         await ctx.send(embed=embed)
         return
-    
-    if len(new_prefix) > 5:
-        embed = discord.Embed(
-            description=f"⚠️ {ctx.author.mention}: Prefix must be 5 characters or less.",
-            color=0x4C4C54,
-        )
+
+    action = subcommand.lower()
+    if action not in ("set", "add", "remove", "mention", "case", "reset"):
+        # ,prefix <new_prefix>
+        action, value = "set", subcommand if value is None else f"{subcommand} {value}"
+
+    async def warn(text):
+        embed = discord.Embed(description=f"⚠️ {ctx.author.mention}: {text}", color=0x4C4C54)
         await ctx.send(embed=embed)
-        return
-    
-    custom_prefixes[ctx.guild.id] = new_prefix
+
+    config = {
+        "prefixes": list(config["prefixes"]),
+        "mention": config["mention"],
+        "ignore_case": config["ignore_case"],
+    }
+    if action == "reset":
+        custom_prefixes.pop(ctx.guild.id, None)
+        prefix_matchers.pop(ctx.guild.id, None)
+        message = f"Bot prefix reset to `{DEFAULT_PREFIX}`"
+    elif action in ("mention", "case"):
+        if value is None or value.lower() not in ("on", "off"):
+            await warn(f"Usage: `{ctx.prefix}prefix {action} on/off`")
+            return
+        enabled = value.lower() == "on"
+        if action == "mention":
+            if not enabled and not config["prefixes"]:
+                await warn("The bot needs at least one prefix or the mention prefix.")
+                return
+            config["mention"] = enabled
+            message = f"Mention prefix {'enabled' if enabled else 'disabled'}"
+        else:
+            config["ignore_case"] = enabled
+            message = f"Prefixes are now case-{'insensitive' if enabled else 'sensitive'}"
+        set_prefix_config(ctx.guild.id, config)
+    else:
+        if not value:
+            await warn(f"Usage: `{ctx.prefix}prefix {action} <prefix>`")
+            return
+        if len(value) > 5:
+            await warn("Prefix must be 5 characters or less.")
+            return
+        if action == "set":
+            config["prefixes"] = [value]
+            message = f"Bot prefix changed to `{value}`"
+        elif action == "add":
+            if value in config["prefixes"]:
+                await warn(f"`{value}` is already a prefix.")
+                return
+            if len(config["prefixes"]) >= PREFIX_LIMIT:
+                await warn(f"A server can have at most {PREFIX_LIMIT} prefixes.")
+                return
+            config["prefixes"].append(value)
+            message = f"Added prefix `{value}`"
+        else:
+            if value not in config["prefixes"]:
+                await warn(f"`{value}` is not a prefix.")
+                return
+            if len(config["prefixes"]) == 1 and not config["mention"]:
+                await warn("The bot needs at least one prefix or the mention prefix.")
+                return
+            config["prefixes"].remove(value)
+            message = f"Removed prefix `{value}`"
+        set_prefix_config(ctx.guild.id, config)
+
     embed = discord.Embed(
-        description=f"✅ {ctx.author.mention}: Bot prefix changed to `{new_prefix}`",
+        description=f"✅ {ctx.author.mention}: {message}",
         color=0x4C4C54,
     )
     await ctx.send(embed=embed)
 
 
 # Mute role management
-async def get_or_create_mute_role(guild, role_type):
+# Each mute role denies a fixed set of permissions. Overwrites are written once
+# per category; channels synced with their category follow it, so only
+# categories and channels with their own overwrites are edited directly, through
+# the bulk permission engine. Synced children that still lack the deny after
+# MUTE_SYNC_GRACE are edited too. New channels get the overwrites of existing
+# mute roles, and ,repairmutes re-applies them after drift.
+MUTE_ROLE_DENIES = {
+    "muted": ("send_messages", "send_messages_in_threads", "create_public_threads", "create_private_threads"),
+    "imuted": ("attach_files", "embed_links"),
+    "rmuted": ("add_reactions", "use_external_emojis", "use_external_stickers"),
+}
+MUTE_SYNC_GRACE = 2.0  # seconds for synced channels to follow their category
+
+
+async def provision_mute_role(guild, role, role_type, *, progress_channel=None):
+    """Writes ``role``'s deny overwrites; returns the channels that failed."""
+    transform = deny_permissions(MUTE_ROLE_DENIES[role_type])
+    synced = [c for c in guild.channels if c.category is not None and c.permissions_synced]
+    synced_ids = {c.id for c in synced}
+    direct = [c for c in guild.channels if c.id not in synced_ids]
+    failed = await bulk_edit_overwrites(
+        guild, direct, transform, roles=[role], label=f"Setting up {role_type}",
+        reason=f"Set up {role_type} role", progress_channel=progress_channel,
+    )
+    if any(plan_channel_overwrites(c, [role], transform) is not None for c in synced):
+        await asyncio.sleep(MUTE_SYNC_GRACE)
+        failed += await bulk_edit_overwrites(
+            guild, synced, transform, roles=[role], label=f"Syncing {role_type}",
+            reason=f"Set up {role_type} role", progress_channel=progress_channel,
+        )
+    return failed
+
+
+async def get_or_create_mute_role(guild, role_type, *, progress_channel=None):
     """Get or create mute roles with specific permissions."""
     role_name = role_type
-    role = discord.utils.get(guild.roles, name=role_name)
+    role = find_role(guild, role_name, exact=True)
     
     if not role:
         # Create the role
         role = await guild.create_role(name=role_name, reason=f"Created {role_type} role")
-        
-        # Set permissions based on role type
-        if role_type == "muted":
-            # Remove: Send Messages, Send Messages in Threads, Create Public Threads, Create Private Threads
-            for channel in guild.channels:
-                if isinstance(channel, (discord.TextChannel, discord.Thread)):
-                    await channel.set_permissions(role, send_messages=False, send_messages_in_threads=False, create_public_threads=False, create_private_threads=False)
-        elif role_type == "imuted":
-            # Remove: Attach Files, Embed Links
-            for channel in guild.channels:
-                if isinstance(channel, discord.TextChannel):
-                    await channel.set_permissions(role, attach_files=False, embed_links=False)
-        elif role_type == "rmuted":
-            # Remove: Add Reactions, Use External Emoji, Use External Stickers
-            for channel in guild.channels:
-                if isinstance(channel, discord.TextChannel):
-                    await channel.set_permissions(role, add_reactions=False, use_external_emojis=False, use_external_stickers=False)
+        await provision_mute_role(guild, role, role_type, progress_channel=progress_channel)
     
     return role
 
 
+async def apply_mute_overwrites(channel):
+    """Gives a new channel the overwrites of every existing mute role."""
+    overwrites = channel.overwrites
+    changed = False
+    for role_type, perms in MUTE_ROLE_DENIES.items():
+        role = find_role(channel.guild, role_type, exact=True)
+        if role is None:
+            continue
+        overwrite = overwrites.get(role) or discord.PermissionOverwrite()
+        if deny_permissions(perms)(overwrite):
+            overwrites[role] = overwrite
+            changed = True
+    if changed:
+        try:
+            await channel.edit(overwrites=overwrites, reason="Mute role overwrites")
+        except discord.HTTPException:
+            pass
+
+
+@bot.command(aliases=["fixmutes", "muterepair"])
+@commands.has_permissions(manage_roles=True)
+async def repairmutes(ctx: Context):
+    """Re-applies the mute roles' overwrites wherever they have drifted."""
+    roles = []
+    for role_type in MUTE_ROLE_DENIES:
+        role = find_role(ctx.guild, role_type, exact=True)
+        if role is not None:
+            roles.append((role_type, role))
+    if not roles:
+        embed = discord.Embed(
+            description=f"⚠️ {ctx.author.mention}: There are no mute roles to repair.",
+            color=0x4C4C54,
+        )
+        await ctx.send(embed=embed)
+        return
+
+    failed = set()
+    for role_type, role in roles:
+        failed.update(await provision_mute_role(ctx.guild, role, role_type, progress_channel=ctx.channel))
+    description = f"✅ {ctx.author.mention}: Checked {', '.join(f'`{t}`' for t, _ in roles)} across {len(ctx.guild.channels)} channels"
+    if failed:
+        description += f"; {len(failed)} could not be edited"
+    embed = discord.Embed(description=description, color=0x4C4C54)
+    await ctx.send(embed=embed)
+
+
 @bot.command(aliases=["m"])
 @commands.has_permissions(manage_roles=True)
 async def mute(ctx: Context, user: str, *, reason: str = None):
     """Applies muted role to a user."""
-    target_user = get_user_from_arg(ctx.guild, user)
+    target_user = await resolve_member(ctx.guild, user)
     if not target_user:
         embed = discord.Embed(
             description=f"⚠️ {ctx.author.mention}: User not found. Please provide a valid user mention or ID.",
@@ -2278,7 +4899,7 @@ async def mute(ctx: Context, user: str, *, reason: str = None):
         return
     
     try:
-        mute_role = await get_or_create_mute_role(ctx.guild, "muted")
+        mute_role = await get_or_create_mute_role(ctx.guild, "muted", progress_channel=ctx.channel)
         await target_user.add_roles(mute_role, reason=f"Muted by {ctx.author}: {reason or 'No reason'}")
         
         # Send DM to muted user
@@ -2308,7 +4929,7 @@ async def mute(ctx: Context, user: str, *, reason: str = None):
 @commands.has_permissions(manage_roles=True)
 async def imute(ctx: Context, user: str, *, reason: str = None):
     """Applies imuted role to a user."""
-    target_user = get_user_from_arg(ctx.guild, user)
+    target_user = await resolve_member(ctx.guild, user)
     if not target_user:
         embed = discord.Embed(
             description=f"⚠️ {ctx.author.mention}: User not found. Please provide a valid user mention or ID.",
@@ -2318,7 +4939,7 @@ async def imute(ctx: Context, user: str, *, reason: str = None):
         return
     
     try:
-        mute_role = await get_or_create_mute_role(ctx.guild, "imuted")
+        mute_role = await get_or_create_mute_role(ctx.guild, "imuted", progress_channel=ctx.channel)
         await target_user.add_roles(mute_role, reason=f"Image muted by {ctx.author}: {reason or 'No reason'}")
         
         # Send DM to muted user
@@ -2348,7 +4969,7 @@ async def imute(ctx: Context, user: str, *, reason: str = None):
 @commands.has_permissions(manage_roles=True)
 async def rmute(ctx: Context, user: str, *, reason: str = None):
     """Applies rmuted role to a user."""
-    target_user = get_user_from_arg(ctx.guild, user)
+    target_user = await resolve_member(ctx.guild, user)
     if not target_user:
         embed = discord.Embed(
             description=f"⚠️ {ctx.author.mention}: User not found. Please provide a valid user mention or ID.",
@@ -2358,7 +4979,7 @@ async def rmute(ctx: Context, user: str, *, reason: str = None):
         return
     
     try:
-        mute_role = await get_or_create_mute_role(ctx.guild, "rmuted")
+        mute_role = await get_or_create_mute_role(ctx.guild, "rmuted", progress_channel=ctx.channel)
         await target_user.add_roles(mute_role, reason=f"Reaction muted by {ctx.author}: {reason or 'No reason'}")
         
         # Send DM to muted user
@@ -2459,13 +5080,9 @@ async def stickyreactionrole(ctx: Context, subcommand: str, *, args: str = None)
             return
         
         # Find the role by name (case-insensitive)
-        role = discord.utils.find(lambda r: r.name.lower() == role_name.lower(), ctx.guild.roles)
+        role = find_role(ctx.guild, role_name)
         if not role:
-            embed = discord.Embed(
-                description=f"⚠️ {ctx.author.mention}: Role '{role_name}' not found.",
-                color=0x4C4C54,
-            )
-            await ctx.send(embed=embed)
+            await ctx.send(embed=role_not_found(ctx.author, role_name, ctx.guild))
             return
         
         try:
@@ -2577,7 +5194,7 @@ async def stickyreactionrole(ctx: Context, subcommand: str, *, args: str = None)
 @commands.has_permissions(manage_roles=True)
 async def unmute(ctx: Context, user: str, *, reason: str = None):
     """Removes all mute roles from a user."""
-    target_user = get_user_from_arg(ctx.guild, user)
+    target_user = await resolve_member(ctx.guild, user)
     if not target_user:
         embed = discord.Embed(
             description=f"⚠️ {ctx.author.mention}: User not found. Please provide a valid user mention or ID.",
@@ -2591,7 +5208,7 @@ async def unmute(ctx: Context, user: str, *, reason: str = None):
         removed_roles = []
         
         for role_name in mute_roles:
-            role = discord.utils.get(ctx.guild.roles, name=role_name)
+            role = find_role(ctx.guild, role_name, exact=True)
             if role and role in target_user.roles:
                 await target_user.remove_roles(role, reason=f"Unmuted by {ctx.author}: {reason or 'No reason'}")
                 removed_roles.append(role_name)
@@ -2645,7 +5262,7 @@ async def unhardhide(ctx: Context):
 
         elif key.startswith("member_"):
             member_id = int(key.split("_")[1])
-            member = ctx.guild.get_member(member_id)
+            member = await fetch_member_cached(ctx.guild, member_id)
             if member:
                 await channel.set_permissions(member, overwrite=old_overwrite)
                 restored_count += 1
@@ -2657,8 +5274,42 @@ async def unhardhide(ctx: Context):
 
 
 # AFK System
-afk_users = {}  # {user_id: {"reason": str, "timestamp": datetime, "original_nickname": str, "scope": str}}
-global_afk_users = {}  # {user_id: {"reason": str, "timestamp": datetime, "original_nickname": str}}
+class AFKRecord(StateRecord):
+    __slots__ = ("reason", "_timestamp", "original_nickname", "_scope")
+    _fields = ("reason", "timestamp", "original_nickname", "scope")
+    timestamp = _timestamp_field("_timestamp")
+
+    @property
+    def scope(self):
+        return self._scope
+
+    @scope.setter
+    def scope(self, value):
+        # "server" or None; one shared string instead of one per entry
+        self._scope = None if value is None else sys.intern(value)
+
+
+afk_users = PersistentDict(state_store, "afk_users", record=AFKRecord)  # {user_id: AFKRecord(reason, timestamp, original_nickname, scope="server")}
+global_afk_users = PersistentDict(state_store, "global_afk_users", record=AFKRecord)  # {user_id: AFKRecord(reason, timestamp, original_nickname)}
+
+
+def share_afk(user_id):
+    """Mirrors ``user_id``'s AFK entries to the other clusters."""
+    if cluster is None:
+        return
+    cluster.broadcast("afk", user_id=user_id, entries={
+        name: _encode_state_value(store[user_id]) if user_id in store else None
+        for name, store in (("global", global_afk_users), ("server", afk_users))
+    })
+
+
+@cluster_handler("afk")
+def receive_afk(user_id, entries):
+    for name, store in (("global", global_afk_users), ("server", afk_users)):
+        if entries[name] is None:
+            store.pop(user_id, None)
+        else:
+            store[user_id] = _state_decoder.decode(entries[name])
 
 
 class AFKChoiceView(discord.ui.View):
@@ -2707,6 +5358,7 @@ class AFKChoiceView(discord.ui.View):
             "timestamp": datetime.now(timezone.utc),
             "original_nickname": self.original_nickname
         }
+        share_afk(user_id)
         
         # Send AFK embed message
         embed = discord.Embed(
@@ -2743,6 +5395,7 @@ class AFKChoiceView(discord.ui.View):
             "original_nickname": self.original_nickname,
             "scope": "server"
         }
+        share_afk(user_id)
         
         # Send AFK embed message
         embed = discord.Embed(
@@ -2783,31 +5436,267 @@ async def afk(ctx: Context, *, reason: str = "AFK"):
         await view.set_global_afk()
 
 
-async def reverse_then_forward_counter(message, total_seconds):
-    """Reverse counter (countdown) then forward counter."""
-    # First: Reverse counting (countdown)
-    for i in range(total_seconds, 0, -1):
-        try:
-            embed = discord.Embed(
-                description=f"👋 Welcome back! You were gone for **{i} seconds**",
-                color=0x4C4C54,
-            )
-            await message.edit(embed=embed)
-        except Exception as e:
-            break
-        await asyncio.sleep(1)
-    
-    # Then: Forward counting (countup)
-    for i in range(1, 61):  # Count up to 60 seconds
+# Live counters
+# Messages that show a ticking value. Durations that Discord can render on the
+# client (<t:unix:R>) are sent once and never edited; anything else goes through
+# start_live_counter, which spreads at most LIVE_COUNTER_EDIT_BUDGET edits over
+# the counter's lifetime, runs at most LIVE_COUNTER_MAX counters at once and
+# stops as soon as the message is deleted.
+LIVE_COUNTER_EDIT_BUDGET = 6
+LIVE_COUNTER_MIN_INTERVAL = 5.0  # seconds between edits of one message
+LIVE_COUNTER_MAX = 25
+live_counters = {}  # {message_id: asyncio.Task}
+
+
+def start_live_counter(message, render, duration):
+    """Re-renders ``message`` with ``render(elapsed_seconds)`` for ``duration``
+    seconds. Returns the task, or None when too many counters are running (the
+    message then simply keeps its initial embed)."""
+    stop_live_counter(message.id)
+    if len(live_counters) >= LIVE_COUNTER_MAX:
+        return None
+    task = asyncio.create_task(run_live_counter(message, render, duration))
+    live_counters[message.id] = task
+
+    def forget(_):
+        if live_counters.get(message.id) is task:
+            del live_counters[message.id]
+
+    task.add_done_callback(forget)
+    return task
+
+
+def stop_live_counter(message_id):
+    task = live_counters.pop(message_id, None)
+    if task is not None:
+        task.cancel()
+
+
+async def run_live_counter(message, render, duration):
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    interval = max(LIVE_COUNTER_MIN_INTERVAL, duration / LIVE_COUNTER_EDIT_BUDGET)
+    for edit in range(1, LIVE_COUNTER_EDIT_BUDGET + 1):
+        await asyncio.sleep(max(0, started + edit * interval - loop.time()))
+        elapsed = loop.time() - started
+        if elapsed > duration + 1:
+            return
         try:
+            await message.edit(embed=render(int(elapsed)))
+        except discord.HTTPException:
+            return
+
+
+@bot.event
+async def on_raw_message_delete(payload):
+    stop_live_counter(payload.message_id)
+
+
+@bot.event
+async def on_raw_bulk_message_delete(payload):
+    for message_id in payload.message_ids:
+        stop_live_counter(message_id)
+
+
+# Anti-spam
+# Checked for every guild message while enabled:
+#   * flood: a token bucket per user across all channels (`rate` messages per
+#     `per` seconds),
+#   * repeats: near-duplicate content, found by comparing bottom-k sketches of
+#     rolling hashes over character shingles with the user's recent messages,
+#   * mass mentions: more than `mentions` distinct users/roles in one message.
+# Offenders are timed out through apply_timeout, like ,timeout. Per-user state
+# lives in an LRU of at most SPAM_TRACKED_USERS entries, so memory stays flat
+# however many users talk.
+ANTISPAM_DEFAULTS = {
+    "enabled": False,
+    "rate": 6,
+    "per": 5,
+    "duplicates": 4,  # near-identical messages within duplicate_window
+    "duplicate_window": 30,
+    "mentions": 8,
+    "timeout": 300,
+}
+SPAM_TRACKED_USERS = 10000
+SPAM_RECENT_MESSAGES = 6  # sketches kept per user
+SPAM_SHINGLE = 5
+SPAM_SKETCH_SIZE = 8
+SPAM_SIMILARITY = 0.7
+SPAM_HASH_BASE = 257
+SPAM_HASH_MOD = (1 << 61) - 1
+antispam_settings = PersistentDict(state_store, "antispam_settings")  # {guild_id: settings}
+spam_trackers = OrderedDict()  # {(guild_id, user_id): SpamTracker}, least recently active first
+
+
+class SpamTracker:
+    __slots__ = ("tokens", "updated", "recent", "muted_until")
+
+    def __init__(self, capacity, now):
+        self.tokens = capacity
+        self.updated = now
+        self.recent = []  # (time, sketch), oldest first
+        self.muted_until = 0.0
+
+
+def content_sketch(content):
+    """Bottom-k sketch of the rolling hashes of ``content``'s character shingles."""
+    text = " ".join(content.lower().split())
+    if len(text) <= SPAM_SHINGLE:
+        return array.array("Q", (hash(text) % SPAM_HASH_MOD,) if text else ())
+    top = pow(SPAM_HASH_BASE, SPAM_SHINGLE - 1, SPAM_HASH_MOD)
+    value = 0
+    for ch in text[:SPAM_SHINGLE]:
+        value = (value * SPAM_HASH_BASE + ord(ch)) % SPAM_HASH_MOD
+    hashes = {value}
+    for i in range(SPAM_SHINGLE, len(text)):
+        value = ((value - ord(text[i - SPAM_SHINGLE]) * top) * SPAM_HASH_BASE + ord(text[i])) % SPAM_HASH_MOD
+        hashes.add(value)
+    return array.array("Q", heapq.nsmallest(SPAM_SKETCH_SIZE, hashes))
+
+
+def sketch_similarity(a, b):
+    # Estimates the Jaccard similarity of the two shingle sets
+    a = set(a)
+    return len(a.intersection(b)) / len(a.union(b))
+
+
+def spam_offense(config, tracker, message, now):
+    """Returns the reason ``message`` breaks the anti-spam rules, or None."""
+    mentions = len(set(message.raw_mentions)) + len(set(message.raw_role_mentions))
+    if message.mention_everyone:
+        mentions += 1
+    if mentions > config["mentions"]:
+        return f"mentioning {mentions} users and roles at once"
+
+    capacity = config["rate"]
+    tracker.tokens = min(capacity, tracker.tokens + (now - tracker.updated) * capacity / config["per"])
+    tracker.updated = now
+    if tracker.tokens < 1:
+        return f"sending more than {config['rate']} messages in {config['per']}s"
+    tracker.tokens -= 1
+
+    sketch = content_sketch(message.content)
+    if sketch:
+        window = config["duplicate_window"]
+        repeats = 1 + sum(
+            1 for sent, previous in tracker.recent
+            if now - sent <= window and sketch_similarity(sketch, previous) >= SPAM_SIMILARITY
+        )
+        tracker.recent.append((now, sketch))
+        if len(tracker.recent) > SPAM_RECENT_MESSAGES:
+            del tracker.recent[0]
+        if repeats >= config["duplicates"]:
+            return f"repeating the same message {repeats} times"
+    return None
+
+
+async def check_spam(message):
+    """Times the author out if ``message`` is spam; returns True if it was."""
+    config = antispam_settings.get(message.guild.id)
+    if config is None or not config["enabled"]:
+        return False
+    author = message.author
+    if not isinstance(author, discord.Member) or author.guild_permissions.manage_messages:
+        return False
+
+    now = time.monotonic()
+    key = (message.guild.id, author.id)
+    tracker = spam_trackers.get(key)
+    if tracker is None:
+        tracker = spam_trackers[key] = SpamTracker(config["rate"], now)
+        if len(spam_trackers) > SPAM_TRACKED_USERS:
+            spam_trackers.popitem(last=False)
+    else:
+        spam_trackers.move_to_end(key)
+    if tracker.muted_until > now:
+        return True
+
+    reason = spam_offense(config, tracker, message, now)
+    if reason is None:
+        return False
+    tracker.muted_until = now + config["timeout"]
+    tracker.recent.clear()
+    try:
+        formatted_duration = await apply_timeout(
+            author, config["timeout"], moderator=message.guild.me, reason=f"Anti-spam: {reason}"
+        )
+    except discord.HTTPException:
+        tracker.muted_until = 0.0
+        return False
+    embed = discord.Embed(
+        description=f"🔇 {author.mention} has been timed out for **{formatted_duration}** ({reason}).",
+        color=0x4C4C54,
+    )
+    try:
+        await message.channel.send(embed=embed, delete_after=10)
+    except discord.HTTPException:
+        pass
+    return True
+
+
+@bot.command(aliases=["spam"])
+@commands.has_permissions(manage_guild=True)
+async def antispam(ctx: Context, subcommand: str = None, *args):
+    """Configures flood, repeat and mass-mention protection.
+
+    ,antispam                              show settings
+    ,antispam on/off
+    ,antispam rate <messages> <seconds>    flood limit across channels
+    ,antispam duplicates <count> <seconds> near-identical messages allowed
+    ,antispam mentions <count>             mentions allowed per message
+    ,antispam timeout <duration>           e.g. 5m
+    """
+    config = {**ANTISPAM_DEFAULTS, **antispam_settings.get(ctx.guild.id, {})}
+
+    if subcommand is None:
+        embed = discord.Embed(
+            title="Anti-spam",
+            description=(
+                f"**Enabled:** {'yes' if config['enabled'] else 'no'}\n"
+                f"**Flood:** more than {config['rate']} messages in {config['per']}s\n"
+                f"**Repeats:** {config['duplicates']} near-identical messages in {config['duplicate_window']}s\n"
+                f"**Mentions:** more than {config['mentions']} per message\n"
+                f"**Timeout:** {format_duration(config['timeout'])}\n"
+                f"Members with Manage Messages are exempt."
+            ),
+            color=0x4C4C54,
+        )
+        await ctx.send(embed=embed)
+        return
+
+    action = subcommand.lower()
+    numbers = [int(a) for a in args if a.isdigit()]
+    if action in ("on", "off"):
+        config["enabled"] = action == "on"
+    elif action == "rate" and len(numbers) == 2 and all(numbers):
+        config["rate"], config["per"] = numbers
+    elif action == "duplicates" and len(numbers) == 2 and numbers[0] >= 2 and numbers[1]:
+        config["duplicates"], config["duplicate_window"] = numbers
+    elif action == "mentions" and len(numbers) == 1 and numbers[0]:
+        config["mentions"] = numbers[0]
+    elif action == "timeout" and args:
+        seconds = parse_duration(args[0])
+        if seconds is None or not 1 <= seconds <= 2419200:
             embed = discord.Embed(
-                description=f"👋 Welcome back! You were gone for **{i} seconds**",
+                description=f"⚠️ {ctx.author.mention}: The timeout must be between 1 second and 28 days.",
                 color=0x4C4C54,
             )
-            await message.edit(embed=embed)
-        except Exception as e:
-            break
-        await asyncio.sleep(1)
+            await ctx.send(embed=embed)
+            return
+        config["timeout"] = seconds
+    else:
+        embed = discord.Embed(
+            description=f"⚠️ {ctx.author.mention}: Usage: `,antispam on/off`, `rate <messages> <seconds>`, `duplicates <count> <seconds>`, `mentions <count>` or `timeout <duration>`",
+            color=0x4C4C54,
+        )
+        await ctx.send(embed=embed)
+        return
+
+    # The full settings are stored so check_spam reads them without merging
+    antispam_settings[ctx.guild.id] = config
+    for key in [k for k in spam_trackers if k[0] == ctx.guild.id]:
+        del spam_trackers[key]
+    await ctx.message.add_reaction("✅")
 
 
 @bot.event
@@ -2817,13 +5706,29 @@ async def on_message(message):
     if message.author.bot:
         return
 
-    # Process commands first
-    await bot.process_commands(message)
-    
-    # Check if this is the AFK command itself - if so, don't process AFK return
-    if message.content.startswith(('afk', ',afk', '.afk')):
+    if LOW_MEMORY and isinstance(message.author, discord.Member):
+        note_active_member(message.author)
+
+    # Spam is timed out and goes no further
+    if message.guild is not None and antispam_settings and await check_spam(message):
         return
-    
+
+    # Process commands first; most messages are chatter, so only build a
+    # command context when the message starts with the guild's prefix
+    content = message.content
+    prefix = match_prefix(message)
+    if prefix is not None:
+        await bot.process_commands(message)
+        # The AFK command itself must not count as returning from AFK
+        if content.startswith("afk", len(prefix)):
+            return
+    if content.startswith(("afk", ",afk", ".afk")):
+        return
+
+    # Nothing to do unless someone is AFK
+    if not global_afk_users and not afk_users:
+        return
+
     # Check if message author was AFK (both global and server)
     user_id = message.author.id
     afk_info = None
@@ -2839,6 +5744,7 @@ async def on_message(message):
         is_global = False
     
     if afk_info:
+        share_afk(user_id)
         # Try to restore original nickname
         try:
             if afk_info["original_nickname"] != message.author.display_name:
@@ -2849,38 +5755,44 @@ async def on_message(message):
         # Calculate AFK duration
         duration = datetime.now(timezone.utc) - afk_info["timestamp"]
         total_seconds = int(duration.total_seconds())
-        
-        # Send initial welcome back message with reverse counter
+        since = int(afk_info["timestamp"].timestamp())
+
+        # The AFK period is rendered by the client, only "back for" is edited
         scope_text = "**Global AFK**" if is_global else "**Server AFK**"
-        embed = discord.Embed(
-            description=f"👋 {message.author.mention}: Welcome back! You were gone for **{total_seconds} seconds** ({scope_text})",
-            color=0x4C4C54,
-        )
-        welcome_msg = await message.channel.send(embed=embed)
-        
-        # Start reverse counter then forward counter
-        bot.loop.create_task(reverse_then_forward_counter(welcome_msg, total_seconds))
-    
-    # Check if someone mentioned an AFK user (both global and server)
-    for mention in message.mentions:
-        mention_id = mention.id
-        
+        mention = message.author.mention
+
+        def welcome_embed(back_for):
+            description = (
+                f"👋 {mention}: Welcome back! You were gone for **{format_duration(total_seconds)}**"
+                f" (since <t:{since}:R>, {scope_text})"
+            )
+            if back_for:
+                description += f"\nBack for **{format_duration(back_for)}**"
+            return discord.Embed(description=description, color=0x4C4C54)
+
+        welcome_msg = await message.channel.send(embed=welcome_embed(0))
+        start_live_counter(welcome_msg, welcome_embed, 60)
+
+    # Check if someone mentioned an AFK user (both global and server). The raw
+    # IDs are parsed from the content; Member objects are only resolved for hits
+    for mention_id in dict.fromkeys(message.raw_mentions):
         # Check global AFK first
         if mention_id in global_afk_users:
             afk_info = global_afk_users[mention_id]
-            embed = discord.Embed(
-                description=f"💤 {mention.display_name} is **Global AFK**: {afk_info['reason']}",
-                color=0x4C4C54,
-            )
-            await message.channel.send(embed=embed)
+            scope_text = "Global AFK"
         # Then check server AFK
         elif mention_id in afk_users:
             afk_info = afk_users[mention_id]
-            embed = discord.Embed(
-                description=f"💤 {mention.display_name} is **Server AFK**: {afk_info['reason']}",
-                color=0x4C4C54,
-            )
-            await message.channel.send(embed=embed)
+            scope_text = "Server AFK"
+        else:
+            continue
+        mention = discord.utils.get(message.mentions, id=mention_id)
+        name = mention.display_name if mention else f"<@{mention_id}>"
+        embed = discord.Embed(
+            description=f"💤 {name} is **{scope_text}**: {afk_info['reason']}",
+            color=0x4C4C54,
+        )
+        await message.channel.send(embed=embed)
 
 
 @bot.event
@@ -2895,14 +5807,107 @@ async def on_message_edit(before, after):
         return
     
     # Process the edited message as a command
-    await bot.process_commands(after)
+    if match_prefix(after) is not None:
+        await bot.process_commands(after)
 
 
 
 
 
 # Giveaways System
-active_giveaways = {}  # {message_id: {"channel_id": int, "guild_id": int, "prize": str, "end_time": datetime, "host_id": int}}
+class GiveawayRecord(StateRecord):
+    __slots__ = ("channel_id", "guild_id", "prize", "_end_time", "host_id", "message_id")
+    _fields = ("channel_id", "guild_id", "prize", "end_time", "host_id", "message_id")
+    end_time = _timestamp_field("_end_time")
+
+
+active_giveaways = PersistentDict(state_store, "active_giveaways", record=GiveawayRecord)  # {message_id: GiveawayRecord(channel_id, guild_id, prize, end_time, host_id, message_id)}
+
+# Entrants are tracked from raw reaction events instead of re-reading the whole
+# 🎉 reaction on every change. A giveaway's set is seeded from the reaction once
+# (e.g. after a restart), and entry count edits are coalesced to at most one per
+# GIVEAWAY_EDIT_INTERVAL seconds.
+GIVEAWAY_EDIT_INTERVAL = 5.0
+giveaway_entrants = {}  # {message_id: {user_id}}
+giveaway_embeds = {}  # {message_id: discord.Embed} last embed sent, reused for edits
+giveaway_seed_tasks = {}  # {message_id: asyncio.Task}
+giveaway_edit_tasks = {}  # {message_id: asyncio.Task}
+ending_giveaways = set()  # message IDs whose result is being posted
+GIVEAWAY_RETRY_SECONDS = 60
+GIVEAWAY_MAX_RETRIES = 10
+
+
+async def get_giveaway_entrants(message_id, channel):
+    """Returns the entrant set of a giveaway, seeding it from the 🎉 reaction once."""
+    entrants = giveaway_entrants.get(message_id)
+    if entrants is not None:
+        return entrants
+    task = giveaway_seed_tasks.get(message_id)
+    if task is None:
+        task = asyncio.create_task(seed_giveaway_entrants(message_id, channel))
+        giveaway_seed_tasks[message_id] = task
+    return await task
+
+
+async def seed_giveaway_entrants(message_id, channel):
+    try:
+        message = await channel.fetch_message(message_id)
+        entrants = set()
+        reaction = discord.utils.get(message.reactions, emoji="🎉")
+        if reaction:
+            async for user in reaction.users(limit=None):
+                if not user.bot:
+                    entrants.add(user.id)
+        if message.embeds:
+            giveaway_embeds.setdefault(message_id, message.embeds[0])
+        giveaway_entrants[message_id] = entrants
+        return entrants
+    finally:
+        giveaway_seed_tasks.pop(message_id, None)
+
+
+def queue_giveaway_edit(message_id):
+    if message_id not in giveaway_edit_tasks:
+        giveaway_edit_tasks[message_id] = asyncio.create_task(update_giveaway_entries(message_id))
+
+
+async def update_giveaway_entries(message_id):
+    """Writes the current entry count into the giveaway embed after a short delay."""
+    await asyncio.sleep(GIVEAWAY_EDIT_INTERVAL)
+    # Changes from here on queue the next edit
+    giveaway_edit_tasks.pop(message_id, None)
+    giveaway_info = active_giveaways.get(message_id)
+    entrants = giveaway_entrants.get(message_id)
+    if giveaway_info is None or entrants is None or message_id in ending_giveaways:
+        return
+    channel = bot.get_channel(giveaway_info["channel_id"])
+    if not channel:
+        return
+    try:
+        embed = giveaway_embeds.get(message_id)
+        if embed is None:
+            message = await channel.fetch_message(message_id)
+            if not message.embeds:
+                return
+            embed = giveaway_embeds[message_id] = message.embeds[0]
+        # Update the entries count in the description
+        lines = embed.description.split('\n')
+        for i, line in enumerate(lines):
+            if line.startswith('Entries:'):
+                lines[i] = f"Entries: {len(entrants)}"
+                break
+        embed.description = '\n'.join(lines)
+        await channel.get_partial_message(message_id).edit(embed=embed)
+    except discord.HTTPException as e:
+        print(f"Error updating giveaway entries: {e}")
+
+
+def forget_giveaway(message_id):
+    giveaway_entrants.pop(message_id, None)
+    giveaway_embeds.pop(message_id, None)
+    task = giveaway_edit_tasks.pop(message_id, None)
+    if task:
+        task.cancel()
 
 def parse_giveaway_duration(duration_str):
     """Parse flexible duration strings for giveaways."""
@@ -2979,6 +5984,8 @@ async def giveaways(ctx: Context, subcommand: str = None, *args):
         await giveaway_msg.add_reaction("🎉")
         
         # Store giveaway info
+        giveaway_entrants[giveaway_msg.id] = set()
+        giveaway_embeds[giveaway_msg.id] = embed
         active_giveaways[giveaway_msg.id] = {
             "channel_id": ctx.channel.id,
             "guild_id": ctx.guild.id,
@@ -2989,7 +5996,9 @@ async def giveaways(ctx: Context, subcommand: str = None, *args):
         }
         
         # Schedule end of giveaway
-        bot.loop.create_task(end_giveaway(giveaway_msg.id, duration_seconds))
+        timer_scheduler.schedule(
+            "end_giveaway", ctx.guild.id, duration_seconds, message_id=giveaway_msg.id
+        )
         
     else:
         embed = discord.Embed(
@@ -2999,64 +6008,84 @@ async def giveaways(ctx: Context, subcommand: str = None, *args):
         await ctx.send(embed=embed)
 
 
-async def end_giveaway(message_id: int, delay: int):
-    """End a giveaway after the specified delay."""
-    await asyncio.sleep(delay)
-    
-    if message_id not in active_giveaways:
+@job_handler("end_giveaway")
+async def end_giveaway_job(guild, data):
+    if await end_giveaway(data["message_id"]):
         return
-    
-    giveaway_info = active_giveaways.pop(message_id)
+    retries = data.get("retries", 0) + 1
+    if retries > GIVEAWAY_MAX_RETRIES:
+        print(f"Giving up on ending giveaway {data['message_id']} after {GIVEAWAY_MAX_RETRIES} retries")
+        active_giveaways.pop(data["message_id"], None)
+        forget_giveaway(data["message_id"])
+        return
+    timer_scheduler.schedule("end_giveaway", guild.id, GIVEAWAY_RETRY_SECONDS, **dict(data, retries=retries))
+
+
+async def end_giveaway(message_id: int):
+    """End a giveaway and pick a winner. The giveaway stays active until the
+    result is posted; returns False if ending it failed and should be retried."""
+    if message_id not in active_giveaways or message_id in ending_giveaways:
+        return True
+
+    giveaway_info = active_giveaways[message_id]
     channel = bot.get_channel(giveaway_info["channel_id"])
     if not channel:
-        return
-    
+        guild = bot.get_guild(giveaway_info["guild_id"])
+        if guild is not None and guild.unavailable:
+            # Discord outage, the channel is not gone
+            return False
+        # Channel was deleted (or the bot left the server)
+        del active_giveaways[message_id]
+        forget_giveaway(message_id)
+        return True
+
+    ending_giveaways.add(message_id)
     try:
-        message = await channel.fetch_message(message_id)
-        reaction = discord.utils.get(message.reactions, emoji="🎉")
-        
-        if not reaction or reaction.count <= 1:  # Only bot reaction
+        entrants = await get_giveaway_entrants(message_id, channel)
+        message = channel.get_partial_message(message_id)
+
+        if not entrants:
             embed = discord.Embed(
-                description=f"{giveaway_info['prize']}\n\nReact with 🎉 to enter the giveaway.\n\nEnded: <t:{int(giveaway_info['end_time'].timestamp())}:R> (<t:{int(giveaway_info['end_time'].timestamp())}:F>)\n\nEntries: 0\n\nHosted by: {bot.get_user(giveaway_info['host_id']).display_name}\n\n**Winners**\nNo winners were chosen!",
+                description=f"{giveaway_info['prize']}\n\nReact with 🎉 to enter the giveaway.\n\nEnded: <t:{int(giveaway_info['end_time'].timestamp())}:R> (<t:{int(giveaway_info['end_time'].timestamp())}:F>)\n\nEntries: 0\n\nHosted by: <@{giveaway_info['host_id']}>\n\n**Winners**\nNo winners were chosen!",
                 color=0x4C4C54,
             )
             embed.set_author(name="nova", icon_url=bot.user.avatar.url if bot.user.avatar else None)
             await message.edit(embed=embed)
-            return
-        
-        # Get users who reacted (excluding the bot)
-        users = []
-        async for user in reaction.users():
-            if not user.bot:
-                users.append(user)
-        
-        if not users:
+            winner_mention = None
+        else:
+            # Pick random winner
+            import random
+            winner_mention = f"<@{random.choice(tuple(entrants))}>"
+
             embed = discord.Embed(
-                description=f"{giveaway_info['prize']}\n\nReact with 🎉 to enter the giveaway.\n\nEnded: <t:{int(giveaway_info['end_time'].timestamp())}:R> (<t:{int(giveaway_info['end_time'].timestamp())}:F>)\n\nEntries: {len(users)}\n\nHosted by: {bot.get_user(giveaway_info['host_id']).display_name}\n\n**Winners**\nNo winners were chosen!",
+                description=f"{giveaway_info['prize']}\n\nReact with 🎉 to enter the giveaway.\n\nEnded: <t:{int(giveaway_info['end_time'].timestamp())}:R> (<t:{int(giveaway_info['end_time'].timestamp())}:F>)\n\nEntries: {len(entrants)}\n\nHosted by: <@{giveaway_info['host_id']}>\n\n**Winners**\n🎊 {winner_mention} 🎊",
                 color=0x4C4C54,
             )
             embed.set_author(name="nova", icon_url=bot.user.avatar.url if bot.user.avatar else None)
             await message.edit(embed=embed)
-            return
-        
-        # Pick random winner
-        import random
-        winner = random.choice(users)
-        
-        embed = discord.Embed(
-            description=f"{giveaway_info['prize']}\n\nReact with 🎉 to enter the giveaway.\n\nEnded: <t:{int(giveaway_info['end_time'].timestamp())}:R> (<t:{int(giveaway_info['end_time'].timestamp())}:F>)\n\nEntries: {len(users)}\n\nHosted by: {bot.get_user(giveaway_info['host_id']).display_name}\n\n**Winners**\n🎊 {winner.mention} 🎊",
-            color=0x4C4C54,
-        )
-        embed.set_author(name="nova", icon_url=bot.user.avatar.url if bot.user.avatar else None)
-        
-        await message.edit(embed=embed)
-        await channel.send(f"🎉 Congratulations {winner.mention}! You won: **{giveaway_info['prize']}**!")
-        
+
     except discord.NotFound:
         # Message was deleted
-        pass
-    except Exception:
-        pass
+        winner_mention = None
+    except discord.Forbidden as e:
+        # Retrying would not help; the giveaway ends without a result
+        print(f"Error ending giveaway {message_id}: {e}")
+        winner_mention = None
+    except Exception as e:
+        print(f"Error ending giveaway {message_id}: {e}")
+        return False
+    finally:
+        ending_giveaways.discard(message_id)
+
+    # The winner is drawn and shown; from here on the giveaway is over
+    active_giveaways.pop(message_id, None)
+    forget_giveaway(message_id)
+    if winner_mention:
+        try:
+            await channel.send(f"🎉 Congratulations {winner_mention}! You won: **{giveaway_info['prize']}**!")
+        except discord.HTTPException as e:
+            print(f"Error announcing giveaway {message_id} winner: {e}")
+    return True
 
 
 @bot.tree.command(name="ping", description="Check the bot's latency.")
@@ -3095,34 +6124,13 @@ async def on_raw_reaction_add(payload):
     
     # Handle giveaway entries
     if message_id in active_giveaways and reaction == "🎉":
-        # Update the giveaway message with new entry count
         try:
             channel = bot.get_channel(active_giveaways[message_id]["channel_id"])
             if channel:
-                message = await channel.fetch_message(message_id)
-                reaction_obj = discord.utils.get(message.reactions, emoji="🎉")
-                
-                if reaction_obj:
-                    # Count non-bot users who reacted
-                    users = []
-                    async for user in reaction_obj.users():
-                        if not user.bot:
-                            users.append(user)
-                    
-                    # Update the embed with new entry count
-                    embed = message.embeds[0] if message.embeds else None
-                    if embed:
-                        # Update the entries count in the description
-                        lines = embed.description.split('\n')
-                        for i, line in enumerate(lines):
-                            if line.startswith('Entries:'):
-                                lines[i] = f"Entries: {len(users)}"
-                                break
-                        
-                        new_description = '\n'.join(lines)
-                        embed.description = new_description
-                        await message.edit(embed=embed)
-        except Exception as e:
+                entrants = await get_giveaway_entrants(message_id, channel)
+                entrants.add(payload.user_id)
+                queue_giveaway_edit(message_id)
+        except discord.HTTPException as e:
             print(f"Error updating giveaway entries: {e}")
 
 
@@ -3139,7 +6147,7 @@ async def on_raw_reaction_remove(payload):
             role_id = sticky_reaction_roles[guild_id][message_id][reaction]
             guild = bot.get_guild(guild_id)
             role = guild.get_role(role_id)
-            member = guild.get_member(payload.user_id)
+            member = await fetch_member_cached(guild, payload.user_id)
             
             if role and member and role in member.roles:
                 try:
@@ -3149,42 +6157,51 @@ async def on_raw_reaction_remove(payload):
     
     # Handle giveaway entry removals
     if message_id in active_giveaways and reaction == "🎉":
-        # Update the giveaway message with new entry count
         try:
             channel = bot.get_channel(active_giveaways[message_id]["channel_id"])
             if channel:
-                message = await channel.fetch_message(message_id)
-                reaction_obj = discord.utils.get(message.reactions, emoji="🎉")
-                
-                if reaction_obj:
-                    # Count non-bot users who reacted
-                    users = []
-                    async for user in reaction_obj.users():
-                        if not user.bot:
-                            users.append(user)
-                    
-                    # Update the embed with new entry count
-                    embed = message.embeds[0] if message.embeds else None
-                    if embed:
-                        # Update the entries count in the description
-                        lines = embed.description.split('\n')
-                        for i, line in enumerate(lines):
-                            if line.startswith('Entries:'):
-                                lines[i] = f"Entries: {len(users)}"
-                                break
-                        
-                        new_description = '\n'.join(lines)
-                        embed.description = new_description
-                        await message.edit(embed=embed)
-        except Exception as e:
+                entrants = await get_giveaway_entrants(message_id, channel)
+                entrants.discard(payload.user_id)
+                queue_giveaway_edit(message_id)
+        except discord.HTTPException as e:
             print(f"Error updating giveaway entries: {e}")
 
 
+@bot.event
+async def on_raw_reaction_clear(payload):
+    """Resets giveaway entries when all reactions are removed from a giveaway."""
+    if payload.message_id in active_giveaways:
+        giveaway_entrants[payload.message_id] = set()
+        queue_giveaway_edit(payload.message_id)
+
+
+@bot.event
+async def on_raw_reaction_clear_emoji(payload):
+    """Resets giveaway entries when the 🎉 reaction is cleared."""
+    if payload.message_id in active_giveaways and str(payload.emoji) == "🎉":
+        giveaway_entrants[payload.message_id] = set()
+        queue_giveaway_edit(payload.message_id)
+
+
 @bot.event
 async def on_command_error(ctx: Context, error: commands.CommandError):
     # Ignore unknown commands
     if isinstance(error, commands.CommandNotFound):
         return
+    if ctx.command is not None:
+        cause = error.original if isinstance(error, commands.CommandInvokeError) else error
+        command_errors[(ctx.command.qualified_name, type(cause).__name__)] += 1
+    if isinstance(error, AmbiguousMember):
+        shown = error.candidates[:MEMBER_CANDIDATES_SHOWN]
+        names = ", ".join(f"{m.mention} (`{m.name}`)" for m in shown)
+        if len(error.candidates) > len(shown):
+            names += " and others"
+        embed = discord.Embed(
+            description=f"⚠️ {ctx.author.mention}: `{error.query}` matches several members: {names}. Use a mention or ID.",
+            color=0x4C4C54,
+        )
+        await ctx.send(embed=embed)
+        return
     # Build a styled error/help embed
     embed = discord.Embed(color=0x4C4C54)
     embed.set_author(
@@ -3245,11 +6262,10 @@ async def on_command_error(ctx: Context, error: commands.CommandError):
 async def ban_list(ctx: Context):
     """Show all banned users in the server with unban buttons."""
     try:
-        # Fetch all bans
-        banned_users = []
-        async for ban_entry in ctx.guild.bans():
-            banned_users.append(ban_entry)
-        
+        # Fetch only the first page; the view pulls more as it pages
+        banned_users = get_ban_cache(ctx.guild)
+        await banned_users.ensure(4)  # first page plus one to know if another follows
+
         if not banned_users:
             embed = discord.Embed(
                 description=f"📋 {ctx.author.mention}: No banned users found in this server.",
@@ -3276,10 +6292,388 @@ async def ban_list(ctx: Context):
         )
         await ctx.send(embed=embed)
 
+# Metrics
+# With METRICS_PORT set, http://METRICS_HOST:METRICS_PORT/metrics serves
+# Prometheus text format: command counts, errors and latency histograms, REST
+# calls and 429s per route (traced on discord.py's aiohttp session), gateway
+# latency, event loop lag, pending tasks and the size of every in-memory store.
+# A cluster listens on METRICS_PORT + CLUSTER_ID.
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRIC_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)  # seconds
+LOOP_LAG_INTERVAL = 0.5  # seconds between event loop lag samples
+command_counts = defaultdict(int)  # {(command, "ok" | "error"): count}
+command_errors = defaultdict(int)  # {(command, error class): count}
+command_durations = {}  # {command: LatencyHistogram}
+rest_calls = defaultdict(int)  # {(method, route): count}
+rest_rate_limited = defaultdict(int)  # {(method, route): 429 responses}
+event_loop_lag = 0.0  # seconds the last sample woke up late
+
+
+class LatencyHistogram:
+    __slots__ = ("buckets", "total", "count")
+
+    def __init__(self):
+        self.buckets = [0] * (len(METRIC_BUCKETS) + 1)  # last one is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(METRIC_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+def rest_route(path):
+    """``/api/v10/channels/1/messages/2`` -> ``/channels/{channel_id}/messages/{message_id}``."""
+    segments = []
+    previous = ""
+    for segment in re.sub(r"^/api/v\d+", "", path).split("/")[1:]:
+        if segment.isdigit():
+            segment = "{" + previous.rstrip("s") + "_id}"
+        elif previous == "reactions":
+            segment = "{emoji}"
+        elif previous in ("{webhook_id}", "{interaction_id}"):
+            segment = "{token}"
+        segments.append(segment)
+        previous = segment
+    return "/" + "/".join(segments)
+
+
+async def on_rest_request_end(session, context, params):
+    key = (params.method, rest_route(params.url.path))
+    rest_calls[key] += 1
+    if params.response.status == 429:
+        rest_rate_limited[key] += 1
+    record_rest_span(context, *key, params.response.status)
+
+
+http_trace.on_request_end.append(on_rest_request_end)
+
+
+@bot.before_invoke
+async def start_command_timer(ctx: Context):
+    ctx.span = CommandSpan(ctx.command.qualified_name, ctx.guild.id if ctx.guild else None)
+    current_span.set(ctx.span)
+
+
+@bot.after_invoke
+async def record_command_metrics(ctx: Context):
+    name = ctx.command.qualified_name
+    status = "error" if ctx.command_failed else "ok"
+    ctx.span.finish(status)
+    command_counts[(name, status)] += 1
+    histogram = command_durations.get(name)
+    if histogram is None:
+        histogram = command_durations[name] = LatencyHistogram()
+    histogram.observe(ctx.span.duration)
+
+
+async def monitor_event_loop_lag():
+    global event_loop_lag
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        event_loop_lag = max(0.0, loop.time() - start - LOOP_LAG_INTERVAL)
+
+
+def store_sizes():
+    """Entries held by each persistent collection and in-memory cache."""
+    sizes = {namespace: len(collection) for namespace, collection in state_store.collections.items()}
+    sizes.update(
+        prefix_matchers=len(prefix_matchers),
+        timeout_indexes=len(timeout_indexes),
+        ban_caches=sum(len(cache) for cache in ban_caches.values()),
+        join_indexes=len(join_indexes),
+        role_name_indexes=len(role_name_indexes),
+        member_name_indexes=sum(len(index) for index in member_name_indexes.values()),
+        fetched_members=len(fetched_members),
+        guild_counters=len(guild_counters),
+        join_monitors=len(join_monitors),
+        live_counters=len(live_counters),
+        member_activity=sum(len(activity) for activity in member_activity.values()),
+        spam_trackers=len(spam_trackers),
+        giveaway_entrants=sum(len(entrants) for entrants in giveaway_entrants.values()),
+        private_room_cleanups=len(private_room_cleanups),
+    )
+    return sizes
+
+
+def _metric_labels(**labels):
+    escaped = (
+        f'{name}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def render_metrics():
+    lines = []
+
+    def header(name, kind, help_text):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    def sample(name, value, **labels):
+        lines.append(f"{name}{_metric_labels(**labels) if labels else ''} {value}")
+
+    header("bot_commands_total", "counter", "Commands invoked, by outcome.")
+    for (command, status), count in sorted(command_counts.items()):
+        sample("bot_commands_total", count, command=command, status=status)
+    header("bot_command_errors_total", "counter", "Command errors, by exception class.")
+    for (command, error), count in sorted(command_errors.items()):
+        sample("bot_command_errors_total", count, command=command, error=error)
+    header("bot_command_duration_seconds", "histogram", "Command run time.")
+    for command, histogram in sorted(command_durations.items()):
+        cumulative = 0
+        for bound, count in zip(METRIC_BUCKETS + ("+Inf",), histogram.buckets):
+            cumulative += count
+            sample("bot_command_duration_seconds_bucket", cumulative, command=command, le=bound)
+        sample("bot_command_duration_seconds_sum", histogram.total, command=command)
+        sample("bot_command_duration_seconds_count", histogram.count, command=command)
+
+    header("bot_rest_requests_total", "counter", "Discord REST requests, by route.")
+    for (method, route), count in sorted(rest_calls.items()):
+        sample("bot_rest_requests_total", count, method=method, route=route)
+    header("bot_rest_rate_limited_total", "counter", "Discord REST responses that were 429s, by route.")
+    for (method, route), count in sorted(rest_rate_limited.items()):
+        sample("bot_rest_rate_limited_total", count, method=method, route=route)
+
+    header("bot_gateway_latency_seconds", "gauge", "Gateway heartbeat latency.")
+    if isinstance(bot, commands.AutoShardedBot):
+        for shard_id, latency in bot.latencies:
+            if math.isfinite(latency):
+                sample("bot_gateway_latency_seconds", latency, shard=shard_id)
+    elif math.isfinite(bot.latency):
+        sample("bot_gateway_latency_seconds", bot.latency)
+    header("bot_guilds", "gauge", "Guilds this process serves.")
+    sample("bot_guilds", len(bot.guilds))
+    header("bot_event_loop_lag_seconds", "gauge", "How late the last event loop lag sample woke up.")
+    sample("bot_event_loop_lag_seconds", event_loop_lag)
+    header("bot_pending_tasks", "gauge", "asyncio tasks not yet done.")
+    sample("bot_pending_tasks", len(asyncio.all_tasks()))
+    header("bot_state_pending_writes", "gauge", "State changes waiting for the next flush.")
+    sample("bot_state_pending_writes", state_store.pending)
+    header("bot_store_entries", "gauge", "Entries in each persistent store and in-memory cache.")
+    for name, size in sorted(store_sizes().items()):
+        sample("bot_store_entries", size, store=name)
+    return "\n".join(lines) + "\n"
+
+
+async def serve_metrics(request):
+    return web.Response(
+        body=render_metrics().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+    )
+
+
+async def start_metrics_server():
+    app = web.Application()
+    app.router.add_get("/metrics", serve_metrics)
+    app.router.add_get("/trace", serve_trace)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, METRICS_HOST, METRICS_PORT + CLUSTER_ID).start()
+    asyncio.create_task(monitor_event_loop_lag())
+    return runner
+
+
+# Command tracing
+# Each command invocation is recorded as a span, along with the REST calls made
+# while it ran. Calls are attributed through a context variable, so calls made
+# by tasks the command starts count too. The last PERF_SPAN_LIMIT spans are
+# kept. ,perf reports p50/p95/p99 per command and the routes the time goes to.
+# Spans can also be exported in Chrome's trace event format, for
+# chrome://tracing or Perfetto.
+PERF_SPAN_LIMIT = 10000
+PERF_DEFAULT_WINDOW = 3600  # seconds
+PERF_REPORT_SIZE = 10  # commands listed by ,perf
+command_spans = deque(maxlen=PERF_SPAN_LIMIT)  # finished CommandSpans, oldest first
+current_span = contextvars.ContextVar("current_span", default=None)
+span_ids = itertools.count(1)
+
+
+class CommandSpan:
+    __slots__ = ("id", "command", "guild_id", "started_at", "start", "duration", "status", "calls")
+
+    def __init__(self, command, guild_id):
+        self.id = next(span_ids)
+        self.command = command
+        self.guild_id = guild_id
+        self.started_at = time.time()  # wall clock, for export
+        self.start = time.perf_counter()
+        self.duration = None
+        self.status = None
+        self.calls = []  # (method, route, offset from start, duration, HTTP status)
+
+    def finish(self, status):
+        self.duration = time.perf_counter() - self.start
+        self.status = status
+        command_spans.append(self)
+
+
+async def on_rest_request_start(session, context, params):
+    context.started = time.perf_counter()
+
+
+def record_rest_span(context, method, route, status):
+    span = current_span.get()
+    if span is not None and span.duration is None:
+        span.calls.append((method, route, context.started - span.start, time.perf_counter() - context.started, status))
+
+
+http_trace.on_request_start.append(on_rest_request_start)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def format_latency(seconds):
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:.2f}s"
+
+
+def perf_report(spans):
+    """One entry per command, slowest p95 first: (command, durations, routes).
+
+    ``routes`` maps "METHOD /route" to [calls, seconds per call summed, seconds
+    with at least one call in flight]; the last stays meaningful when calls run
+    concurrently.
+    """
+    by_command = defaultdict(lambda: ([], defaultdict(lambda: [0, 0.0, 0.0])))
+    for span in spans:
+        durations, routes = by_command[span.command]
+        durations.append(span.duration)
+        intervals = defaultdict(list)
+        for method, route, offset, duration, _ in span.calls:
+            intervals[f"{method} {route}"].append((offset, offset + duration))
+        for route, spans_of_route in intervals.items():
+            entry = routes[route]
+            entry[0] += len(spans_of_route)
+            entry[1] += sum(end - start for start, end in spans_of_route)
+            busy_until = -math.inf
+            for start, end in sorted(spans_of_route):
+                if end > busy_until:
+                    entry[2] += end - max(start, busy_until)
+                    busy_until = end
+    report = [(command, sorted(durations), routes) for command, (durations, routes) in by_command.items()]
+    report.sort(key=lambda entry: percentile(entry[1], 0.95), reverse=True)
+    return report
+
+
+def spans_to_trace(spans):
+    """Chrome trace event format: one row per command, REST calls nested in it."""
+    events = []
+    for span in spans:
+        start = span.started_at * 1e6
+        events.append({
+            "name": span.command, "cat": "command", "ph": "X", "ts": start, "dur": span.duration * 1e6,
+            "pid": CLUSTER_ID, "tid": span.id, "args": {"guild_id": str(span.guild_id), "status": span.status},
+        })
+        for method, route, offset, duration, status in span.calls:
+            events.append({
+                "name": f"{method} {route}", "cat": "rest", "ph": "X", "ts": start + offset * 1e6,
+                "dur": duration * 1e6, "pid": CLUSTER_ID, "tid": span.id, "args": {"status": status},
+            })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+@bot.command()
+@commands.has_permissions(manage_guild=True)
+async def perf(ctx: Context, action: str = None, window: str = None):
+    """Shows this server's slowest commands and the REST calls they wait on.
+
+    ,perf [window]          e.g. ,perf 15m (default 1h)
+    ,perf export [window]   trace file for chrome://tracing or Perfetto
+    """
+    export = action is not None and action.lower() == "export"
+    if not export:
+        window = action
+    seconds = parse_duration(window) if window else PERF_DEFAULT_WINDOW
+    if not seconds or seconds <= 0:
+        embed = discord.Embed(
+            description=f"⚠️ {ctx.author.mention}: Usage: `,perf [window]` or `,perf export [window]`, e.g. `,perf 15m`",
+            color=0x4C4C54,
+        )
+        await ctx.send(embed=embed)
+        return
+
+    cutoff = time.time() - seconds
+    spans = [s for s in command_spans if s.guild_id == ctx.guild.id and s.started_at >= cutoff]
+    if not spans:
+        embed = discord.Embed(
+            description=f"📊 {ctx.author.mention}: No commands ran in the last **{format_duration(seconds)}**.",
+            color=0x4C4C54,
+        )
+        await ctx.send(embed=embed)
+        return
+
+    if export:
+        trace = json.dumps(spans_to_trace(spans), separators=(",", ":")).encode()
+        file = discord.File(io.BytesIO(trace), filename=f"perf-{ctx.guild.id}.json")
+        await ctx.send(
+            f"📊 {len(spans)} command spans from the last **{format_duration(seconds)}**"
+            " (open in chrome://tracing or ui.perfetto.dev)",
+            file=file,
+        )
+        return
+
+    blocks = []
+    for command, durations, routes in perf_report(spans)[:PERF_REPORT_SIZE]:
+        lines = [
+            f"**{command}** · {len(durations)} run{'s' if len(durations) != 1 else ''} · "
+            f"p50 {format_latency(percentile(durations, 0.5))} · "
+            f"p95 {format_latency(percentile(durations, 0.95))} · "
+            f"p99 {format_latency(percentile(durations, 0.99))}"
+        ]
+        total = sum(durations)
+        dominant = sorted(routes.items(), key=lambda item: item[1][2], reverse=True)[:2]
+        for route, (calls, call_time, busy) in dominant:
+            share = busy / total if total else 0
+            lines.append(f"↳ `{route}` ×{calls} · {format_latency(call_time / calls)} avg · waited on {share:.0%} of the time")
+        block = "\n".join(lines)
+        if sum(len(b) + 1 for b in blocks) + len(block) > 4096:
+            break
+        blocks.append(block)
+    embed = discord.Embed(
+        title=f"Slowest commands, last {format_duration(seconds)}",
+        description="\n".join(blocks),
+        color=0x4C4C54,
+    )
+    embed.set_footer(text=f"{len(spans)} commands traced")
+    await ctx.send(embed=embed)
+
+
+async def serve_trace(request):
+    return web.json_response(spans_to_trace(list(command_spans)))
+
+
+@bot.event
+async def setup_hook():
+    if cluster is not None:
+        await cluster.connect()
+    state_store.start()
+    timer_scheduler.load()
+    timer_scheduler.start()
+    reconcile_guild_counters.start()
+    if LOW_MEMORY:
+        trim_member_cache.start()
+    if METRICS_PORT:
+        await start_metrics_server()
+
+
 # Remove default help
 @bot.event
 async def on_ready():
     print(f"Logged in as {bot.user}!")
+    # A fresh session rebuilt every guild without role or member events
+    role_name_indexes.clear()
+    for guild in bot.guilds:
+        drop_member_indexes(guild.id)
+    fetched_members.clear()
+    adopt_private_rooms()
+    resume_raid_watchers()
     try:
         synced = await bot.tree.sync()
         print(f"Synced {len(synced)} slash commands.")
@@ -3289,4 +6683,9 @@ async def on_ready():
 
 # To run the bot, replace 'YOUR_BOT_TOKEN' with your actual bot token
 # bot.run('YOUR_BOT_TOKEN')
-bot.run(TOKEN)
+if __name__ == "__main__":
+    state_store.load()
+    try:
+        bot.run(TOKEN)
+    finally:
+        state_store.close()
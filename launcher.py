@@ -0,0 +1,219 @@
+"""Runs bot.py as a cluster of sharded worker processes.
+
+    python launcher.py [--clusters 2] [--shards auto]
+
+The shard count (Discord's recommendation unless given) is split into
+contiguous ranges, one per cluster. Each cluster is a bot.py process running
+AutoShardedBot over its range, with its own state database
+(``bot_state.cluster<N>.db`` next to STATE_DB_PATH). Keep ``--clusters`` and
+``--shards`` stable between runs: a guild's state stays in the database of the
+cluster that owned its shard.
+
+The launcher also hosts the IPC hub the clusters connect to on localhost:
+
+* IDENTIFYs are granted one at a time per ``max_concurrency`` bucket
+  (``shard_id % max_concurrency``), at most one per bucket every 5 seconds,
+  across all processes.
+* ``query`` messages are sent to every other cluster and their replies are
+  returned to the asking cluster as a list (e.g. mutual server counts for
+  ``ui``); ``event`` messages are relayed without replies (e.g. AFK changes).
+
+A cluster that exits is restarted after a short delay.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+import discord
+from dotenv import load_dotenv
+
+IPC_HOST = "127.0.0.1"
+IDENTIFY_INTERVAL = 5.0
+QUERY_TIMEOUT = 5.0
+RESTART_DELAY = 5.0
+BOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py")
+
+
+def shard_ranges(shard_count, clusters):
+    """Splits shard IDs 0..shard_count-1 into ``clusters`` contiguous ranges."""
+    size, extra = divmod(shard_count, clusters)
+    ranges, start = [], 0
+    for index in range(clusters):
+        end = start + size + (index < extra)
+        ranges.append(list(range(start, end)))
+        start = end
+    return [r for r in ranges if r]
+
+
+async def fetch_gateway_info(token):
+    """Discord's recommended shard count and the identify max_concurrency."""
+    http = discord.http.HTTPClient(asyncio.get_running_loop())
+    try:
+        await http.static_login(token)
+        shards, _, session_start_limit = await http.get_bot_gateway()
+    finally:
+        await http.close()
+    return shards, session_start_limit.get("max_concurrency", 1)
+
+
+def send(writer, message):
+    if not writer.is_closing():
+        writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+
+
+class ClusterHub:
+    """IPC hub: paces IDENTIFYs and relays queries/events between clusters."""
+
+    def __init__(self, max_concurrency=1, identify_interval=IDENTIFY_INTERVAL):
+        self.max_concurrency = max(1, max_concurrency)
+        self.identify_interval = identify_interval
+        self.writers = {}  # cluster_id -> StreamWriter
+        self.identifies = []  # (monotonic time, shard_id), in the order granted
+        self._identify_locks = defaultdict(asyncio.Lock)  # bucket -> lock
+        self._next_identify = defaultdict(float)  # bucket -> earliest next grant
+        self._queries = {}  # hub query id -> (future, {cluster_id: result}, replies expected)
+        self._ids = itertools.count(1)
+        self._server = None
+
+    async def start(self, port=0):
+        self._server = await asyncio.start_server(self._handle, IPC_HOST, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for writer in self.writers.values():
+            writer.close()
+
+    async def _handle(self, reader, writer):
+        cluster_id = None
+        tasks = set()
+        try:
+            async for line in reader:
+                message = json.loads(line)
+                op = message["op"]
+                if op == "hello":
+                    cluster_id = message["cluster_id"]
+                    self.writers[cluster_id] = writer
+                elif op == "identify":
+                    task = asyncio.create_task(self._grant_identify(writer, message))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                elif op == "query":
+                    task = asyncio.create_task(self._relay_query(cluster_id, writer, message))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                elif op == "event":
+                    for other, other_writer in list(self.writers.items()):
+                        if other != cluster_id:
+                            send(other_writer, message)
+                elif op == "reply" and message["id"] in self._queries:
+                    future, results, expected = self._queries[message["id"]]
+                    results[cluster_id] = message["result"]
+                    if len(results) >= expected and not future.done():
+                        future.set_result(None)
+        except (ConnectionError, json.JSONDecodeError):
+            pass
+        finally:
+            if cluster_id is not None and self.writers.get(cluster_id) is writer:
+                del self.writers[cluster_id]
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def _grant_identify(self, writer, message):
+        bucket = message["shard_id"] % self.max_concurrency
+        async with self._identify_locks[bucket]:
+            delay = self._next_identify[bucket] - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_identify[bucket] = time.monotonic() + self.identify_interval
+            self.identifies.append((time.monotonic(), message["shard_id"]))
+        send(writer, {"op": "reply", "id": message["id"], "result": True})
+
+    async def _relay_query(self, cluster_id, writer, message):
+        others = {c: w for c, w in self.writers.items() if c != cluster_id}
+        hub_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        results = {}
+        self._queries[hub_id] = (future, results, len(others))
+        try:
+            if others:
+                for other_writer in others.values():
+                    send(other_writer, {"op": "query", "id": hub_id, "name": message["name"], "args": message["args"]})
+                # Clusters that are down or slow are left out
+                await asyncio.wait({future}, timeout=QUERY_TIMEOUT)
+        finally:
+            del self._queries[hub_id]
+        send(writer, {"op": "reply", "id": message["id"], "result": list(results.values())})
+
+
+def worker_command():
+    return [sys.executable, BOT_PATH]
+
+
+def cluster_env(cluster_id, shard_ids, shard_count, ipc_port):
+    base, ext = os.path.splitext(os.getenv("STATE_DB_PATH", "bot_state.db"))
+    return {
+        **os.environ,
+        "SHARD_COUNT": str(shard_count),
+        "SHARD_IDS": ",".join(map(str, shard_ids)),
+        "CLUSTER_ID": str(cluster_id),
+        "CLUSTER_IPC_PORT": str(ipc_port),
+        "STATE_DB_PATH": f"{base}.cluster{cluster_id}{ext}",
+    }
+
+
+async def run_cluster(cluster_id, env):
+    """Keeps one cluster process running until cancelled."""
+    while True:
+        process = await asyncio.create_subprocess_exec(*worker_command(), env=env)
+        print(f"Cluster {cluster_id} started (pid {process.pid}, shards {env['SHARD_IDS']})")
+        try:
+            code = await process.wait()
+        except asyncio.CancelledError:
+            if process.returncode is None:
+                process.terminate()
+                await process.wait()
+            raise
+        print(f"Cluster {cluster_id} exited with code {code}; restarting in {RESTART_DELAY:g}s")
+        await asyncio.sleep(RESTART_DELAY)
+
+
+async def main(args):
+    load_dotenv(dotenv_path=".env")
+    token = os.getenv("DISCORD_TOKEN")
+    recommended, max_concurrency = await fetch_gateway_info(token)
+    shard_count = recommended if args.shards == "auto" else int(args.shards)
+    ranges = shard_ranges(shard_count, args.clusters)
+
+    hub = ClusterHub(max_concurrency)
+    port = await hub.start()
+    print(f"{shard_count} shards over {len(ranges)} clusters (max_concurrency {max_concurrency})")
+    runners = [
+        asyncio.create_task(run_cluster(cluster_id, cluster_env(cluster_id, shard_ids, shard_count, port)))
+        for cluster_id, shard_ids in enumerate(ranges)
+    ]
+    try:
+        await asyncio.gather(*runners)
+    finally:
+        for runner in runners:
+            runner.cancel()
+        await asyncio.gather(*runners, return_exceptions=True)
+        await hub.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clusters", type=int, default=2, help="worker processes")
+    parser.add_argument("--shards", default="auto", help='total shard count, or "auto"')
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass